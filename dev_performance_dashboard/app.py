@@ -1,7 +1,6 @@
 import streamlit as st
 import sys
 import os
-import subprocess
 import threading
 import time
 import requests
@@ -75,13 +74,11 @@ if st.button('Fetch Data'):
 
                 with st.spinner('Calculating metrics...'):
                     try:
-                        result = subprocess.run(['python', 'metrics/calculator.py'], capture_output=True, text=True)
-                        if result.returncode == 0:
-                            st.success("Metrics have been calculated successfully.")
-                        else:
-                            st.error(f"Error in calculations script:\n{result.stderr}")
+                        # Computed in this process, so the dashboard and the query processor reuse the cached result
+                        get_metrics()
+                        st.success("Metrics have been calculated successfully.")
                     except Exception as e:
-                        st.error(f"An error occurred while running the calculations script:\n{str(e)}")
+                        st.error(f"An error occurred while calculating metrics:\n{str(e)}")
 
                 st.subheader('Development Performance Dashboard')
                 if is_dash_app_running(get_dash_url()):
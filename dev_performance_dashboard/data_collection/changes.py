@@ -0,0 +1,74 @@
+import json
+import os
+import shutil
+import time
+
+from data_collection.storage import resolve_data_dir, dataset_fingerprint, read_frame, empty_table, TableWriter
+
+# Name of the directory holding the rows every incremental sync added to and removed from the tables
+CHANGES_DIR = 'changes'
+
+# Tables whose changes are recorded; the fingerprint of a change covers these tables only
+CHANGE_TABLES = ['commits', 'pull_requests', 'commit_stats']
+
+# Function to get the directory holding the change log of a data directory
+def changes_dir(data_dir=None):
+    return os.path.join(resolve_data_dir(data_dir), CHANGES_DIR)
+
+# Record of the rows one incremental sync adds to and removes from the tables. A row fetched again is written
+# as removed in its saved version and added in its new one, so anything aggregated from the tables can be
+# brought up to date from the change alone. The change only counts once commit() has written its fingerprints.
+class ChangeLog:
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir
+        self.source = dataset_fingerprint(data_dir, CHANGE_TABLES)
+        self.path = os.path.join(changes_dir(data_dir), str(time.time_ns()))
+        self.writers = {}
+
+        # Changes an interrupted sync never committed describe no version of the tables
+        for name in os.listdir(changes_dir(data_dir)) if os.path.isdir(changes_dir(data_dir)) else []:
+            if not os.path.exists(os.path.join(changes_dir(data_dir), name, 'change.json')):
+                shutil.rmtree(os.path.join(changes_dir(data_dir), name), ignore_errors=True)
+        os.makedirs(self.path)
+
+    # Function to get the writer of the rows added to ('added') or removed from ('removed') a table
+    def writer(self, table, kind):
+        if (table, kind) not in self.writers:
+            self.writers[(table, kind)] = TableWriter(table, os.path.join(self.path, f"{table}_{kind}.parquet"))
+        return self.writers[(table, kind)]
+
+    # Function to close the change once every table is written, recording the dataset versions it leads from and to
+    def commit(self):
+        for writer in self.writers.values():
+            writer.close()
+
+        change_path = os.path.join(self.path, 'change.json')
+        with open(f"{change_path}.tmp", 'w') as f:
+            json.dump({'from': self.source, 'to': dataset_fingerprint(self.data_dir, CHANGE_TABLES)}, f)
+        os.replace(f"{change_path}.tmp", change_path)
+
+# Function to list the committed changes of a data directory, oldest first, as (path, from, to)
+def list_changes(data_dir=None):
+    path = changes_dir(data_dir)
+    if not os.path.isdir(path):
+        return []
+
+    changes = []
+    for name in sorted(os.listdir(path), key=lambda name: int(name) if name.isdigit() else -1):
+        change_path = os.path.join(path, name, 'change.json')
+        if os.path.exists(change_path):
+            with open(change_path) as f:
+                change = json.load(f)
+            changes.append((os.path.join(path, name), change['from'], change['to']))
+    return changes
+
+# Function to read the rows a change added to or removed from a table, empty if it did not touch the table
+def read_change(change_path, table, kind):
+    path = os.path.join(change_path, f"{table}_{kind}.parquet")
+    if not os.path.exists(path):
+        return empty_table(table)
+    return read_frame(path)
+
+# Function to drop the change log, committed or not
+def clear_changes(data_dir=None):
+    shutil.rmtree(changes_dir(data_dir), ignore_errors=True)
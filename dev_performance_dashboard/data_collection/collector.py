@@ -0,0 +1,315 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from data_collection.scheduler import RequestScheduler
+
+# Default cap on the number of requests in flight at the same time
+DEFAULT_MAX_WORKERS = 8
+
+# Largest page size the GitHub REST API accepts for list endpoints
+PAGE_SIZE = 100
+
+# Column layout of the commits and pull requests tables
+COMMIT_COLUMNS = ['Repo Id', 'Commit Id', 'Date', 'Message', 'Author Name', 'Author Email']
+PULL_REQUEST_COLUMNS = ['Repo Name', 'PR Number', 'Title', 'Author Login', 'State', 'Created At', 'Updated At', 'Merged At', 'Issue Id', 'Author Name', 'Author Email']
+
+# Function to turn a commit from the API into a row of the commits table
+def commit_row(repo_id, commit):
+    return [
+        repo_id,                                    # Repository ID
+        commit['sha'],                              # Commit SHA
+        commit['commit']['committer']['date'],      # Commit Date
+        commit['commit']['message'],                # Commit Message
+        commit['commit']['author']['name'],         # Commit Author Name
+        commit['commit']['author']['email']         # Commit Author Email
+    ]
+
+# Function to turn a pull request from the API into a row of the pull requests table
+def pull_request_row(repo_name, pr):
+    return [
+        repo_name,                      # Repo Name
+        pr['number'],                   # PR Number
+        pr['title'],                    # Title of the pull request
+        pr['user']['login'],            # Author Login
+        pr['state'],                    # State (open/closed)
+        pr['created_at'],               # Creation date
+        pr['updated_at'],               # Last update date
+        pr['merged_at'],                # Merged date
+        pr['issue_url'].split('/')[-1], # Issue Id (Extracting ID from the URL)
+        pr['user'].get('name', 'N/A'),  # PR Author Name, default to 'N/A' if not available
+        pr['user'].get('email', 'N/A')  # PR Author Email, default to 'N/A' if not available
+    ]
+
+# Function to check whether a page could not be fetched, as opposed to an endpoint that answered with nothing new
+def page_failed(response):
+    return response.status_code not in (200, 204, 304)
+
+# Function to read the page number out of a pagination link
+def page_number(link):
+    match = re.search(r'[?&]page=(\d+)', link['url'])
+    return int(match.group(1)) if match else None
+
+# Function to fetch a single page of a list endpoint
+def fetch_page(scheduler, url, params, page_no, label, headers=None):
+    # Pages reached through a Link header already carry their query string
+    if page_no is not None:
+        params = {**params, 'per_page': PAGE_SIZE, 'page': page_no}
+    response = scheduler.get(url, params=params, headers=headers)
+
+    # Nothing changed since the ETag we sent, or the endpoint is empty (e.g. contributors of an empty repository)
+    if response.status_code in (204, 304):
+        return None, response
+
+    # Check if the response is successful
+    if response.status_code != 200:
+        print(f"Error fetching {label}: {response.status_code}")
+        return None, response
+
+    return response.json(), response
+
+# Function to cut a page short at the first item that was already synced by an earlier run
+def items_until(response_data, until):
+    if until is None:
+        return response_data, False
+
+    for index, item in enumerate(response_data):
+        if until(item):
+            return response_data[:index], True
+
+    return response_data, False
+
+# Function to find the newest item of a page according to the endpoint's sync cursor
+def newest_item(items, cursor):
+    if cursor is None or not items:
+        return None
+    return max(items, key=cursor)
+
+# Function to pick the newer of two items according to the endpoint's sync cursor
+def newer_item(item, other, cursor):
+    if item is None or other is None:
+        return item or other
+    return max(item, other, key=cursor)
+
+# In-memory page sink that keeps every page so the items can be read back in page order
+class PageCollector:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}
+
+    def completed(self, task):
+        return None
+
+    def has_page(self, task, page_no):
+        return False
+
+    def add_page(self, task, page_no, items):
+        with self.lock:
+            self.pages.setdefault(task['key'], {})[page_no] = items
+
+    def complete(self, task, result):
+        pass
+
+    # Function to read back every item of an endpoint in page order
+    def items(self, task):
+        pages = self.pages.get(task['key'], {})
+        return [item for page_no in sorted(pages) for item in pages[page_no]]
+
+# Function to walk pages one after another by following the Link header's next page,
+# returning the newest item and whether a page failed and cut the walk short
+def fetch_pages_from(scheduler, task, next_url, page_no, sink):
+    newest = None
+
+    while next_url:
+        response_data, response = fetch_page(scheduler, next_url, {}, None, task['label'])
+
+        # Break the loop on errors or if no items are found (end of pagination)
+        if page_failed(response):
+            return newest, True
+        if not response_data:
+            break
+
+        new_items, reached_synced = items_until(response_data, task.get('until'))
+        sink.add_page(task, page_no, new_items)
+        newest = newer_item(newest, newest_item(new_items, task.get('cursor')), task.get('cursor'))
+
+        # Stop once items from an earlier sync show up, or when there is no next page
+        if reached_synced:
+            break
+        next_url = response.links.get('next', {}).get('url')
+        page_no += 1
+
+    return newest, False
+
+# Function to fetch the first page of a list endpoint and find out how many pages follow
+def fetch_first_page(scheduler, task, sink):
+    # Endpoints finished by an interrupted run are not requested again
+    result = sink.completed(task)
+    if result is not None:
+        return {'result': result}
+
+    url, params, label = task['url'], task['params'], task['label']
+    headers = {'If-None-Match': task['etag']} if task.get('etag') else None
+    response_data, response = fetch_page(scheduler, url, params, 1, label, headers=headers)
+
+    first_page = {'result': None, 'last_page': 1, 'next_url': None, 'newest': None,
+                  'etag': response.headers.get('ETag'), 'not_modified': response.status_code == 304, 'failed': page_failed(response)}
+
+    if not response_data:
+        return first_page
+
+    new_items, reached_synced = items_until(response_data, task.get('until'))
+    sink.add_page(task, 1, new_items)
+    first_page['newest'] = newest_item(new_items, task.get('cursor'))
+
+    next_link = response.links.get('next')
+    if reached_synced or not next_link:
+        return first_page
+
+    # GitHub advertises the last page in the Link header, which lets the remaining pages be fetched in parallel
+    last_link = response.links.get('last')
+    if task.get('until') is None and last_link and page_number(last_link):
+        first_page['last_page'] = page_number(last_link)
+        return first_page
+
+    # Endpoints read up to a sync cursor, or without a last page, are walked in order through the next links
+    first_page['next_url'] = next_link['url']
+    return first_page
+
+# Function to fetch one of the remaining pages of an endpoint, unless an interrupted run already saved it,
+# returning its newest item and whether it failed. A failed page is not saved, so it is asked for again on resume.
+def fetch_remaining_page(scheduler, task, page_no, sink):
+    if sink.has_page(task, page_no):
+        return None, False
+
+    response_data, response = fetch_page(scheduler, task['url'], task['params'], page_no, task['label'])
+    if page_failed(response):
+        return None, True
+    sink.add_page(task, page_no, response_data or [])
+    return newest_item(response_data, task.get('cursor')), False
+
+# Function to fetch every page of several list endpoints under a bounded worker pool, handing each page to a sink as it arrives
+def fetch_all_pages(scheduler, tasks, max_workers=DEFAULT_MAX_WORKERS, sink=None):
+    sink = sink if sink is not None else PageCollector()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # First pass: fetch page 1 of every endpoint to learn how many pages each has
+        first_pages = list(executor.map(lambda task: fetch_first_page(scheduler, task, sink), tasks))
+
+        # Second pass: fetch every remaining page of every endpoint at once
+        remaining = []
+        for task, first_page in zip(tasks, first_pages):
+            if first_page['result'] is not None:
+                pages = []
+            elif first_page['next_url']:
+                pages = [executor.submit(fetch_pages_from, scheduler, task, first_page['next_url'], 2, sink)]
+            else:
+                pages = [executor.submit(fetch_remaining_page, scheduler, task, page_no, sink)
+                         for page_no in range(2, first_page['last_page'] + 1)]
+            remaining.append(pages)
+
+        # Mark each endpoint complete once all of its pages are in the sink; an endpoint with a failed page is not
+        # complete, so a resumed run fetches its missing pages and the caller leaves its sync cursors where they were
+        results = []
+        for task, first_page, pages in zip(tasks, first_pages, remaining):
+            if first_page['result'] is not None:
+                results.append(first_page['result'])
+                continue
+
+            newest, failed = first_page['newest'], first_page['failed']
+            for page in pages:
+                newest_on_page, failed_page = page.result()
+                newest = newer_item(newest, newest_on_page, task.get('cursor'))
+                failed = failed or failed_page
+            result = {'etag': first_page['etag'], 'not_modified': first_page['not_modified'], 'newest': newest, 'failed': failed}
+            if not failed:
+                sink.complete(task, result)
+            results.append(result)
+
+    return results
+
+# Function to build the commits and pulls tasks of a repository, resuming from its sync state if there is one
+def repo_tasks(repo_id, repo_name, commits_url, pulls_url, repo_state):
+    commits_task = {'key': ('commits', repo_id), 'table': 'commits', 'repo_id': repo_id, 'repo_name': repo_name,
+                    'url': commits_url.replace('{/sha}', ''), 'params': {}, 'label': f"commits for {repo_name}",
+                    'cursor': lambda commit: commit['commit']['committer']['date']}
+    pulls_task = {'key': ('pull_requests', repo_id), 'table': 'pull_requests', 'repo_id': repo_id, 'repo_name': repo_name,
+                  'url': pulls_url.replace('{/number}', ''), 'params': {'state': 'all'}, 'label': f"pull requests for {repo_name}",
+                  'cursor': lambda pr: pr['updated_at']}
+
+    if repo_state is None:
+        return commits_task, pulls_task
+
+    # Only ask for commits from the last synced commit onwards
+    if repo_state.get('last_commit_date'):
+        commits_task['params']['since'] = repo_state['last_commit_date']
+    commits_task['etag'] = repo_state.get('etags', {}).get('commits')
+
+    # Walk pull requests most recently updated first and stop at the ones already synced
+    pulls_task['params'].update({'sort': 'updated', 'direction': 'desc'})
+    last_pr_updated_at = repo_state.get('last_pr_updated_at')
+    if last_pr_updated_at:
+        pulls_task['until'] = lambda pr: pr['updated_at'] < last_pr_updated_at
+    pulls_task['etag'] = repo_state.get('etags', {}).get('pulls')
+
+    return commits_task, pulls_task
+
+# Function to collect commits and pull requests for every repository concurrently, streaming each page into the sink,
+# returning the new sync state and the ids of the repositories with a page that could not be fetched.
+# With include_commits=False only pull requests are fetched, for when commits come from another source.
+def collect_repo_activity(repos_df, sink, headers, max_workers=DEFAULT_MAX_WORKERS, scheduler=None, sync_state=None, include_commits=True):
+    scheduler = scheduler or RequestScheduler()
+    scheduler.transport.session.headers.update(headers)
+
+    repos = list(repos_df[['ID', 'Name', 'Commits URL', 'Pulls URL']].itertuples(index=False, name=None))
+
+    # One task per repository for the commits endpoint, then one per repository for the pulls endpoint
+    commits_tasks, pulls_tasks = [], []
+    for repo_id, repo_name, commits_url, pulls_url in repos:
+        repo_state = sync_state.get(str(repo_id), {}) if sync_state is not None else None
+        commits_task, pulls_task = repo_tasks(repo_id, repo_name, commits_url, pulls_url, repo_state)
+        commits_tasks.append(commits_task)
+        pulls_tasks.append(pulls_task)
+
+    # Skipped commits endpoints leave the commit cursors and ETags of the sync state as they were
+    if not include_commits:
+        commits_tasks = []
+
+    results = fetch_all_pages(scheduler, commits_tasks + pulls_tasks, max_workers=max_workers, sink=sink)
+    commit_results, pull_request_results = results[:len(commits_tasks)], results[len(commits_tasks):]
+    if not include_commits:
+        commit_results = [{'etag': None, 'not_modified': False, 'newest': None}] * len(repos)
+
+    # Advance the sync cursors of every repository past what was just fetched. A repository with a failed page keeps
+    # its cursors, so the next run asks again for everything after them instead of skipping the pages that are missing.
+    new_sync_state, failed_repos = dict(sync_state or {}), []
+    for (repo_id, _, _, _), commits, pull_requests in zip(repos, commit_results, pull_request_results):
+        if commits.get('failed') or pull_requests.get('failed'):
+            failed_repos.append(repo_id)
+            continue
+        new_sync_state[str(repo_id)] = advance_repo_state(new_sync_state.get(str(repo_id)), commits, pull_requests)
+
+    return new_sync_state, failed_repos
+
+# Function to move a repository's sync cursors forward to the newest commit and pull request fetched
+def advance_repo_state(repo_state, commits, pull_requests):
+    repo_state = dict(repo_state or {})
+    etags = dict(repo_state.get('etags', {}))
+
+    newest_commit = commits['newest']
+    if newest_commit and newest_commit['commit']['committer']['date'] >= repo_state.get('last_commit_date', ''):
+        repo_state['last_commit_date'] = newest_commit['commit']['committer']['date']
+        repo_state['last_commit_sha'] = newest_commit['sha']
+
+    newest_pull_request = pull_requests['newest']
+    if newest_pull_request:
+        repo_state['last_pr_updated_at'] = max(newest_pull_request['updated_at'], repo_state.get('last_pr_updated_at', ''))
+
+    # Keep the ETag that matches the request the next run will send
+    if commits['etag']:
+        etags['commits'] = commits['etag']
+    if pull_requests['etag']:
+        etags['pulls'] = pull_requests['etag']
+    repo_state['etags'] = etags
+
+    return repo_state
@@ -0,0 +1,114 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+
+from data_collection.collector import fetch_page, page_number, DEFAULT_MAX_WORKERS
+from data_collection.storage import (read_table, read_frame, write_frame, iter_table_batches, table_exists, table_path, to_typed,
+                                     resolve_data_dir, TableWriter, TABLE_COLUMNS)
+
+# Number of commits fetched between two checkpoints, so an interrupted backfill keeps its progress
+STATS_BATCH_SIZE = 1_000
+
+# Name of the directory holding the batches of a backfill, one file per batch, until they are compacted into the stats table
+STATS_CHUNKS_DIR = 'commit_stats_chunks'
+
+# Column layout of the commit stats table
+COMMIT_STATS_COLUMNS = list(TABLE_COLUMNS['commit_stats'])
+
+# Function to build the URL of a single commit out of the repository's commits URL template
+def commit_url(commits_url, sha):
+    return commits_url.replace('{/sha}', f"/{sha}")
+
+# Function to fetch the line and file counts of one commit, or None if they could not be fetched
+def fetch_commit_stats(scheduler, url, sha):
+    commit, response = fetch_page(scheduler, url, {}, None, f"stats for commit {sha}")
+    if not commit:
+        return None
+
+    # The files of large commits are paged; the last page tells how many there are in total
+    files_changed = len(commit.get('files', []))
+    last_link = response.links.get('last')
+    if last_link and page_number(last_link):
+        last_commit, _ = fetch_page(scheduler, last_link['url'], {}, None, f"stats for commit {sha}")
+        if last_commit:
+            files_changed = files_changed * (page_number(last_link) - 1) + len(last_commit.get('files', []))
+
+    return [sha, commit['stats']['additions'], commit['stats']['deletions'], files_changed]
+
+# Function to read the SHAs already in the stats cache
+def cached_shas(data_dir=None):
+    if not table_exists('commit_stats', data_dir):
+        return set()
+    return set(read_table('commit_stats', data_dir, columns=['Commit Id'])['Commit Id'])
+
+# Function to get the directory holding the batches of a backfill
+def stats_chunks_dir(data_dir=None):
+    return os.path.join(resolve_data_dir(data_dir), STATS_CHUNKS_DIR)
+
+# Function to list the batches of a backfill in the order they were fetched
+def stats_chunk_paths(data_dir=None):
+    chunks_dir = stats_chunks_dir(data_dir)
+    if not os.path.isdir(chunks_dir):
+        return []
+    return [os.path.join(chunks_dir, name) for name in sorted(os.listdir(chunks_dir)) if name.endswith('.parquet')]
+
+# Function to save a batch of newly fetched rows as a file of its own, atomically; the file is the checkpoint of the batch,
+# so a backfill writes every row once instead of rewriting the whole table after every batch
+def append_stats(rows, data_dir=None):
+    stats_df = to_typed(pd.DataFrame(rows, columns=COMMIT_STATS_COLUMNS), 'commit_stats')
+    os.makedirs(stats_chunks_dir(data_dir), exist_ok=True)
+    write_frame(stats_df, 'commit_stats', os.path.join(stats_chunks_dir(data_dir), f"{len(stats_chunk_paths(data_dir)):06d}.parquet"))
+
+# Function to move the batches of a backfill into the stats table in one pass, copying the saved rows across once.
+# Rows already in the table (a compaction interrupted before its batches were removed) are not added twice,
+# and only the rows that were actually added are recorded in the change log.
+def compact_stats(data_dir=None, change_log=None):
+    chunk_paths = stats_chunk_paths(data_dir)
+    if not chunk_paths:
+        return
+
+    cached = cached_shas(data_dir)
+    writer = TableWriter('commit_stats', table_path('commit_stats', data_dir))
+    for saved_df in iter_table_batches('commit_stats', data_dir) if table_exists('commit_stats', data_dir) else []:
+        writer.write(saved_df)
+    for path in chunk_paths:
+        stats_df = read_frame(path)
+        stats_df = stats_df[~stats_df['Commit Id'].isin(cached) & ~stats_df['Commit Id'].duplicated()]
+        cached.update(stats_df['Commit Id'])
+        writer.write(stats_df)
+        if change_log is not None:
+            change_log.writer('commit_stats', 'added').write(stats_df)
+    writer.close()
+    shutil.rmtree(stats_chunks_dir(data_dir))
+
+# Function to fetch the stats of every commit in the commits table that is not in the stats cache yet.
+# A SHA never changes, so each commit is fetched once and every later run only pays for new commits.
+def collect_commit_stats(scheduler, repos_df, data_dir=None, max_workers=DEFAULT_MAX_WORKERS, batch_size=STATS_BATCH_SIZE, change_log=None):
+    # Batches an interrupted backfill already fetched are kept, and the ones it never compacted belong to the change of this run
+    compact_stats(data_dir, change_log)
+
+    commits_df = read_table('commits', data_dir, columns=['Repo Id', 'Commit Id'])
+    commits_urls = dict(zip(repos_df['ID'], repos_df['Commits URL']))
+    cached = cached_shas(data_dir)
+
+    # The same SHA can show up in several repositories (forks), its stats are fetched once
+    missing = commits_df[~commits_df['Commit Id'].isin(cached) & commits_df['Repo Id'].isin(commits_urls)]
+    missing = missing.drop_duplicates('Commit Id')
+    pending = [(commit_url(commits_urls[repo_id], sha), sha) for repo_id, sha in missing.itertuples(index=False, name=None)]
+
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            rows = [row for row in executor.map(lambda commit: fetch_commit_stats(scheduler, *commit), batch) if row is not None]
+
+            # Commits that failed are left out of the cache and asked for again by the next run
+            if rows:
+                append_stats(rows, data_dir)
+            fetched += len(rows)
+
+    compact_stats(data_dir, change_log)
+
+    print(f"Fetched stats for {fetched} commits, {len(cached)} already in the stats cache")
+    return fetched
@@ -0,0 +1,147 @@
+import base64
+import codecs
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from data_collection.collector import advance_repo_state, DEFAULT_MAX_WORKERS
+
+# Name of the directory holding one bare mirror per repository
+MIRRORS_DIR = 'git_mirrors'
+
+# Number of commits written per chunk while a log is streamed
+LOG_BATCH_ROWS = 50_000
+
+# Bytes read from git at a time while a log is streamed
+LOG_READ_SIZE = 1 << 20
+
+# One commit per record: fields are split by the unit separator and records end with the record separator.
+# The committer date is the one the REST API reports, printed in the same UTC form.
+LOG_FORMAT = '--format=%H%x1f%cd%x1f%an%x1f%ae%x1f%B%x1e'
+LOG_DATE = '--date=format-local:%Y-%m-%dT%H:%M:%SZ'
+
+# Function to get the path of the mirror of a repository; ids survive renames, names do not
+def mirror_path(mirrors_dir, repo_id):
+    return os.path.join(mirrors_dir, f"{repo_id}.git")
+
+# Function to build the environment that authenticates the HTTPS requests of git. The header is passed as configuration
+# through the environment (git 2.31+), so the token is neither written into the mirror's config nor visible on the
+# command line in the process list. Configuration the caller already passes this way is kept.
+def auth_env(access_token):
+    if not access_token:
+        return {}
+    credentials = base64.b64encode(f"x-access-token:{access_token}".encode()).decode()
+    index = int(os.environ.get('GIT_CONFIG_COUNT', 0))
+    return {
+        'GIT_CONFIG_COUNT': str(index + 1),
+        f"GIT_CONFIG_KEY_{index}": 'http.extraHeader',
+        f"GIT_CONFIG_VALUE_{index}": f"Authorization: Basic {credentials}",
+    }
+
+# Function to run a git command and return whether it succeeded, printing git's error if it did not
+def run_git(args, label, env=None):
+    result = subprocess.run(['git'] + args, stdin=subprocess.DEVNULL, capture_output=True, text=True, env={**os.environ, **(env or {})})
+    if result.returncode != 0:
+        print(f"Error {label}: {result.stderr.strip()}")
+    return result.returncode == 0
+
+# Function to clone a repository as a bare mirror, or fetch what changed if the mirror already exists
+def update_mirror(repo_url, path, access_token=None):
+    if not os.path.exists(path):
+        return run_git(['clone', '--mirror', '--quiet', repo_url, path], f"cloning {repo_url}", env=auth_env(access_token))
+
+    # Follow renames and transfers by pointing the mirror at the URL the API reports now
+    run_git(['--git-dir', path, 'remote', 'set-url', 'origin', repo_url], f"updating the remote of {path}")
+    return run_git(['--git-dir', path, 'fetch', '--prune', '--quiet', 'origin'], f"fetching {repo_url}", env=auth_env(access_token))
+
+# Function to clone or update the mirrors of several repositories in parallel, returning the mirror of every repository that is ready
+def update_mirrors(repos, mirrors_dir, access_token=None, max_workers=DEFAULT_MAX_WORKERS):
+    os.makedirs(mirrors_dir, exist_ok=True)
+
+    # Every git process waits on the network or the disk, so threads are enough to run them side by side
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        updated = list(executor.map(lambda repo: update_mirror(repo[1], mirror_path(mirrors_dir, repo[0]), access_token), repos))
+
+    return {repo_id: mirror_path(mirrors_dir, repo_id) for (repo_id, _), ok in zip(repos, updated) if ok}
+
+# Function to turn one record of the log into a row of the commits table
+def log_row(repo_id, record):
+    sha, date, author_name, author_email, message = record.split('\x1f', 4)
+    # The API drops the newline git keeps at the end of every message
+    return [repo_id, sha, date, message.rstrip('\n'), author_name, author_email]
+
+# Function to stream the commits of the default branch of a mirror, newest first, in batches of table rows
+def iter_log_rows(repo_id, path, since=None, batch_size=LOG_BATCH_ROWS):
+    since_args = [f"--since={since}"] if since else []
+    # git's errors go to a file rather than a pipe nobody reads until the log ends, which git could fill and block on
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(['git', '--git-dir', path, 'log', LOG_FORMAT, LOG_DATE] + since_args + ['HEAD'],
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=stderr_file, env={**os.environ, 'TZ': 'UTC'})
+        # A character can straddle two reads as well, so the bytes of an unfinished one are held back by the decoder
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        rows, pending = [], ''
+        while True:
+            data = process.stdout.read(LOG_READ_SIZE)
+            if not data:
+                break
+
+            # A record can straddle two reads, so the unfinished tail waits for the next one
+            records = (pending + decoder.decode(data)).split('\x1e')
+            pending = records.pop()
+            for record in records:
+                rows.append(log_row(repo_id, record.lstrip('\n')))
+            if len(rows) >= batch_size:
+                yield rows
+                rows = []
+
+        # An empty repository has no HEAD to log, which the API reports as an error too
+        if process.wait() != 0:
+            stderr_file.seek(0)
+            print(f"Error reading commits from {path}: {stderr_file.read().decode('utf-8', errors='replace').strip()}")
+    if rows:
+        yield rows
+
+# Function to read the commits of one mirror into the sink, returning the newest commit as the API would list it
+def read_mirror_commits(task, path, since, sink):
+    # Repositories finished by an interrupted run are not read again
+    result = sink.completed(task)
+    if result is not None:
+        return result
+
+    newest = None
+    for batch_no, rows in enumerate(iter_log_rows(task['repo_id'], path, since=since), start=1):
+        sink.add_rows(task, batch_no, rows)
+        newest_row = max(rows, key=lambda row: row[2])
+        if newest is None or newest_row[2] > newest['commit']['committer']['date']:
+            newest = {'sha': newest_row[1], 'commit': {'committer': {'date': newest_row[2]}}}
+
+    result = {'etag': None, 'not_modified': False, 'newest': newest}
+    sink.complete(task, result)
+    return result
+
+# Function to collect the commits of every repository from local mirrors instead of the REST API, returning the new
+# sync state and the ids of the repositories whose mirror could not be cloned or updated.
+# Mirrors are cloned or updated and then read in parallel, and no request counts against the rate limit.
+# In incremental mode only commits from the last synced commit date onwards are read.
+def collect_mirror_commits(repos_df, sink, mirrors_dir, access_token=None, max_workers=DEFAULT_MAX_WORKERS, sync_state=None, incremental=False):
+    repos = list(repos_df[['ID', 'Repository URL']].itertuples(index=False, name=None))
+    mirrors = update_mirrors(repos, mirrors_dir, access_token=access_token, max_workers=max_workers)
+
+    tasks = []
+    for repo_id, _ in repos:
+        if repo_id not in mirrors:
+            continue
+        since = (sync_state or {}).get(str(repo_id), {}).get('last_commit_date') if incremental else None
+        tasks.append(({'key': ('commits', repo_id), 'table': 'commits', 'repo_id': repo_id}, mirrors[repo_id], since))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda task: read_mirror_commits(task[0], task[1], task[2], sink), tasks))
+
+    # Advance the commit cursors the same way a REST sync does, leaving the pull request cursors alone
+    new_sync_state = dict(sync_state or {})
+    no_pull_requests = {'etag': None, 'not_modified': False, 'newest': None}
+    for (task, _, _), result in zip(tasks, results):
+        new_sync_state[str(task['repo_id'])] = advance_repo_state(new_sync_state.get(str(task['repo_id'])), result, no_pull_requests)
+
+    return new_sync_state, [repo_id for repo_id, _ in repos if repo_id not in mirrors]
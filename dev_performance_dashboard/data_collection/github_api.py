@@ -1,11 +1,36 @@
-from github import Github
 import pandas as pd
-import requests
 import os
 
-def fetch_data(access_token):
+from data_collection.collector import collect_repo_activity, DEFAULT_MAX_WORKERS
+from data_collection.scheduler import RequestScheduler
+from data_collection.repo_metadata import fetch_repos_bulk, fetch_repos_rest
+from data_collection.transport import Transport, create_session, create_github, DEFAULT_TIMEOUT
+from data_collection.sync_state import load_sync_state, save_sync_state, SYNC_STATE_FILE
+from data_collection.ingest import ChunkWriter, CHUNKS_DIR
+from data_collection.git_mirror import collect_mirror_commits, MIRRORS_DIR
+from data_collection.commit_stats import collect_commit_stats
+from data_collection.changes import ChangeLog
+from data_collection.identities import build_identities
+from data_collection.storage import resolve_data_dir, write_table, read_table, table_path, to_typed
+
+# Base URL of the GitHub REST API, overridable to point at GitHub Enterprise or a local stand-in server
+GITHUB_API_URL = 'https://api.github.com'
+
+# Raised when some repositories could not be fetched completely; the saved dataset is left as it was
+# and the pages fetched so far stay checkpointed, so running the sync again resumes it
+class SyncIncompleteError(Exception):
+    pass
+
+def fetch_data(access_token, max_workers=DEFAULT_MAX_WORKERS, base_url=GITHUB_API_URL, incremental=False, cache_mode='off', cache_dir=None, bulk_metadata=True, return_frames=True, data_dir=None, git_mirrors=False, mirrors_dir=None, commit_stats=False, timeout=DEFAULT_TIMEOUT):
+    # Get the directory the dataset is stored in
+    data_dir = resolve_data_dir(data_dir)
+    
+    # One pooled transport carries both the PyGithub calls and the REST loops, optionally recording or replaying responses;
+    # a request that gets no answer within the timeout is retried by the scheduler instead of holding its worker
+    transport = Transport(create_session(pool_size=max_workers * 2, timeout=timeout), cache_dir=cache_dir or os.path.join(data_dir, 'http_cache'), cache_mode=cache_mode)
+    
     # Initialize Github object using the token
-    g = Github(access_token)
+    g = create_github(transport, access_token, base_url)
     
     # Get the authenticated user's data
     user = g.get_user()
@@ -31,175 +56,83 @@ def fetch_data(access_token):
         'updated_at': user.updated_at,
     }
     
-    # Get the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    
-    # Initialize an empty list to store repository data
-    repos_data = []
-    
-    # Fetch all repositories of the authenticated user
-    repos = user.get_repos()
-    
-    # Iterate over all repositories
-    for repo in repos:
-        # Get repository languages
-        languages = repo.get_languages()
-        languages_str = ', '.join(languages.keys())  # Convert languages to a comma-separated string
-        
-        # Get contributors
-        contributors = repo.get_contributors()
-        contributors_list = [contributor.login for contributor in contributors]
-        contributors_str = ', '.join(contributors_list)  # Convert contributors to a comma-separated string
-        
-        # Create a dictionary for each repository
-        repo_info = {
-            'ID': repo.id,
-            'Name': repo.name,
-            'Description': repo.description or 'No description',
-            'Created at': repo.created_at,
-            'Updated at': repo.updated_at,
-            'Owner Login': repo.owner.login,
-            'License': repo.license.name if repo.license else 'None',
-            'Has Wiki': repo.has_wiki,
-            'Forks Count': repo.forks_count,
-            'Open Issues Count': repo.open_issues_count,
-            'Stargazers Count': repo.stargazers_count,
-            'Watchers Count': repo.watchers_count,
-            'Repository URL': repo.html_url,
-            'Commits URL': repo.commits_url,
-            'Languages URL': repo.languages_url,
-            'Pulls URL': repo.pulls_url,
-            'Languages': languages_str,  # Add languages to the repository info
-            'Contributors': contributors_str  # Add contributors to the repository info
-        }
-        
-        # Append the dictionary to the list
-        repos_data.append(repo_info)
-    
-    # Convert the list of dictionaries into a DataFrame
-    repos_df = pd.DataFrame(repos_data)
-    
-    # Save repository information to a CSV file
-    repos_csv_path = os.path.join(script_dir, 'repos_info.csv')
-    repos_df.to_csv(repos_csv_path, index=False)
-    print(f"Repository information saved to '{repos_csv_path}'")
-    
-    # Initialize a list to store commit information
-    commits_information = []
-    
     # Set up headers for authentication
     headers = {'Authorization': f'token {access_token}'}
     
-    # Iterate over the DataFrame to fetch commit information for each repository
-    for i in range(repos_df.shape[0]):
-        # Fetch the commits URL from the DataFrame
-        url = repos_df.loc[i, 'Commits URL'].replace('{/sha}', '')
-        page_no = 1
-        
-        while True:
-            # Construct the URL with pagination
-            paginated_url = f"{url}?page={page_no}"
-            
-            # Send GET request to fetch commit information with authentication
-            response = requests.get(paginated_url, headers=headers)
-            
-            # Check if the response is successful
-            if response.status_code != 200:
-                print(f"Error fetching commits for {repos_df.loc[i, 'Name']}: {response.status_code}")
-                break
-            
-            response_data = response.json()
-            
-            # Break the loop if no commits are found (end of pagination)
-            if not response_data:
-                break
-            
-            # Print the current URL and the number of commits fetched
-            # print(f"URL: {paginated_url}, Commits Fetched: {len(response_data)}")
-            
-            # Iterate over the commits and extract the required information
-            for commit in response_data:
-                commit_data = [
-                    repos_df.loc[i, 'ID'],                      # Repository ID
-                    commit['sha'],                              # Commit SHA
-                    commit['commit']['committer']['date'],      # Commit Date
-                    commit['commit']['message'],                # Commit Message
-                    commit['commit']['author']['name'],         # Commit Author Name
-                    commit['commit']['author']['email']         # Commit Author Email
-                ]
-                commits_information.append(commit_data)
-            
-            # If the current page contains fewer than 30 commits, it means it's the last page
-            if len(response_data) < 30:
-                break
-            
-            # Move to the next page
-            page_no += 1
-    
-    # Convert commit information to a DataFrame and save it to a CSV file
-    commits_df = pd.DataFrame(commits_information, columns=['Repo Id', 'Commit Id', 'Date', 'Message', 'Author Name', 'Author Email'])
-    commits_csv_path = os.path.join(script_dir, 'commits_info.csv')
-    commits_df.to_csv(commits_csv_path, index=False)
-    print(f"Commit information saved to '{commits_csv_path}'")
-    
-    # Initialize a list to store pull request information
-    pull_requests_information = []
-    
-    # Iterate over the DataFrame to fetch pull request information for each repository
-    for i in range(repos_df.shape[0]):
-        # Fetch the pulls URL from the DataFrame
-        url = repos_df.loc[i, 'Pulls URL'].replace('{/number}', '')
-        page_no = 1
-        
-        while True:
-            # Construct the URL with pagination
-            paginated_url = f"{url}?state=all&page={page_no}"
-            
-            # Send GET request to fetch pull request information with authentication
-            response = requests.get(paginated_url, headers=headers)
-            
-            # Check if the response is successful
-            if response.status_code != 200:
-                print(f"Error fetching pull requests for {repos_df.loc[i, 'Name']}: {response.status_code}")
-                break
-            
-            response_data = response.json()
-            
-            # Break the loop if no pull requests are found (end of pagination)
-            if not response_data:
-                break
-            
-            # Print the current URL and the number of pull requests fetched
-            # print(f"URL: {paginated_url}, Pull Requests Fetched: {len(response_data)}")
-            
-            # Iterate over the pull requests and extract the required information
-            for pr in response_data:
-                pr_data = [
-                    repos_df.loc[i, 'Name'],        # Repo Name
-                    pr['number'],                   # PR Number
-                    pr['title'],                    # Title of the pull request
-                    pr['user']['login'],            # Author Login
-                    pr['state'],                    # State (open/closed)
-                    pr['created_at'],               # Creation date
-                    pr['updated_at'],               # Last update date
-                    pr['merged_at'],                # Merged date
-                    pr['issue_url'].split('/')[-1], # Issue Id (Extracting ID from the URL)
-                    pr['user'].get('name', 'N/A'),  # PR Author Name, default to 'N/A' if not available
-                    pr['user'].get('email', 'N/A')  # PR Author Email, default to 'N/A' if not available
-                ]
-                pull_requests_information.append(pr_data)
-            
-            # If the current page contains fewer than 30 pull requests, it means it's the last page
-            if len(response_data) < 30:
-                break
-            
-            # Move to the next page
-            page_no += 1
-    
-    # Convert pull request information to a DataFrame and save it to a CSV file
-    pull_requests_df = pd.DataFrame(pull_requests_information, columns=['Repo Name', 'PR Number', 'Title', 'Author Login', 'State', 'Created At', 'Updated At', 'Merged At', 'Issue Id', 'Author Name', 'Author Email'])
-    pull_requests_csv_path = os.path.join(script_dir, 'pull_requests_info.csv')
-    pull_requests_df.to_csv(pull_requests_csv_path, index=False)
-    print(f"Pull request information saved to '{pull_requests_csv_path}'")
+    # Every raw REST and GraphQL request is paced against the rate limit by one shared scheduler
+    scheduler = RequestScheduler(transport)
+    transport.session.headers.update(headers)
+    
+    # Collect repository metadata in a few batched GraphQL queries, falling back to one REST round-trip per repository
+    repos_data = fetch_repos_bulk(scheduler, base_url, max_workers=max_workers) if bulk_metadata else None
+    if repos_data is None:
+        repos_data = fetch_repos_rest(user)
+    
+    # Convert the list of dictionaries into a DataFrame with the compact storage types
+    repos_df = to_typed(pd.DataFrame(repos_data), 'repos')
+    
+    # Save repository information to the typed table store
+    write_table(repos_df, 'repos', data_dir)
+    print(f"Repository information saved to '{table_path('repos', data_dir)}'")
+    
+    # In incremental mode, resume every repository from the cursors saved by the previous run
+    sync_state_path = os.path.join(data_dir, SYNC_STATE_FILE)
+    sync_state = load_sync_state(sync_state_path) if incremental else None
+    
+    # Every fetched page is written straight to disk as a chunk, so an interrupted run can resume from its checkpoints
+    chunk_writer = ChunkWriter(os.path.join(data_dir, CHUNKS_DIR), {'base_url': base_url, 'incremental': incremental, 'git_mirrors': git_mirrors})
+    
+    # Fetch commit and pull request information for all repositories concurrently, paced against the rate limit
+    sync_state, failed_repos = collect_repo_activity(repos_df, chunk_writer, headers, max_workers=max_workers, scheduler=scheduler, sync_state=sync_state, include_commits=not git_mirrors)
+    
+    # With git mirrors the commit history is read from local bare clones, which costs no API quota
+    if git_mirrors:
+        sync_state, failed_mirrors = collect_mirror_commits(repos_df, chunk_writer, mirrors_dir or os.path.join(data_dir, MIRRORS_DIR), access_token=access_token, max_workers=max_workers, sync_state=sync_state, incremental=incremental)
+        failed_repos = sorted(set(failed_repos) | set(failed_mirrors))
+    
+    # Report how much of the rate limit the sync used
+    quota = scheduler.quota_report()
+    print(f"Sync used {quota['quota_used']} requests of quota ({quota['not_modified']} more answered 304 Not Modified, {quota['cached']} served from cache, {quota['retries']} retries), {quota['remaining']} remaining")
+    
+    # Compacting now would replace the saved tables with rows that miss the failed pages, so the tables, the sync state
+    # and the checkpoints are all kept as they are: the next run only fetches what is still missing
+    if failed_repos:
+        raise SyncIncompleteError(f"Could not fetch every page of {len(failed_repos)} repositories {failed_repos}; "
+                                  f"the saved data is unchanged, run the sync again to resume from '{chunk_writer.chunks_dir}'")
+    
+    # An incremental sync records the rows it adds and replaces, so aggregates kept from the tables can follow the delta
+    change_log = ChangeLog(data_dir) if incremental else None
+    
+    # Assemble the commit chunks into the commits table, merging them into the saved commits in incremental mode
+    repo_ids = repos_df['ID'].tolist() if not repos_df.empty else []
+    chunk_writer.compact('commits', repo_ids, data_dir, ['Repo Id', 'Commit Id'] if incremental else None, change_log)
+    print(f"Commit information saved to '{table_path('commits', data_dir)}'")
+    
+    # Assemble the pull request chunks into the pull requests table the same way
+    chunk_writer.compact('pull_requests', repo_ids, data_dir, ['Repo Name', 'PR Number'] if incremental else None, change_log)
+    print(f"Pull request information saved to '{table_path('pull_requests', data_dir)}'")
+    
+    # Save the sync cursors only after the dataset they describe has been written, then drop the checkpoints
+    save_sync_state(sync_state_path, sync_state)
+    chunk_writer.clear()
+    
+    # Fetch the lines added and deleted and the files changed of every commit missing from the stats cache
+    if commit_stats:
+        collect_commit_stats(scheduler, repos_df, data_dir, max_workers=max_workers, change_log=change_log)
+        print(f"Commit stats saved to '{table_path('commit_stats', data_dir)}'")
+    
+    if change_log is not None:
+        change_log.commit()
+    
+    # Link the names, emails and logins of the synced authors to one developer id each, for every metric to be keyed by
+    build_identities(data_dir)
+    print(f"Developer identities saved to '{table_path('identities', data_dir)}'")
+    
+    # Loading the full tables back is optional so batch syncs of large orgs stay within flat memory
+    if not return_frames:
+        return user_data, repos_df, None, None
+    
+    commits_df = read_table('commits', data_dir)
+    pull_requests_df = read_table('pull_requests', data_dir)
     
     return user_data, repos_df, commits_df, pull_requests_df
@@ -0,0 +1,212 @@
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+
+from data_collection.storage import read_table, write_table, iter_table_batches, table_exists, dataset_fingerprint
+
+# Columns every table names its authors by, with the kind of identifier each one holds
+AUTHOR_COLUMNS = {
+    'commits': {'Author Name': 'name', 'Author Email': 'email'},
+    'pull_requests': {'Author Login': 'login', 'Author Name': 'name', 'Author Email': 'email'},
+}
+
+# Kinds of identifier, in the order the canonical developer id is picked from and a bare value is looked up in
+IDENTIFIER_KINDS = ['login', 'email', 'name']
+
+# Kinds of identifier that belong to one person only; identifiers are linked into one developer on these,
+# never on a name, which different people can share, unless the name is exactly a known login
+LINKING_KINDS = ['login', 'email']
+
+# Kind of identifier every author column holds
+COLUMN_KINDS = {column: kind for columns in AUTHOR_COLUMNS.values() for column, kind in columns.items()}
+
+# Values the collector writes when the API leaves a field out (the pull request list has no author name or email);
+# they name nobody and are treated as missing
+PLACEHOLDER_IDENTIFIERS = {'n/a'}
+
+# GitHub's private commit emails, '<id>+<login>@users.noreply.github.com' or the older '<login>@users.noreply.github.com'
+NOREPLY_EMAIL = re.compile(r'^(?:\d+\+)?(?P<login>[^@]+)@users\.noreply\.github\.com$', re.IGNORECASE)
+
+# Characters stripped from the ends of the words of a query before they are looked up
+QUERY_PUNCTUATION = '.,;:!?"\'()'
+
+# Builds of the identity index are run one at a time within a process
+IDENTITIES_LOCK = threading.Lock()
+
+# Function to bring a name, email or login to the form it is matched in: single spaces, lowercase for emails and logins
+# (which GitHub matches without case) but not for names, or None if empty or a placeholder
+def normalize_identifier(value, kind=None):
+    if value is None or pd.isna(value):
+        return None
+    identifier = ' '.join(str(value).split())
+    if identifier.lower() in PLACEHOLDER_IDENTIFIERS:
+        return None
+    return (identifier if kind == 'name' else identifier.lower()) or None
+
+# Function to get the login a GitHub noreply email stands for, or None for any other email
+def noreply_login(email):
+    match = NOREPLY_EMAIL.match(email)
+    return match.group('login') if match else None
+
+# Function to count the rows behind every combination of author identifiers in the commits and pull requests,
+# reading the tables in batches so only the distinct combinations are ever held in memory
+def count_identifiers(data_dir=None):
+    identifiers = Counter()
+    for table, columns in AUTHOR_COLUMNS.items():
+        if not table_exists(table, data_dir):
+            continue
+        for batch in iter_table_batches(table, data_dir, columns=list(columns)):
+            # Missing identifiers are grouped as empty strings, since categorical groupby keys cannot hold them
+            for values, rows in batch.astype(object).fillna('').groupby(list(columns)).size().items():
+                identifiers[tuple((kind, value) for kind, value in zip(columns.values(), values) if normalize_identifier(value, kind))] += rows
+    return identifiers
+
+# Function to find the representative of a node in the union-find forest, halving the path on the way
+def find_root(parents, node):
+    while parents[node] != node:
+        parents[node] = parents[parents[node]]
+        node = parents[node]
+    return node
+
+# Function to build the identity index of a data directory and save it as the identities table.
+# Emails and logins that appear on the same commit or pull request are one developer, and so are a noreply email
+# and its login. Commits carry no login, so a commit name that is exactly a login seen anywhere in the dataset
+# (compared without case, as GitHub does) links its emails to that login. Other names link nothing: every name belongs
+# to the developer it appears with on the most rows, and a name that never appears with an email or login is a developer
+# of its own. Every developer is known by their most active login, or their most active email or name if they have
+# no login, and named by their most frequent name.
+def build_identities(data_dir=None):
+    parents, weights, spellings = {}, Counter(), defaultdict(Counter)
+    name_weights, name_links = Counter(), defaultdict(Counter)
+    for identifiers, rows in count_identifiers(data_dir).items():
+        nodes, names = [], []
+        for kind, value in identifiers:
+            if kind not in LINKING_KINDS:
+                names.append(normalize_identifier(value, kind))
+                continue
+
+            named = [(kind, str(value))]
+            # A noreply email also names the login it was issued for
+            if kind == 'email' and noreply_login(str(value)):
+                named.append(('login', noreply_login(str(value))))
+
+            for kind, value in named:
+                node = (kind, normalize_identifier(value, kind))
+                parents.setdefault(node, node)
+                weights[node] += rows
+                spellings[node][value] += rows
+                nodes.append(node)
+
+        for node in nodes[1:]:
+            parents[find_root(parents, node)] = find_root(parents, nodes[0])
+        for name in names:
+            name_weights[name] += rows
+            name_links[name][nodes[0] if nodes else None] += rows
+
+    for name in sorted(name_links):
+        login = ('login', normalize_identifier(name, 'login'))
+        if login in parents:
+            for node in name_links[name]:
+                if node is not None:
+                    parents[find_root(parents, node)] = find_root(parents, login)
+            # Rows the name appeared on without an email belong to the login as well
+            name_links[name][login] += name_links[name].pop(None, 0)
+
+    clusters = defaultdict(list)
+    for node in sorted(parents):
+        clusters[find_root(parents, node)].append(node)
+
+    # Ties go to the identifier first in sorted order, so the same tables always give the same ids
+    cluster_names = defaultdict(list)
+    for name in sorted(name_links):
+        linked = sorted((node, rows) for node, rows in name_links[name].items() if node is not None)
+        if linked:
+            cluster_names[find_root(parents, max(linked, key=lambda link: link[1])[0])].append(name)
+        else:
+            clusters[('name', name)] = []
+            cluster_names[('name', name)].append(name)
+
+    rows = []
+    for root, nodes in clusters.items():
+        names = cluster_names[root]
+        if nodes:
+            by_kind = {kind: [node for node in nodes if node[0] == kind] for kind in LINKING_KINDS}
+            id_node = max(next(by_kind[kind] for kind in LINKING_KINDS if by_kind[kind]), key=weights.get)
+            developer_id = spellings[id_node].most_common(1)[0][0]
+        else:
+            developer_id = names[0]
+        developer_name = max(names, key=name_weights.get) if names else developer_id
+        rows.extend([kind, identifier, developer_id, developer_name] for kind, identifier in nodes)
+        rows.extend(['name', name, developer_id, developer_name] for name in names)
+
+    identities_df = pd.DataFrame(rows, columns=['Kind', 'Identifier', 'Developer Id', 'Developer Name'])
+    write_table(identities_df, 'identities', data_dir)
+    return identities_df
+
+# Function to check whether the identities table was built after the commits and pull requests were last written
+def identities_current(data_dir=None):
+    fingerprint = json.loads(dataset_fingerprint(data_dir, ['identities'] + list(AUTHOR_COLUMNS)))
+    if fingerprint['identities'] is None:
+        return False
+    return all(fingerprint[table] is None or fingerprint[table][1] <= fingerprint['identities'][1] for table in AUTHOR_COLUMNS)
+
+# Function to load the identity index of a data directory, building it first if it is missing or older than the tables
+def load_identities(data_dir=None):
+    with IDENTITIES_LOCK:
+        if not identities_current(data_dir):
+            build_identities(data_dir)
+        return IdentityIndex(read_table('identities', data_dir))
+
+# Index from every name, email and login to the canonical id of the developer it belongs to
+class IdentityIndex:
+    def __init__(self, identities_df):
+        kinds = identities_df['Kind'].astype(object)
+        self.identifiers = {kind: dict(zip(identities_df['Identifier'][kinds == kind], identities_df['Developer Id'][kinds == kind].astype(object)))
+                            for kind in IDENTIFIER_KINDS}
+        self.names = dict(zip(identities_df['Developer Id'].astype(object), identities_df['Developer Name'].astype(object)))
+        # Names typed without their case (as in a query) go to the developer of the first spelling in sorted order
+        self.folded_names = {}
+        for name in sorted(self.identifiers['name']):
+            self.folded_names.setdefault(name.lower(), self.identifiers['name'][name])
+        # Longest identifier in words, which bounds the phrases of a query worth looking up
+        self.max_words = max((len(identifier.split()) for identifier in identities_df['Identifier']), default=1)
+
+    # Function to get the developer id of a name, email, login or developer id, or None if it is unknown.
+    # Logins and emails are tried before names, and a name spelled exactly before one spelled in another case.
+    def lookup(self, value):
+        for kind in IDENTIFIER_KINDS:
+            developer_id = self.identifiers[kind].get(normalize_identifier(value, kind))
+            if developer_id is not None:
+                return developer_id
+        node = normalize_identifier(value)
+        return self.folded_names.get(node) if node is not None else None
+
+    # Function to map a column of author identifiers of one kind to developer ids, looking up every distinct value once.
+    # Authors the index does not know yet (rows written after it was built) keep their own value as their id.
+    def resolve(self, values, kind):
+        codes, uniques = pd.factorize(values)
+        developer_ids = [self.identifiers[kind].get(normalize_identifier(value, kind), value) for value in uniques] + [None]
+        return pd.Series(np.asarray(developer_ids, dtype=object)[codes], index=values.index, dtype=object).astype('category')
+
+    # Function to get the display name of a developer
+    def name(self, developer_id):
+        return self.names.get(developer_id, developer_id)
+
+    # Function to find the first developer named in a free-text query, trying the longest phrases first.
+    # Every phrase of up to max_words words is a few dictionary lookups, however many developers there are.
+    def find(self, text):
+        words = [word.strip(QUERY_PUNCTUATION) for word in text.split()]
+        words = [word[:-2] if word.lower().endswith("'s") else word for word in words]
+        for length in range(min(self.max_words, len(words)), 0, -1):
+            for start in range(len(words) - length + 1):
+                developer_id = self.lookup(' '.join(words[start:start + length]))
+                if developer_id is not None:
+                    return developer_id
+        return None
+
+if __name__ == "__main__":
+    identities_df = build_identities()
+    print(identities_df.groupby(['Developer Id', 'Developer Name'])['Identifier'].apply(', '.join).to_string())
@@ -0,0 +1,133 @@
+import json
+import os
+import shutil
+import pandas as pd
+
+from data_collection.collector import commit_row, pull_request_row, COMMIT_COLUMNS, PULL_REQUEST_COLUMNS
+from data_collection.storage import to_typed, write_frame, read_frame, iter_table_batches, table_path, TableWriter
+
+# Name of the directory holding the page chunks and checkpoints of the run in progress
+CHUNKS_DIR = 'ingest_chunks'
+
+# Number of rows read at a time when rewriting an existing table
+COMPACT_CHUNK_ROWS = 100_000
+
+# Column layout and row builder of every table written by the ingestion
+TABLES = {
+    'commits': {'columns': COMMIT_COLUMNS, 'row': lambda task, item: commit_row(task['repo_id'], item)},
+    'pull_requests': {'columns': PULL_REQUEST_COLUMNS, 'row': lambda task, item: pull_request_row(task['repo_name'], item)},
+}
+
+# Page sink that writes every fetched page to disk as soon as it arrives, so memory stays flat
+# and an interrupted run can pick up from the pages and endpoints it already finished
+class ChunkWriter:
+    def __init__(self, chunks_dir, run_config):
+        self.chunks_dir = chunks_dir
+
+        # Checkpoints are only resumed by a run asking for the same data, anything else starts over
+        run_path = os.path.join(chunks_dir, 'run.json')
+        if os.path.exists(run_path):
+            with open(run_path) as f:
+                if json.load(f) != run_config:
+                    shutil.rmtree(chunks_dir)
+        elif os.path.exists(chunks_dir):
+            shutil.rmtree(chunks_dir)
+
+        os.makedirs(chunks_dir, exist_ok=True)
+        with open(run_path, 'w') as f:
+            json.dump(run_config, f)
+
+    def task_dir(self, task):
+        return os.path.join(self.chunks_dir, task['table'], str(task['repo_id']))
+
+    def page_path(self, task, page_no):
+        return os.path.join(self.task_dir(task), f"{page_no:06d}.parquet")
+
+    # Function to read the result of an endpoint an earlier attempt already finished, or None
+    def completed(self, task):
+        marker_path = os.path.join(self.task_dir(task), 'complete.json')
+        if not os.path.exists(marker_path):
+            return None
+
+        with open(marker_path) as f:
+            return json.load(f)
+
+    def has_page(self, task, page_no):
+        return os.path.exists(self.page_path(task, page_no))
+
+    # Function to turn a page of API items into a typed columnar chunk
+    def add_page(self, task, page_no, items):
+        table = TABLES[task['table']]
+        self.add_rows(task, page_no, [table['row'](task, item) for item in items])
+
+    # Function to write a batch of ready-made table rows as a chunk, atomically
+    def add_rows(self, task, page_no, rows):
+        chunk_df = pd.DataFrame(rows, columns=TABLES[task['table']]['columns'])
+
+        os.makedirs(self.task_dir(task), exist_ok=True)
+        write_frame(to_typed(chunk_df, task['table']), task['table'], self.page_path(task, page_no))
+
+    # Function to checkpoint an endpoint once all of its pages are on disk
+    def complete(self, task, result):
+        marker_path = os.path.join(self.task_dir(task), 'complete.json')
+        os.makedirs(self.task_dir(task), exist_ok=True)
+        with open(f"{marker_path}.tmp", 'w') as f:
+            json.dump(result, f)
+        os.replace(f"{marker_path}.tmp", marker_path)
+
+    # Function to list the chunk files of a table in repository order and page order
+    def chunk_paths(self, table, repo_ids):
+        paths = []
+        for repo_id in repo_ids:
+            repo_dir = os.path.join(self.chunks_dir, table, str(repo_id))
+            if os.path.isdir(repo_dir):
+                paths.extend(os.path.join(repo_dir, name) for name in sorted(os.listdir(repo_dir)) if name.endswith('.parquet'))
+        return paths
+
+    # Function to assemble the chunks of a table into its stored file, one chunk at a time.
+    # With key_columns the chunks are merged into the existing table: a newly fetched row replaces the saved copy.
+    # With a change_log the replaced saved rows and the appended rows are recorded in it as well.
+    def compact(self, table, repo_ids, data_dir, key_columns=None, change_log=None):
+        chunk_paths = self.chunk_paths(table, repo_ids)
+
+        # Only the keys of the new rows are held in memory, never the rows themselves
+        new_keys = set()
+        if key_columns is not None:
+            for chunk_path in chunk_paths:
+                new_keys.update(row_keys(read_frame(chunk_path, columns=key_columns), key_columns))
+
+        writer = TableWriter(table, table_path(table, data_dir))
+
+        # Carry over the saved rows that were not fetched again
+        if key_columns is not None:
+            for existing_df in iter_table_batches(table, data_dir, batch_size=COMPACT_CHUNK_ROWS):
+                replaced = row_keys(existing_df, key_columns).isin(new_keys)
+                writer.write(existing_df[~replaced])
+                if change_log is not None and replaced.any():
+                    change_log.writer(table, 'removed').write(existing_df[replaced])
+
+        # Append the new rows, dropping rows fetched twice in this run
+        seen_keys = set()
+        for chunk_path in chunk_paths:
+            chunk_df = read_frame(chunk_path)
+            if key_columns is not None:
+                keys = row_keys(chunk_df, key_columns)
+                keep = ~keys.isin(seen_keys) & ~keys.duplicated()
+                seen_keys.update(keys[keep])
+                chunk_df = chunk_df[keep]
+            writer.write(chunk_df)
+            if change_log is not None:
+                change_log.writer(table, 'added').write(chunk_df)
+
+        writer.close()
+
+    # Function to remove the chunks and checkpoints once the run is complete
+    def clear(self):
+        shutil.rmtree(self.chunks_dir, ignore_errors=True)
+
+# Function to build one hashable key per row out of the key columns
+def row_keys(df, key_columns):
+    keys = df[key_columns[0]].astype(str)
+    if len(key_columns) > 1:
+        keys = keys.str.cat([df[column].astype(str) for column in key_columns[1:]], sep='\x1f')
+    return keys
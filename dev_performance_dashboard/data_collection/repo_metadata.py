@@ -0,0 +1,171 @@
+import json
+from datetime import datetime
+import requests
+
+from data_collection.collector import fetch_all_pages, PageCollector, DEFAULT_MAX_WORKERS
+
+# GraphQL query paging over the viewer's repositories with their languages and open issue counts inline
+REPOSITORIES_QUERY = """
+query($cursor: String) {
+  viewer {
+    repositories(first: 100, after: $cursor, ownerAffiliations: [OWNER, COLLABORATOR, ORGANIZATION_MEMBER], orderBy: {field: NAME, direction: ASC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        databaseId
+        name
+        nameWithOwner
+        description
+        createdAt
+        updatedAt
+        url
+        hasWikiEnabled
+        forkCount
+        stargazerCount
+        owner { login }
+        licenseInfo { name }
+        openIssues: issues(states: OPEN) { totalCount }
+        openPullRequests: pullRequests(states: OPEN) { totalCount }
+        languages(first: 100, orderBy: {field: SIZE, direction: DESC}) { nodes { name } }
+      }
+    }
+  }
+}
+"""
+
+# Function to work out the GraphQL endpoint that goes with a REST base URL
+def graphql_url(base_url):
+    # GitHub Enterprise serves REST under /api/v3 and GraphQL under /api/graphql
+    if base_url.rstrip('/').endswith('/v3'):
+        return base_url.rstrip('/')[:-len('/v3')] + '/graphql'
+    return base_url.rstrip('/') + '/graphql'
+
+# Function to parse a GraphQL timestamp into the same timezone-aware datetime PyGithub returns
+def parse_timestamp(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+# Function to page through every repository of the viewer with a handful of GraphQL queries
+def fetch_repository_nodes(scheduler, base_url):
+    nodes = []
+    cursor = None
+
+    while True:
+        payload = json.dumps({'query': REPOSITORIES_QUERY, 'variables': {'cursor': cursor}})
+        # Any failure means the caller falls back to the REST path, including a server error or rate limit
+        # the scheduler gave up retrying on
+        try:
+            response = scheduler.request('POST', graphql_url(base_url), headers={'Content-Type': 'application/json'}, data=payload)
+        except requests.RequestException as e:
+            print(f"Error fetching repositories through GraphQL: {e}")
+            return None
+
+        if response.status_code != 200:
+            print(f"Error fetching repositories through GraphQL: {response.status_code}")
+            return None
+        response_data = response.json()
+        if response_data.get('errors') or not response_data.get('data'):
+            print(f"Error fetching repositories through GraphQL: {response_data.get('errors')}")
+            return None
+
+        repositories = response_data['data']['viewer']['repositories']
+        nodes.extend(repositories['nodes'])
+
+        if not repositories['pageInfo']['hasNextPage']:
+            break
+        cursor = repositories['pageInfo']['endCursor']
+
+    # Match the full_name order the REST /user/repos endpoint returns
+    return sorted(nodes, key=lambda node: node['nameWithOwner'].lower())
+
+# Function to turn a GraphQL repository node into the same row the REST path builds
+def repo_info_from_node(node, base_url):
+    api_url = f"{base_url.rstrip('/')}/repos/{node['nameWithOwner']}"
+    return {
+        'ID': node['databaseId'],
+        'Name': node['name'],
+        'Description': node['description'] or 'No description',
+        'Created at': parse_timestamp(node['createdAt']),
+        'Updated at': parse_timestamp(node['updatedAt']),
+        'Owner Login': node['owner']['login'],
+        'License': node['licenseInfo']['name'] if node['licenseInfo'] else 'None',
+        'Has Wiki': node['hasWikiEnabled'],
+        'Forks Count': node['forkCount'],
+        # The REST open_issues_count includes open pull requests
+        'Open Issues Count': node['openIssues']['totalCount'] + node['openPullRequests']['totalCount'],
+        'Stargazers Count': node['stargazerCount'],
+        # The REST watchers_count is a legacy alias of the stargazer count
+        'Watchers Count': node['stargazerCount'],
+        'Repository URL': node['url'],
+        'Commits URL': f"{api_url}/commits{{/sha}}",
+        'Languages URL': f"{api_url}/languages",
+        'Pulls URL': f"{api_url}/pulls{{/number}}",
+        'Languages': ', '.join(language['name'] for language in node['languages']['nodes']),
+    }
+
+# Function to fetch the contributors of every repository concurrently
+def fetch_contributors(scheduler, repos_data, base_url, max_workers=DEFAULT_MAX_WORKERS):
+    # GraphQL has no equivalent of the REST contributors list, so it stays on REST but runs in parallel
+    tasks = [{'key': ('contributors', repo_info['ID']),
+              'url': f"{base_url.rstrip('/')}/repos/{repo_info['Owner Login']}/{repo_info['Name']}/contributors",
+              'params': {}, 'label': f"contributors for {repo_info['Name']}"} for repo_info in repos_data]
+    collector = PageCollector()
+    fetch_all_pages(scheduler, tasks, max_workers=max_workers, sink=collector)
+    return [', '.join(contributor['login'] for contributor in collector.items(task)) for task in tasks]
+
+# Function to collect repository metadata in a few batched GraphQL queries, or None if GraphQL is unavailable
+def fetch_repos_bulk(scheduler, base_url, max_workers=DEFAULT_MAX_WORKERS):
+    nodes = fetch_repository_nodes(scheduler, base_url)
+    if nodes is None:
+        return None
+
+    repos_data = [repo_info_from_node(node, base_url) for node in nodes]
+    contributors = fetch_contributors(scheduler, repos_data, base_url, max_workers=max_workers)
+    for repo_info, contributors_str in zip(repos_data, contributors):
+        repo_info['Contributors'] = contributors_str
+
+    return repos_data
+
+# Function to collect repository metadata through PyGithub, one repository at a time
+def fetch_repos_rest(user):
+    # Initialize an empty list to store repository data
+    repos_data = []
+
+    # Fetch all repositories of the authenticated user
+    repos = user.get_repos()
+
+    # Iterate over all repositories
+    for repo in repos:
+        # Get repository languages
+        languages = repo.get_languages()
+        languages_str = ', '.join(languages.keys())  # Convert languages to a comma-separated string
+
+        # Get contributors
+        contributors = repo.get_contributors()
+        contributors_list = [contributor.login for contributor in contributors]
+        contributors_str = ', '.join(contributors_list)  # Convert contributors to a comma-separated string
+
+        # Create a dictionary for each repository
+        repo_info = {
+            'ID': repo.id,
+            'Name': repo.name,
+            'Description': repo.description or 'No description',
+            'Created at': repo.created_at,
+            'Updated at': repo.updated_at,
+            'Owner Login': repo.owner.login,
+            'License': repo.license.name if repo.license else 'None',
+            'Has Wiki': repo.has_wiki,
+            'Forks Count': repo.forks_count,
+            'Open Issues Count': repo.open_issues_count,
+            'Stargazers Count': repo.stargazers_count,
+            'Watchers Count': repo.watchers_count,
+            'Repository URL': repo.html_url,
+            'Commits URL': repo.commits_url,
+            'Languages URL': repo.languages_url,
+            'Pulls URL': repo.pulls_url,
+            'Languages': languages_str,  # Add languages to the repository info
+            'Contributors': contributors_str  # Add contributors to the repository info
+        }
+
+        # Append the dictionary to the list
+        repos_data.append(repo_info)
+
+    return repos_data
@@ -0,0 +1,151 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+import requests
+
+from data_collection.transport import Transport
+
+# Number of times a request is retried after a transient server error, a timeout or a rate limit pause
+DEFAULT_MAX_RETRIES = 5
+
+# Base delay in seconds for the exponential backoff between retries
+DEFAULT_BACKOFF = 1.0
+
+# Status codes that mean the request can be retried as-is
+TRANSIENT_STATUS_CODES = {500, 502, 503, 504}
+
+# Rate limit resource of REST requests; GitHub keeps a separate quota per resource and names it in X-RateLimit-Resource
+DEFAULT_RESOURCE = 'core'
+
+# Function to work out which rate limit resource a request counts against before GitHub says so in the response
+def request_resource(url):
+    path = urlparse(url).path.rstrip('/')
+    if path.endswith('/graphql'):
+        return 'graphql'
+    if '/search/' in f"{path}/":
+        return 'search'
+    return DEFAULT_RESOURCE
+
+# Shared scheduler that paces every request against the GitHub rate limit of its resource,
+# so a spent GraphQL quota does not hold back REST requests or the other way round
+class RequestScheduler:
+    def __init__(self, transport=None, max_retries=DEFAULT_MAX_RETRIES, backoff=DEFAULT_BACKOFF):
+        self.transport = transport or Transport()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.lock = threading.Lock()
+        self.resume_at = defaultdict(float)
+        self.remaining = {}
+        self.reset_at = {}
+        self.requests_sent = 0
+        self.not_modified = 0
+        self.cached = 0
+        self.retries = 0
+
+    # Function to send a request, pausing for the rate limit and retrying transient failures
+    def request(self, method, url, params=None, headers=None, data=None):
+        resource = request_resource(url)
+        for attempt in range(self.max_retries + 1):
+            self.wait_for_quota(resource)
+            try:
+                response = self.transport.request(method, url, params=params, headers=headers, data=data)
+            except requests.Timeout:
+                # A connection that stalled is retried like a transient server error, and the timeout raised once out of retries
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, self.backoff * 2 ** attempt)
+            else:
+                resource = self.record(response, resource)
+                delay = self.retry_delay(response, attempt)
+                if delay is None or attempt == self.max_retries:
+                    break
+
+            with self.lock:
+                self.retries += 1
+                self.resume_at[resource] = max(self.resume_at[resource], time.time() + delay)
+
+        # Running out of retries on a rate limit or server error must not silently truncate the data
+        if response.status_code in TRANSIENT_STATUS_CODES or self.is_rate_limited(response):
+            response.raise_for_status()
+
+        return response
+
+    # Function to send a GET request through the scheduler
+    def get(self, url, params=None, headers=None):
+        return self.request('GET', url, params=params, headers=headers)
+
+    # Function to block the workers sending requests against a resource while its quota is exhausted or a retry pause is pending
+    def wait_for_quota(self, resource=DEFAULT_RESOURCE):
+        with self.lock:
+            resume_at = self.resume_at[resource]
+            if self.remaining.get(resource) == 0 and self.reset_at.get(resource):
+                resume_at = max(resume_at, self.reset_at[resource])
+
+        delay = resume_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    # Function to keep track of the quota GitHub reports for the resource of a response and the requests spent against it,
+    # returning the resource the response counted against
+    def record(self, response, resource=DEFAULT_RESOURCE):
+        with self.lock:
+            # Responses answered from the response cache never reached GitHub
+            if getattr(response, 'from_cache', False):
+                self.cached += 1
+                return resource
+
+            self.requests_sent += 1
+            if response.status_code == 304:
+                self.not_modified += 1
+
+            resource = response.headers.get('X-RateLimit-Resource', resource)
+            remaining = response.headers.get('X-RateLimit-Remaining')
+            reset = response.headers.get('X-RateLimit-Reset')
+            if remaining is not None:
+                self.remaining[resource] = int(remaining)
+            if reset is not None:
+                self.reset_at[resource] = float(reset)
+            return resource
+
+    # Function to check whether a response was rejected by the primary or secondary rate limit
+    def is_rate_limited(self, response):
+        if response.status_code == 429:
+            return True
+        return response.status_code == 403 and (
+            'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0'
+        )
+
+    # Function to work out how long to wait before retrying a response, or None if it should not be retried
+    def retry_delay(self, response, attempt):
+        if self.is_rate_limited(response):
+            # Secondary rate limits say how long to wait, the primary one says when the quota resets
+            if 'Retry-After' in response.headers:
+                return float(response.headers['Retry-After'])
+            reset = response.headers.get('X-RateLimit-Reset')
+            if reset is not None:
+                return max(float(reset) - time.time(), 0) + 1
+            return self.backoff * 2 ** attempt
+
+        if response.status_code in TRANSIENT_STATUS_CODES:
+            # Full jitter keeps the workers from retrying in lockstep
+            return random.uniform(0, self.backoff * 2 ** attempt)
+
+        return None
+
+    # Function to summarise how much of the rate limit the requests sent so far used; the remaining quota and its reset
+    # time are those of REST requests, and those of every resource seen are listed by resource
+    def quota_report(self):
+        with self.lock:
+            return {
+                'requests': self.requests_sent,
+                'not_modified': self.not_modified,
+                'cached': self.cached,
+                'quota_used': self.requests_sent - self.not_modified,
+                'retries': self.retries,
+                'remaining': self.remaining.get(DEFAULT_RESOURCE),
+                'reset_at': self.reset_at.get(DEFAULT_RESOURCE),
+                'resources': {resource: {'remaining': remaining, 'reset_at': self.reset_at.get(resource)}
+                              for resource, remaining in self.remaining.items()},
+            }
@@ -0,0 +1,261 @@
+import json
+import operator
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Environment variable overriding where the dataset is stored
+DATA_DIR_ENV = 'DEV_DASHBOARD_DATA_DIR'
+
+# Default data directory: next to the collector, where the CSV files always lived
+DEFAULT_DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Base file name of every table; the typed copy is '<name>.parquet', the legacy copy '<name>.csv'
+TABLE_FILES = {
+    'repos': 'repos_info',
+    'commits': 'commits_info',
+    'pull_requests': 'pull_requests_info',
+    'commit_stats': 'commit_stats_info',
+    'identities': 'identities_info',
+}
+
+# Tables built from the other tables; they only change when those do, so they are left out of dataset fingerprints
+DERIVED_TABLES = ['identities']
+
+# Storage type of every column: timestamps are parsed to UTC once at write time,
+# repeated names are dictionary-encoded and ids and numbers use the narrowest integer type their range fits in
+# (repository ids are below 2^32, pull request and issue numbers and repository counters below 2^31)
+TABLE_COLUMNS = {
+    'repos': {
+        'ID': 'uint32',
+        'Name': 'string',
+        'Description': 'string',
+        'Created at': 'timestamp',
+        'Updated at': 'timestamp',
+        'Owner Login': 'dictionary',
+        'License': 'dictionary',
+        'Has Wiki': 'bool',
+        'Forks Count': 'int32',
+        'Open Issues Count': 'int32',
+        'Stargazers Count': 'int32',
+        'Watchers Count': 'int32',
+        'Repository URL': 'string',
+        'Commits URL': 'string',
+        'Languages URL': 'string',
+        'Pulls URL': 'string',
+        'Languages': 'string',
+        'Contributors': 'string',
+    },
+    'commits': {
+        'Repo Id': 'uint32',
+        'Commit Id': 'string',
+        'Date': 'timestamp',
+        'Message': 'string',
+        'Author Name': 'dictionary',
+        'Author Email': 'dictionary',
+    },
+    'pull_requests': {
+        'Repo Name': 'dictionary',
+        'PR Number': 'int32',
+        'Title': 'string',
+        'Author Login': 'dictionary',
+        'State': 'dictionary',
+        'Created At': 'timestamp',
+        'Updated At': 'timestamp',
+        'Merged At': 'timestamp',
+        'Issue Id': 'int32',
+        'Author Name': 'dictionary',
+        'Author Email': 'dictionary',
+    },
+    'commit_stats': {
+        'Commit Id': 'string',
+        'Additions': 'int64',
+        'Deletions': 'int64',
+        'Files Changed': 'int64',
+    },
+    'identities': {
+        'Kind': 'dictionary',
+        'Identifier': 'string',
+        'Developer Id': 'dictionary',
+        'Developer Name': 'dictionary',
+    },
+}
+
+# Arrow type used on disk for every storage type
+ARROW_TYPES = {
+    'int64': pa.int64(),
+    'int32': pa.int32(),
+    'uint32': pa.uint32(),
+    'bool': pa.bool_(),
+    'string': pa.string(),
+    'timestamp': pa.timestamp('ns', tz='UTC'),
+    'dictionary': pa.dictionary(pa.int32(), pa.string()),
+}
+
+# Raw values of a boolean column, as the API returns them or as CSV files spell them
+BOOL_VALUES = {True: True, False: False, 'True': True, 'False': False, 'true': True, 'false': False}
+
+# Comparison operators understood by the row filters, in the same (column, op, value) form pyarrow uses
+FILTER_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Function to find the data directory: an explicit argument wins over the environment variable
+def resolve_data_dir(data_dir=None):
+    return data_dir or os.environ.get(DATA_DIR_ENV) or DEFAULT_DATA_DIR
+
+# Function to get the path of the typed copy of a table
+def table_path(table, data_dir=None):
+    return os.path.join(resolve_data_dir(data_dir), f"{TABLE_FILES[table]}.parquet")
+
+# Function to get the path of the legacy CSV copy of a table
+def csv_path(table, data_dir=None):
+    return os.path.join(resolve_data_dir(data_dir), f"{TABLE_FILES[table]}.csv")
+
+# Function to build the Arrow schema of a table
+def table_schema(table):
+    return pa.schema([(column, ARROW_TYPES[kind]) for column, kind in TABLE_COLUMNS[table].items()])
+
+# Function to convert a frame of raw values (API strings or CSV text) to the storage types of a table, or of some of its columns
+def to_typed(df, table, columns=None):
+    typed_df = pd.DataFrame(index=df.index)
+    for column in columns or TABLE_COLUMNS[table]:
+        kind = TABLE_COLUMNS[table][column]
+        values = df[column] if column in df else pd.Series(None, index=df.index, dtype=object)
+        if kind in ('int64', 'int32', 'uint32'):
+            numbers = pd.to_numeric(values)
+            typed_df[column] = numbers.astype(kind)
+            # Narrow columns are checked, so a value out of their range fails loudly instead of wrapping around
+            if not (typed_df[column] == numbers).all():
+                raise ValueError(f"Column '{column}' of table '{table}' has values outside the {kind} range")
+        elif kind == 'bool':
+            # Only explicit flags are kept; a missing or unknown value stays <NA> instead of turning into True
+            typed_df[column] = values.map(BOOL_VALUES, na_action='ignore').astype('boolean')
+        elif kind == 'timestamp':
+            typed_df[column] = pd.to_datetime(values, utc=True, errors='coerce')
+        elif kind == 'dictionary':
+            typed_df[column] = values.astype('category')
+        else:
+            typed_df[column] = values.map(str, na_action='ignore').astype(object).where(values.notna(), None)
+    return typed_df
+
+# Function to build a typed table without rows, for tables that were never written
+def empty_table(table):
+    return to_typed(pd.DataFrame(columns=list(TABLE_COLUMNS[table])), table)
+
+# Function to convert a typed frame to an Arrow table with the table's schema
+def to_arrow(typed_df, table):
+    return pa.Table.from_pandas(typed_df, schema=table_schema(table), preserve_index=False)
+
+# Function to put the categories of dictionary columns back in sorted order after reading.
+# Arrow keeps them in order of first appearance, and groupby results follow the category order.
+def sort_categories(df):
+    for column in df.columns:
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].cat.set_categories(sorted(df[column].cat.categories))
+    return df
+
+# Function to write a typed frame to a Parquet file, replacing it atomically
+def write_frame(typed_df, table, path):
+    tmp_path = f"{path}.tmp"
+    pq.write_table(to_arrow(typed_df, table), tmp_path)
+    os.replace(tmp_path, path)
+
+# Function to read a Parquet file, selecting columns and pushing row filters down into the scan
+def read_frame(path, columns=None, filters=None):
+    return sort_categories(pq.read_table(path, columns=columns, filters=filters or None).to_pandas())
+
+# Function to apply (column, op, value) row filters to a frame already in memory
+def apply_filters(df, filters):
+    for column, op, value in filters or []:
+        if op == 'in':
+            df = df[df[column].isin(value)]
+        elif op == 'not in':
+            df = df[~df[column].isin(value)]
+        else:
+            df = df[FILTER_OPERATORS[op](df[column], value)]
+    return df
+
+# Function to check whether a table was ever written to the data directory, in either format
+def table_exists(table, data_dir=None):
+    return os.path.exists(table_path(table, data_dir)) or os.path.exists(csv_path(table, data_dir))
+
+# Function to describe the files of a dataset by name, size and modification time, so anything derived
+# from them can tell cheaply whether they changed; tables that were never written count as missing
+def dataset_fingerprint(data_dir=None, tables=None):
+    fingerprint = {}
+    for table in tables or [table for table in TABLE_FILES if table not in DERIVED_TABLES]:
+        path = table_path(table, data_dir) if os.path.exists(table_path(table, data_dir)) else csv_path(table, data_dir)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            fingerprint[table] = [os.path.basename(path), stat.st_mtime_ns, stat.st_size]
+        else:
+            fingerprint[table] = None
+    return json.dumps(fingerprint, sort_keys=True)
+
+# Function to save a whole table to the data directory
+def write_table(df, table, data_dir=None):
+    os.makedirs(resolve_data_dir(data_dir), exist_ok=True)
+    write_frame(to_typed(df, table), table, table_path(table, data_dir))
+
+# Function to load a table, reading only the requested columns and rows.
+# Datasets that were never converted are read from the legacy CSV file and typed on the fly.
+def read_table(table, data_dir=None, columns=None, filters=None):
+    if os.path.exists(table_path(table, data_dir)):
+        return read_frame(table_path(table, data_dir), columns=columns, filters=filters)
+
+    typed_df = apply_filters(to_typed(pd.read_csv(csv_path(table, data_dir)), table), filters)
+    return typed_df[columns] if columns is not None else typed_df
+
+# Function to read a table in batches of typed rows, optionally only some columns, for going through large tables within bounded memory
+def iter_table_batches(table, data_dir=None, batch_size=100_000, columns=None):
+    if os.path.exists(table_path(table, data_dir)):
+        for batch in pq.ParquetFile(table_path(table, data_dir)).iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+    elif os.path.exists(csv_path(table, data_dir)):
+        for csv_df in pd.read_csv(csv_path(table, data_dir), chunksize=batch_size, usecols=columns):
+            yield to_typed(csv_df, table, columns)
+
+# Function to count the rows of every row group of a stored table, or None if it is not stored as Parquet
+def row_group_sizes(table, data_dir=None):
+    if not os.path.exists(table_path(table, data_dir)):
+        return None
+    metadata = pq.ParquetFile(table_path(table, data_dir)).metadata
+    return [metadata.row_group(index).num_rows for index in range(metadata.num_row_groups)]
+
+# Function to read some row groups of a stored table, only the requested columns
+def read_row_groups(table, row_groups, data_dir=None, columns=None):
+    return sort_categories(pq.ParquetFile(table_path(table, data_dir)).read_row_groups(row_groups, columns=columns).to_pandas())
+
+# Writer appending typed chunks to a table's Parquet file, one row group per chunk
+class TableWriter:
+    def __init__(self, table, path):
+        self.table = table
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.writer = pq.ParquetWriter(self.tmp_path, table_schema(table))
+
+    def write(self, typed_df):
+        if not typed_df.empty:
+            self.writer.write_table(to_arrow(typed_df, self.table))
+
+    # Function to finish the file and move it into place
+    def close(self):
+        self.writer.close()
+        os.replace(self.tmp_path, self.path)
+
+# Function to convert the legacy CSV files of a data directory into the typed format
+def migrate_csv(data_dir=None):
+    for table in TABLE_FILES:
+        if os.path.exists(csv_path(table, data_dir)) and not os.path.exists(table_path(table, data_dir)):
+            write_table(pd.read_csv(csv_path(table, data_dir)), table, data_dir)
+            print(f"Converted '{csv_path(table, data_dir)}' to '{table_path(table, data_dir)}'")
+
+if __name__ == "__main__":
+    migrate_csv()
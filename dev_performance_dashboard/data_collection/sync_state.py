@@ -0,0 +1,20 @@
+import json
+import os
+
+# Name of the file holding the per-repository sync cursors and ETags
+SYNC_STATE_FILE = 'sync_state.json'
+
+# Function to load the sync state saved by the previous run, or an empty state on the first run
+def load_sync_state(path):
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+# Function to save the sync state, writing to a temporary file first so a crash never leaves it half written
+def save_sync_state(path, sync_state):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(sync_state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
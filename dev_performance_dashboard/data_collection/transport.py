@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+import re
+import requests
+import requests.adapters
+from github import Github
+from github.Requester import Requester
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import urlencode, urlsplit, urlunsplit, parse_qsl
+
+# Size of the keep-alive connection pool shared by every request
+DEFAULT_POOL_SIZE = 16
+
+# Seconds to wait for a connection and then between bytes of the response before a request fails with requests.Timeout,
+# so a stalled connection cannot hold a worker forever
+DEFAULT_TIMEOUT = (10, 60)
+
+# Cache modes: 'off' always goes to the network, 'record' goes to the network and saves every response,
+# 'replay' only answers from the cache and never touches the network
+CACHE_MODES = ('off', 'record', 'replay')
+
+# Request headers that change the response and therefore belong in the cache key
+KEYED_HEADERS = ('Accept', 'If-None-Match')
+
+# A commit SHA never changes, so responses addressed by one can be reused forever
+IMMUTABLE_URL = re.compile(r'/commits/[0-9a-f]{40}$')
+
+# Raised in replay mode when a request was never recorded
+class CacheMissError(Exception):
+    pass
+
+# Connection pool adapter that gives every request sent without a timeout the default (connect, read) timeout
+class TimeoutHTTPAdapter(requests.adapters.HTTPAdapter):
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(self, request, timeout=None, **kwargs):
+        return super().send(request, timeout=timeout if timeout is not None else self.timeout, **kwargs)
+
+# Function to create a requests session with a keep-alive connection pool sized for the worker pool,
+# whose requests time out after timeout seconds, a (connect, read) pair or one number for both
+def create_session(pool_size=DEFAULT_POOL_SIZE, timeout=DEFAULT_TIMEOUT):
+    session = requests.Session()
+    adapter = TimeoutHTTPAdapter(timeout=timeout, pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+# Function to fold the query parameters into the URL in a stable order
+def canonical_url(url, params=None):
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query) + list((params or {}).items())
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted((k, str(v)) for k, v in query)), ''))
+
+# Function to check whether a request always returns the same response
+def is_immutable(url):
+    path = urlsplit(url).path
+    if IMMUTABLE_URL.search(path):
+        return True
+    query = dict(parse_qsl(urlsplit(url).query))
+    return bool(re.fullmatch(r'[0-9a-f]{40}', query.get('sha', '')))
+
+# On-disk response cache: bodies are stored once under the hash of their content,
+# and every recorded request points at the body it received
+class ResponseCache:
+    def __init__(self, cache_dir):
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.requests_dir = os.path.join(cache_dir, 'requests')
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.requests_dir, exist_ok=True)
+
+    # Function to compute the cache key of a request; the Authorization header is left out so replay needs no token
+    def request_key(self, method, url, headers, data):
+        key = {
+            'method': method.upper(),
+            'url': url,
+            'headers': {name: headers[name] for name in KEYED_HEADERS if headers and headers.get(name)},
+            'body': hashlib.sha256(data if isinstance(data, bytes) else (data or '').encode()).hexdigest(),
+        }
+        return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    # Function to read a recorded response, or None if the request was never recorded
+    def load(self, key):
+        entry_path = os.path.join(self.requests_dir, f"{key}.json")
+        if not os.path.exists(entry_path):
+            return None
+
+        with open(entry_path) as f:
+            entry = json.load(f)
+        with open(os.path.join(self.objects_dir, entry['body']), 'rb') as f:
+            content = f.read()
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.url = entry['url']
+        response.encoding = 'utf-8'
+        response._content = content
+        response.from_cache = True
+        return response
+
+    # Function to record a response, writing each file atomically so concurrent workers never see a partial entry
+    def store(self, key, response):
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        body_path = os.path.join(self.objects_dir, body_hash)
+        if not os.path.exists(body_path):
+            write_atomic(body_path, response.content)
+
+        entry = {'status': response.status_code, 'headers': dict(response.headers), 'url': response.url, 'body': body_hash}
+        write_atomic(os.path.join(self.requests_dir, f"{key}.json"), json.dumps(entry).encode())
+
+# Function to write a file through a temporary file and an atomic rename
+def write_atomic(path, content):
+    tmp_path = f"{path}.{os.getpid()}.{id(content)}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+# Single HTTP transport shared by the PyGithub calls and the raw REST loops
+class Transport:
+    def __init__(self, session=None, cache_dir=None, cache_mode='off'):
+        if cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{cache_mode}', expected one of {CACHE_MODES}")
+        if cache_mode != 'off' and not cache_dir:
+            raise ValueError(f"Cache mode '{cache_mode}' needs a cache directory")
+
+        self.session = session or create_session()
+        self.cache_mode = cache_mode
+        self.cache = ResponseCache(cache_dir) if cache_mode != 'off' else None
+
+    # Function to send a request, answering from the cache where the mode allows it
+    def request(self, method, url, params=None, headers=None, data=None, timeout=None):
+        if self.cache is None:
+            return self.session.request(method, url, params=params, headers=headers, data=data, timeout=timeout, allow_redirects=False)
+
+        full_url = canonical_url(url, params)
+        key = self.cache.request_key(method, full_url, headers, data)
+
+        # Replay never touches the network; record only reuses responses that can never change
+        if self.cache_mode == 'replay' or is_immutable(full_url):
+            response = self.cache.load(key)
+            if response is not None:
+                return response
+            if self.cache_mode == 'replay':
+                raise CacheMissError(f"No recorded response for {method.upper()} {full_url}")
+
+        response = self.session.request(method, full_url, headers=headers, data=data, timeout=timeout, allow_redirects=False)
+        self.cache.store(key, response)
+        return response
+
+    # Function to send a GET request
+    def get(self, url, params=None, headers=None):
+        return self.request('GET', url, params=params, headers=headers)
+
+# Response wrapper mimicking the httplib response object PyGithub expects
+class TransportResponse:
+    def __init__(self, response):
+        self.status = response.status_code
+        self.headers = response.headers
+        self.text = response.text
+
+    def getheaders(self):
+        return self.headers.items()
+
+    def read(self):
+        return self.text
+
+# Function to build PyGithub connection classes that send every request through the shared transport
+def connection_classes(transport):
+    class TransportConnection:
+        protocol = 'https'
+        default_port = 443
+
+        # Mimic the httplib connection object PyGithub creates for each request
+        def __init__(self, host, port=None, strict=False, timeout=None, retry=None, pool_size=None, **kwargs):
+            self.host = host
+            self.port = port if port else self.default_port
+            self.timeout = timeout
+
+        def request(self, verb, url, input, headers):
+            self.verb = verb
+            self.url = url
+            self.input = input
+            self.headers = headers
+
+        def getresponse(self):
+            url = f"{self.protocol}://{self.host}:{self.port}{self.url}"
+            response = transport.request(self.verb, url, headers=self.headers, data=self.input, timeout=self.timeout)
+            return TransportResponse(response)
+
+        # The pooled session outlives any single PyGithub connection
+        def close(self):
+            pass
+
+    class HTTPTransportConnection(TransportConnection):
+        protocol = 'http'
+        default_port = 80
+
+    return HTTPTransportConnection, TransportConnection
+
+# Function to create a PyGithub client whose requests go through the shared transport
+def create_github(transport, access_token, base_url):
+    # PyGithub picks its connection class when the client is created, so the injection can be undone right away
+    Requester.injectConnectionClasses(*connection_classes(transport))
+    try:
+        return Github(access_token, base_url=base_url)
+    finally:
+        Requester.resetConnectionClasses()
@@ -0,0 +1,344 @@
+import os
+import pickle
+import shutil
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import pandas as pd
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.storage import read_table, read_row_groups, iter_table_batches, row_group_sizes, table_exists, empty_table, resolve_data_dir, dataset_fingerprint
+from data_collection.changes import list_changes, read_change, CHANGE_TABLES
+from data_collection.ingest import row_keys
+from data_collection.identities import load_identities
+from metrics.sketches import sketch_buckets, sketch_quantiles, DEFAULT_QUANTILES
+from metrics.calculator import (prepare_commits, prepare_merged_pull_requests, churn_rows, pr_resolution_time, developer_ids,
+                                period_keys, aggregate_period, count_by, sum_by, PERIOD_KEYS, PERIOD_METRICS, METRIC_KEYS,
+                                COMMIT_METRIC_COLUMNS, PULL_REQUEST_METRIC_COLUMNS)
+
+# Name of the file the per-day aggregates are persisted in, next to the tables they are built from
+AGGREGATES_FILE = 'metrics_aggregates.pkl'
+
+# Version of the layout of the persisted aggregates; aggregates of another version are rebuilt
+AGGREGATES_FORMAT = 5
+
+# Keys of a resolution time sketch, bucketed per author, repository and day
+SKETCH_KEYS = ['Author Login', 'Repo Name', 'Day', 'Bucket']
+
+# Key columns of a merged pull request in the resolution time table
+PULL_REQUEST_KEY = ['Repo Name', 'PR Number']
+
+# Updates of the aggregates of a data directory are applied one at a time within a process
+AGGREGATES_LOCK = threading.Lock()
+
+# Environment variables setting how many processes build the aggregates and how many rows each partition holds
+WORKERS_ENV = 'DEV_DASHBOARD_METRICS_WORKERS'
+PARTITION_ROWS_ENV = 'DEV_DASHBOARD_METRICS_PARTITION_ROWS'
+
+# By default every core builds aggregates, from partitions of about half a million rows
+MAX_WORKERS = int(os.environ.get(WORKERS_ENV, os.cpu_count() or 1))
+PARTITION_ROWS = int(os.environ.get(PARTITION_ROWS_ENV, 500_000))
+
+# Function to get the path of the persisted aggregates of a data directory
+def aggregates_path(data_dir=None):
+    return os.path.join(resolve_data_dir(data_dir), AGGREGATES_FILE)
+
+# Function to aggregate prepared rows into a cube indexed by author, repository and day, with the number of rows
+# behind every cell. The row count lets a cell be dropped once every row in it was taken back out, even when its values sum to zero.
+# Cubes keep the authors as the tables name them, so they stay valid when the identity index links authors anew.
+def daily_rows(rows, metric, sign=1):
+    spec = PERIOD_METRICS[metric]
+    keys = [spec['author'], spec['repo'], 'Day']
+    daily = spec['aggregate'](rows, keys)
+    daily['Rows'] = count_by(rows, keys, 'Rows')['Rows']
+    daily = daily.astype({spec['author']: object, spec['repo']: object if spec['repo'] == 'Repo Name' else 'int64'})
+    return daily.set_index(keys) * sign
+
+# Function to count the resolution times of merged pull requests in sketch buckets per author, repository and day.
+# The exact times are bucketed, not the ones rounded for display, which would put everything under a few minutes at zero.
+# Pull requests without an author or a creation date are left out.
+def sketch_rows(merged_pull_requests, sign=1):
+    merged_pull_requests = merged_pull_requests[merged_pull_requests['Resolution Days'].notna()]
+    rows = merged_pull_requests[['Author Login', 'Repo Name', 'Day']].astype({'Author Login': object, 'Repo Name': object})
+    rows['Bucket'] = sketch_buckets(merged_pull_requests['Resolution Days'])
+    return rows.groupby(SKETCH_KEYS).size().rename('Rows').to_frame() * sign
+
+# Function to add the buckets of one or more deltas to a per-day aggregate or sketch, dropping buckets left without rows
+def merge_daily(daily, *deltas):
+    merged = pd.concat([daily, *deltas]).groupby(level=list(range(daily.index.nlevels))).sum()
+    return merged[merged['Rows'] != 0]
+
+# Function to split a stored table into runs of whole row groups of about partition_rows rows each,
+# or None if the table is not stored as Parquet
+def table_partitions(table, data_dir=None, partition_rows=PARTITION_ROWS):
+    sizes = row_group_sizes(table, data_dir)
+    if sizes is None:
+        return None
+
+    partitions, row_groups, rows = [], [], 0
+    for index, size in enumerate(sizes):
+        row_groups.append(index)
+        rows += size
+        if rows >= partition_rows:
+            partitions.append(row_groups)
+            row_groups, rows = [], 0
+    if row_groups:
+        partitions.append(row_groups)
+    return partitions
+
+# Function to aggregate some commits per author and day, reading only the stats of those commits
+def aggregate_commits(data_dir, commits_df):
+    commits = prepare_commits(commits_df)
+    return daily_rows(commits, 'commits'), daily_rows(churn_rows(commits, read_stats(data_dir, commits['Commit Id'].unique())), 'churn')
+
+# Function to aggregate some pull requests per author and day, with the resolution times of the merged ones and their sketch
+def aggregate_pull_requests(pull_request_df):
+    merged_pull_requests = prepare_merged_pull_requests(pull_request_df)
+    # Plain strings, so resolution times of parts read with different categories concatenate to the same frame
+    resolution_times = pr_resolution_time(merged_pull_requests).astype({'Developer Id': object, 'Author Login': object, 'Repo Name': object})
+    return daily_rows(merged_pull_requests, 'pr_merge_rate'), resolution_times, sketch_rows(merged_pull_requests)
+
+# Function to aggregate the commits of one partition, run in a worker process
+def commit_partition(data_dir, row_groups):
+    return aggregate_commits(data_dir, read_row_groups('commits', row_groups, data_dir, columns=COMMIT_METRIC_COLUMNS))
+
+# Function to aggregate the pull requests of one partition, run in a worker process
+def pull_request_partition(data_dir, row_groups):
+    return aggregate_pull_requests(read_row_groups('pull_requests', row_groups, data_dir, columns=PULL_REQUEST_METRIC_COLUMNS))
+
+# Function to build the aggregates of the tables by streaming them in chunks of chunk_rows rows and folding every chunk
+# into the running per-day aggregates, so memory is bounded by one chunk and the aggregates rather than by the history
+def stream_aggregates(data_dir=None, chunk_rows=PARTITION_ROWS):
+    commits, churn = aggregate_commits(data_dir, empty_table('commits')[COMMIT_METRIC_COLUMNS])
+    for commits_df in iter_table_batches('commits', data_dir, batch_size=chunk_rows, columns=COMMIT_METRIC_COLUMNS):
+        chunk_commits, chunk_churn = aggregate_commits(data_dir, commits_df)
+        commits, churn = merge_daily(commits, chunk_commits), merge_daily(churn, chunk_churn)
+
+    # The resolution time table lists every merged pull request, so it grows with the output like any aggregate
+    merges, resolution_times, sketch = aggregate_pull_requests(empty_table('pull_requests')[PULL_REQUEST_METRIC_COLUMNS])
+    resolution_times = [resolution_times]
+    for pull_request_df in iter_table_batches('pull_requests', data_dir, batch_size=chunk_rows, columns=PULL_REQUEST_METRIC_COLUMNS):
+        chunk_merges, chunk_resolution_times, chunk_sketch = aggregate_pull_requests(pull_request_df)
+        merges, sketch = merge_daily(merges, chunk_merges), merge_daily(sketch, chunk_sketch)
+        resolution_times.append(chunk_resolution_times)
+
+    return {
+        'commits': commits,
+        'churn': churn,
+        'pr_merge_rate': merges,
+        'pr_resolution_times': pd.concat(resolution_times, ignore_index=True),
+        'pr_resolution_sketch': sketch,
+    }
+
+# Function to build the aggregates of a data directory from the full tables.
+# Tables larger than one partition are aggregated partition by partition in a pool of max_workers processes,
+# otherwise they are streamed through this process one partition-sized chunk at a time.
+# The per-day buckets of the parts add up to those of the whole table, so the result is the same either way.
+def build_aggregates(data_dir=None, max_workers=MAX_WORKERS, partition_rows=PARTITION_ROWS):
+    # The fingerprint is taken before reading, so tables written meanwhile make the result stale rather than wrong
+    source = dataset_fingerprint(data_dir, CHANGE_TABLES)
+
+    commit_partitions = table_partitions('commits', data_dir, partition_rows)
+    pull_request_partitions = table_partitions('pull_requests', data_dir, partition_rows)
+    if max_workers > 1 and commit_partitions and pull_request_partitions and len(commit_partitions) + len(pull_request_partitions) > 2:
+        data_dir = resolve_data_dir(data_dir)
+        # Both tables are handed to the pool before waiting on either, so their partitions run side by side
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            commit_parts = executor.map(commit_partition, repeat(data_dir), commit_partitions)
+            pull_request_parts = executor.map(pull_request_partition, repeat(data_dir), pull_request_partitions)
+            commit_parts, pull_request_parts = list(commit_parts), list(pull_request_parts)
+
+        # Resolution times are concatenated in partition order, which is the order of the table
+        return {
+            'source': source,
+            'commits': merge_daily(*[commits for commits, _ in commit_parts]),
+            'churn': merge_daily(*[churn for _, churn in commit_parts]),
+            'pr_merge_rate': merge_daily(*[merges for merges, _, _ in pull_request_parts]),
+            'pr_resolution_times': pd.concat([resolution_times for _, resolution_times, _ in pull_request_parts], ignore_index=True),
+            'pr_resolution_sketch': merge_daily(*[sketch for _, _, sketch in pull_request_parts]),
+        }
+
+    return {'source': source, **stream_aggregates(data_dir, partition_rows)}
+
+# Function to read the saved commits with some SHAs, in any repository
+def read_commits(data_dir, shas):
+    if len(shas) == 0:
+        return empty_table('commits')[COMMIT_METRIC_COLUMNS]
+    return read_table('commits', data_dir, columns=COMMIT_METRIC_COLUMNS, filters=[('Commit Id', 'in', list(shas))])
+
+# Function to read the saved stats of some commits, or an empty table if there are none
+def read_stats(data_dir, shas):
+    if len(shas) == 0 or not table_exists('commit_stats', data_dir):
+        return empty_table('commit_stats')
+    return read_table('commit_stats', data_dir, filters=[('Commit Id', 'in', list(shas))])
+
+# Function to bring aggregates up to date with one change of the tables, touching only the buckets the change falls in.
+# The change must lead from the version of the tables the aggregates describe to the version on disk now.
+def apply_change(aggregates, change_path, data_dir=None):
+    commits_added = prepare_commits(read_change(change_path, 'commits', 'added'))
+    commits_removed = prepare_commits(read_change(change_path, 'commits', 'removed'))
+    stats_added = read_change(change_path, 'commit_stats', 'added')
+    merged_added = prepare_merged_pull_requests(read_change(change_path, 'pull_requests', 'added'))
+    merged_removed = prepare_merged_pull_requests(read_change(change_path, 'pull_requests', 'removed'))
+
+    aggregates['commits'] = merge_daily(aggregates['commits'], daily_rows(commits_added, 'commits'), daily_rows(commits_removed, 'commits', -1))
+
+    # Churn pairs every commit with its stats: the changed commits are paired with the stats saved before the change,
+    # and the new stats with the commits saved after it, so a commit and its stats arriving together count once
+    changed_shas = pd.concat([commits_added['Commit Id'], commits_removed['Commit Id']]).unique()
+    stats_before = read_stats(data_dir, changed_shas)
+    stats_before = stats_before[~stats_before['Commit Id'].isin(stats_added['Commit Id'])]
+    commits_after = prepare_commits(read_commits(data_dir, stats_added['Commit Id'].unique()))
+    aggregates['churn'] = merge_daily(aggregates['churn'],
+                                      daily_rows(churn_rows(commits_added, stats_before), 'churn'),
+                                      daily_rows(churn_rows(commits_removed, stats_before), 'churn', -1),
+                                      daily_rows(churn_rows(commits_after, stats_added), 'churn'))
+
+    # A pull request fetched again is taken out in its saved version and put back in its new one,
+    # so one that was open and got merged only adds its merge, and one merged before is not counted twice
+    aggregates['pr_merge_rate'] = merge_daily(aggregates['pr_merge_rate'], daily_rows(merged_added, 'pr_merge_rate'), daily_rows(merged_removed, 'pr_merge_rate', -1))
+    resolution_times = aggregates['pr_resolution_times']
+    resolution_times = resolution_times[~row_keys(resolution_times, PULL_REQUEST_KEY).isin(row_keys(merged_removed, PULL_REQUEST_KEY))]
+    aggregates['pr_resolution_times'] = pd.concat([resolution_times, pr_resolution_time(merged_added)], ignore_index=True)
+    aggregates['pr_resolution_sketch'] = merge_daily(aggregates['pr_resolution_sketch'], sketch_rows(merged_added), sketch_rows(merged_removed, -1))
+    return aggregates
+
+# Function to read persisted aggregates, or None if there are none in the current layout
+def load_aggregates(data_dir=None):
+    path = aggregates_path(data_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        aggregates = pickle.load(f)
+    return aggregates if aggregates.get('format') == AGGREGATES_FORMAT else None
+
+# Function to persist aggregates, replacing the previous version atomically
+def save_aggregates(aggregates, data_dir=None):
+    path = aggregates_path(data_dir)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump({**aggregates, 'format': AGGREGATES_FORMAT}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+# Function to get the aggregates of the tables on disk now. Persisted aggregates are used as they are if the tables
+# did not change, updated from the change log if one sync changed them, and rebuilt from the tables otherwise.
+def current_aggregates(data_dir=None, max_workers=MAX_WORKERS, partition_rows=PARTITION_ROWS):
+    data_dir = resolve_data_dir(data_dir)
+    with AGGREGATES_LOCK:
+        source = dataset_fingerprint(data_dir, CHANGE_TABLES)
+        aggregates = load_aggregates(data_dir)
+        changes = list_changes(data_dir)
+
+        if aggregates is None or aggregates['source'] != source:
+            change_path = next((path for path, change_from, change_to in changes
+                                if aggregates is not None and change_from == aggregates['source'] and change_to == source), None)
+            if change_path is not None:
+                aggregates = apply_change(aggregates, change_path, data_dir)
+                aggregates['source'] = source
+            else:
+                aggregates = build_aggregates(data_dir, max_workers, partition_rows)
+            save_aggregates(aggregates, data_dir)
+
+        # Every recorded change is either applied now or of no use anymore
+        for path, _, _ in changes:
+            shutil.rmtree(path, ignore_errors=True)
+        return aggregates
+
+# Function to roll one cube up to every period per developer, in the layout of the get_metrics frames
+def rollup_periods(daily, metric, identities=None):
+    spec = PERIOD_METRICS[metric]
+    rows = daily.reset_index()
+    rows['Developer Id'] = developer_ids(rows[spec['author']], identities)
+    rows = pd.concat([rows.drop(columns='Day'), period_keys(rows['Day'].dt.tz_localize('UTC'))], axis=1)
+    return {period: aggregate_period(rows, metric, period, aggregate=lambda df, keys: sum_by(df, keys, spec['values']))
+            for period in PERIOD_KEYS}
+
+# Function to get all metrics of a data directory from its aggregates, which only hold one row per author, repository and day.
+# Authors are resolved to developer ids only now, against the current identity index.
+def aggregate_metrics(data_dir=None, max_workers=MAX_WORKERS, partition_rows=PARTITION_ROWS):
+    aggregates = current_aggregates(data_dir, max_workers, partition_rows)
+    identities = load_identities(data_dir)
+    periods = {metric: rollup_periods(aggregates[metric], metric, identities) for metric in PERIOD_METRICS}
+    resolution_times = aggregates['pr_resolution_times']
+    resolution_times = resolution_times.assign(**{'Developer Id': developer_ids(resolution_times['Author Login'], identities)})
+    return {key: resolution_times if metric == 'pr_resolution_times' else periods[metric][granularity]
+            for key, (metric, granularity) in METRIC_KEYS.items()}
+
+# Function to answer a slice of a metric's cube: totals of the metric for some developers, some repositories (by name)
+# and a range of days, grouped by any of 'author' (the developer id) and 'repo' and optionally by period. The slice is found
+# by lookups in the sorted cube index and only its cells are summed, e.g. rollup('commits', 'monthly', by=['repo'], authors=['jdoe']).
+# Developers can be given by id or by any of their names, emails and logins.
+def rollup(metric, period=None, by=('author',), authors=None, repos=None, start=None, end=None, data_dir=None):
+    if metric not in PERIOD_METRICS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {list(PERIOD_METRICS)}")
+    if period is not None and period not in PERIOD_KEYS:
+        raise ValueError(f"Unknown period '{period}', expected one of {list(PERIOD_KEYS)}")
+    spec = PERIOD_METRICS[metric]
+    cube = current_aggregates(data_dir)[metric]
+    identities = load_identities(data_dir)
+    levels = cube.index.levels
+
+    # Developers are found among the authors of the cube through the developer id every author resolves to
+    if authors is not None:
+        developers = {identities.lookup(author) or author for author in authors}
+        authors = levels[0][developer_ids(pd.Series(levels[0]), identities).isin(developers).to_numpy()]
+
+    # Commits are keyed by repository id, so repository names are looked up in the repos table first
+    if repos is not None and spec['repo'] == 'Repo Id':
+        repos_df = read_table('repos', data_dir, columns=['ID', 'Name'])
+        repos = repos_df.loc[repos_df['Name'].isin(list(repos)), 'ID'].tolist()
+
+    # Labels missing from the cube match nothing rather than failing the lookup
+    days = slice(utc_day(start) if start is not None else None, utc_day(end) - pd.Timedelta(1, 'ns') if end is not None else None)
+    cells = cube.iloc[cube.index.get_locs([
+        list(authors) if authors is not None else slice(None),
+        [repo for repo in repos if repo in levels[1]] if repos is not None else slice(None),
+        days,
+    ])].reset_index()
+    cells['Developer Id'] = developer_ids(cells[spec['author']], identities)
+
+    keys = [{'author': 'Developer Id', 'repo': spec['repo']}[name] for name in by]
+    if period is not None:
+        cells = pd.concat([cells.drop(columns='Day'), period_keys(cells['Day'].dt.tz_localize('UTC'))], axis=1)
+        keys += PERIOD_KEYS[period]
+    if not keys:
+        return cells[spec['values']].sum().to_frame().T
+    return sum_by(cells, keys, spec['values'])
+
+# Function to turn a date or timestamp into the naive UTC form the days of the aggregates are kept in
+def utc_day(value):
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_convert('UTC').tz_localize(None) if timestamp.tzinfo is not None else timestamp
+
+# Function to get percentiles of PR resolution time in days from the sketches, e.g. p50/p90/p99 per developer and month with
+# by=['Developer Id'] and period='monthly'. Any slice of developers, repositories and days is answered by adding up
+# the sketches of its days, without going back to the pull requests; every percentile is within RELATIVE_ACCURACY.
+def resolution_percentiles(data_dir=None, by=('Developer Id',), period=None, quantiles=DEFAULT_QUANTILES, author=None, repo=None, start=None, end=None):
+    if period is not None and period not in PERIOD_KEYS:
+        raise ValueError(f"Unknown period '{period}', expected one of {list(PERIOD_KEYS)}")
+
+    identities = load_identities(data_dir)
+    sketch = current_aggregates(data_dir)['pr_resolution_sketch'].reset_index()
+    # Plain strings, since the sketch groupby also counts unobserved combinations of categorical keys
+    sketch['Developer Id'] = developer_ids(sketch['Author Login'], identities).astype(object)
+    if author is not None:
+        sketch = sketch[sketch['Developer Id'] == (identities.lookup(author) or author)]
+    if repo is not None:
+        sketch = sketch[sketch['Repo Name'] == repo]
+    if start is not None:
+        sketch = sketch[sketch['Day'] >= utc_day(start)]
+    if end is not None:
+        sketch = sketch[sketch['Day'] < utc_day(end)]
+
+    keys = list(by)
+    if period is not None:
+        sketch = pd.concat([sketch.drop(columns='Day'), period_keys(sketch['Day'].dt.tz_localize('UTC'))], axis=1)
+        keys += PERIOD_KEYS[period]
+    return sketch_quantiles(sketch, keys, quantiles)
+
+if __name__ == "__main__":
+    aggregates = current_aggregates()
+    print(f"Aggregates in '{aggregates_path()}': " + ', '.join(f"{len(aggregates[name])} {name} rows" for name in aggregates if name != 'source'))
+    print(resolution_percentiles(period='monthly'))
@@ -0,0 +1,92 @@
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.storage import resolve_data_dir, dataset_fingerprint
+
+# Environment variable pointing at a directory where computed metrics are kept across processes
+CACHE_DIR_ENV = 'DEV_DASHBOARD_METRICS_CACHE_DIR'
+
+# Number of datasets whose metrics are kept in memory at the same time
+DEFAULT_MAX_ENTRIES = 4
+
+# Cache of computed metrics per dataset, checked against the fingerprint of the dataset's files on every lookup.
+# The least recently used dataset is dropped once more than max_entries are loaded.
+class MetricsCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, cache_dir=None):
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # Function to get the metrics of a dataset, computing them with compute(data_dir) only if its files changed.
+    # The cached value is shared between callers and must be treated as read-only.
+    def get(self, data_dir, compute):
+        data_dir = os.path.abspath(resolve_data_dir(data_dir))
+        fingerprint = dataset_fingerprint(data_dir)
+
+        with self.lock:
+            entry = self.entries.get(data_dir)
+            if entry is not None and entry[0] == fingerprint:
+                self.entries.move_to_end(data_dir)
+                self.hits += 1
+                return entry[1]
+
+        metrics = self.load(data_dir, fingerprint)
+        if metrics is not None:
+            with self.lock:
+                self.disk_hits += 1
+        else:
+            metrics = compute(data_dir)
+            self.save(data_dir, fingerprint, metrics)
+            with self.lock:
+                self.misses += 1
+
+        with self.lock:
+            self.entries[data_dir] = (fingerprint, metrics)
+            self.entries.move_to_end(data_dir)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+        return metrics
+
+    # Function to get the file the metrics of a dataset are persisted in, or None without a cache directory
+    def entry_path(self, data_dir):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{hashlib.sha256(data_dir.encode()).hexdigest()}.pkl")
+
+    # Function to read persisted metrics, or None if there are none for this version of the dataset
+    def load(self, data_dir, fingerprint):
+        path = self.entry_path(data_dir)
+        if path is None or not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+        return entry['metrics'] if entry['fingerprint'] == fingerprint else None
+
+    # Function to persist computed metrics, replacing the previous version of the dataset atomically
+    def save(self, data_dir, fingerprint, metrics):
+        path = self.entry_path(data_dir)
+        if path is None:
+            return
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'fingerprint': fingerprint, 'metrics': metrics}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    # Function to forget every dataset kept in memory
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
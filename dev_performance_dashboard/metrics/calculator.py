@@ -1,99 +1,423 @@
+import numpy as np
 import pandas as pd
+import sys
+import os
+import threading
+from collections.abc import Mapping
 
-# Load CSV data into DataFrames
-def load_data():
-    repos_df = pd.read_csv(r"C:\Users\KD\OneDrive\Desktop\cit\dev_performance_dashboard\data_collection\repos_info.csv")
-    commits_df = pd.read_csv(r"C:\Users\KD\OneDrive\Desktop\cit\dev_performance_dashboard\data_collection\commits_info.csv")
-    pull_request_df = pd.read_csv(r"C:\Users\KD\OneDrive\Desktop\cit\dev_performance_dashboard\data_collection\pull_requests_info.csv")
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.storage import read_table, table_exists, empty_table, TABLE_COLUMNS
+from data_collection.identities import load_identities, COLUMN_KINDS
+from metrics.store import open_store
+from metrics.cache import MetricsCache, CACHE_DIR_ENV
+from metrics.sketches import DEFAULT_QUANTILES
+
+# Metrics of the datasets loaded in this process, reused until their files change
+METRICS_CACHE = MetricsCache(cache_dir=os.environ.get(CACHE_DIR_ENV))
+
+# Lazily computed metrics of the datasets loaded in this process, replaced as soon as their files change
+LAZY_METRICS = MetricsCache()
+
+# Columns of the stored tables the metrics read; commit messages are never loaded
+COMMIT_METRIC_COLUMNS = ['Repo Id', 'Commit Id', 'Date', 'Author Name']
+PULL_REQUEST_METRIC_COLUMNS = ['Repo Name', 'PR Number', 'Title', 'Author Login', 'Created At', 'Merged At']
+
+# Line and file counts summed by the churn metrics
+CHURN_COLUMNS = ['Additions', 'Deletions', 'Files Changed']
+
+# Group keys of every period, after the developer
+PERIOD_KEYS = {
+    'daily': ['Day'],
+    'weekly': ['Year', 'Week'],
+    'monthly': ['Year', 'Month'],
+    'yearly': ['Year'],
+}
+
+# How every per-period metric is aggregated: the prepared rows it reads, its author, repository and day columns, its values.
+# The author column is the identifier the rows name their author by; the metrics are keyed by the developer id it resolves to.
+PERIOD_METRICS = {
+    'commits': {'rows': 'commits', 'author': 'Author Name', 'repo': 'Repo Id', 'day': 'Date', 'values': ['Commit Count'],
+                'aggregate': lambda df, keys: count_by(df, keys, 'Commit Count')},
+    'churn': {'rows': 'churn', 'author': 'Author Name', 'repo': 'Repo Id', 'day': 'Date', 'values': CHURN_COLUMNS,
+              'aggregate': lambda df, keys: sum_by(df, keys, CHURN_COLUMNS)},
+    'pr_merge_rate': {'rows': 'merged_pull_requests', 'author': 'Author Login', 'repo': 'Repo Name', 'day': 'Merged At', 'values': ['PR Merge Count'],
+                      'aggregate': lambda df, keys: count_by(df, keys, 'PR Merge Count')},
+}
+
+# Keys of the get_metrics dict, in order, with the metric and granularity each one holds
+METRIC_KEYS = {
+    'daily_commits': ('commits', 'daily'),
+    'weekly_commits': ('commits', 'weekly'),
+    'monthly_commits': ('commits', 'monthly'),
+    'yearly_commits': ('commits', 'yearly'),
+    'daily_churn': ('churn', 'daily'),
+    'weekly_churn': ('churn', 'weekly'),
+    'monthly_churn': ('churn', 'monthly'),
+    'yearly_churn': ('churn', 'yearly'),
+    'daily_pr_merge_rate': ('pr_merge_rate', 'daily'),
+    'weekly_pr_merge_rate': ('pr_merge_rate', 'weekly'),
+    'monthly_pr_merge_rate': ('pr_merge_rate', 'monthly'),
+    'yearly_pr_merge_rate': ('pr_merge_rate', 'yearly'),
+    'pr_resolution_times': ('pr_resolution_times', None),
+}
+
+# Store activity every per-period metric is aggregated from
+STORE_ACTIVITY = {
+    'commits': 'commits',
+    'churn': 'churn',
+    'pr_merge_rate': 'pull_requests',
+}
+
+# Number of pull requests on one page of the resolution time view, and of bins of its histogram
+RESOLUTION_PAGE_SIZE = 20
+RESOLUTION_HISTOGRAM_BINS = 20
+
+# Orders the resolution time view can list pull requests in
+RESOLUTION_ORDERS = ['slowest', 'fastest']
+
+# Column order of every period, matching the frames the pandas calculations return
+STORE_PERIOD_COLUMNS = {
+    'daily': lambda day, values: ['Developer Id', day] + values,
+    'weekly': lambda day, values: ['Developer Id', 'Year', 'Week'] + values,
+    'monthly': lambda day, values: ['Developer Id'] + values + ['Year', 'Month'],
+    'yearly': lambda day, values: ['Developer Id', 'Year'] + values,
+}
+
+# Load the typed tables from the data directory into DataFrames.
+# Commit messages take most of the memory of the commits, so they can be left out and read later with load_commit_messages.
+def load_data(data_dir=None, commit_messages=True):
+    repos_df = read_table('repos', data_dir)
+    commits_df = read_table('commits', data_dir, columns=None if commit_messages else [column for column in TABLE_COLUMNS['commits'] if column != 'Message'])
+    pull_request_df = read_table('pull_requests', data_dir)
     
     return repos_df, commits_df, pull_request_df
 
-# Calculate Commit Frequency per Developer
-def calculate_commit_frequency(commits_df):
-    commits_df['Date'] = pd.to_datetime(commits_df['Date'], errors='coerce')
+# Load the messages of some commits (all of them by default), keyed by repository and SHA
+def load_commit_messages(data_dir=None, commit_ids=None):
+    columns = ['Repo Id', 'Commit Id', 'Message']
+    if commit_ids is None:
+        return read_table('commits', data_dir, columns=columns)
+    if len(commit_ids) == 0:
+        return empty_table('commits')[columns]
+    return read_table('commits', data_dir, columns=columns, filters=[('Commit Id', 'in', list(commit_ids))])
 
-    # Group by Author Name
-    daily_commits = commits_df.groupby(['Author Name', commits_df['Date'].dt.date]).size().reset_index(name='Commit Count')
-    weekly_commits = commits_df.groupby(['Author Name', commits_df['Date'].dt.year, commits_df['Date'].dt.isocalendar().week]).size().reset_index(name='Commit Count')
-    weekly_commits.columns = ['Author Name', 'Year', 'Week', 'Commit Count']
-    monthly_commits = commits_df.groupby(['Author Name', commits_df['Date'].dt.to_period('M')]).size().reset_index(name='Commit Count')
-    monthly_commits['Year'] = monthly_commits['Date'].dt.year
-    monthly_commits['Month'] = monthly_commits['Date'].dt.month
-    monthly_commits.drop('Date', axis=1, inplace=True)
-    yearly_commits = commits_df.groupby(['Author Name', commits_df['Date'].dt.year]).size().reset_index(name='Commit Count')
-    yearly_commits.rename(columns={'Date': 'Year'}, inplace=True)
+# Report the memory every frame takes in megabytes, counting the strings it holds
+def memory_report(frames):
+    return pd.Series({name: df.memory_usage(deep=True).sum() / 2 ** 20 for name, df in frames.items()}, name='MB').round(1)
 
-    return daily_commits, weekly_commits, monthly_commits, yearly_commits
+# Load the per-commit line and file counts, or an empty table if they were never collected
+def load_commit_stats(data_dir=None):
+    if not table_exists('commit_stats', data_dir):
+        return empty_table('commit_stats')
+    return read_table('commit_stats', data_dir)
 
-# Calculate PR Merge Rate per Developer
-def calculate_pr_merge_rate(pull_request_df):
-    pull_request_df['Created At'] = pd.to_datetime(pull_request_df['Created At'], errors='coerce')
-    pull_request_df['Merged At'] = pd.to_datetime(pull_request_df['Merged At'], errors='coerce')
+# Count rows per group, sorted by the group keys even when a key is categorical
+def count_by(df, keys, name):
+    return df.groupby(keys, observed=True).size().sort_index().reset_index(name=name)
 
-    if pull_request_df['Created At'].dt.tz is None:
-        pull_request_df['Created At'] = pull_request_df['Created At'].dt.tz_localize('UTC')
-    else:
-        pull_request_df['Created At'] = pull_request_df['Created At'].dt.tz_convert('UTC')
+# Sum columns per group, sorted by the group keys even when a key is categorical
+def sum_by(df, keys, columns):
+    return df.groupby(keys, observed=True)[columns].sum().sort_index().reset_index()
+
+# Parse a column of timestamps to UTC, whether it was loaded naive, in another timezone or as text
+def to_utc(values):
+    return pd.to_datetime(values, errors='coerce', utc=True)
+
+# Derive the day, ISO week, month and year keys of a column of UTC timestamps once, for every grouping to share.
+# The year is the calendar year, which is what the weekly tables have always been keyed on.
+def period_keys(timestamps):
+    days = timestamps.dt.tz_localize(None).dt.normalize()
+
+    # Every key only depends on the day, so it is worked out once per distinct day and spread back over the rows
+    codes, unique_days = pd.factorize(days)
+    unique_days = pd.DatetimeIndex(unique_days)
+    return pd.DataFrame({
+        'Day': days,
+        'Year': unique_days.year.to_numpy().take(codes),
+        'Week': unique_days.isocalendar()['week'].array.take(codes),
+        'Month': unique_days.month.to_numpy().take(codes),
+    }, index=timestamps.index)
+
+# Key rows by developer: the canonical id every author resolves to in the identity index, as the kind of identifier
+# its column holds, or the author itself without an index, as a categorical column
+def developer_ids(authors, identities=None):
+    if identities is None:
+        return authors.astype('category').rename('Developer Id')
+    return identities.resolve(authors, COLUMN_KINDS[authors.name]).rename('Developer Id')
+
+# Build the prepared commits: UTC dates, period keys, categorical authors and their developer ids, without touching the loaded frame
+def prepare_commits(commits_df, identities=None):
+    dates = to_utc(commits_df['Date'])
+    prepared_df = pd.DataFrame({
+        'Repo Id': commits_df['Repo Id'],
+        'Developer Id': developer_ids(commits_df['Author Name'], identities),
+        'Author Name': commits_df['Author Name'].astype('category'),
+        'Commit Id': commits_df['Commit Id'],
+        'Date': dates,
+    }, index=commits_df.index)
+
+    # Commits without a date fall outside every period
+    prepared_df = prepared_df[dates.notna()]
+    return pd.concat([prepared_df, period_keys(prepared_df['Date'])], axis=1)
+
+# Build the prepared merged pull requests: UTC timestamps, period keys of the merge date, the resolution time and developer ids.
+# The resolution time is kept exact for the sketches and rounded to hundredths of a day for display.
+def prepare_merged_pull_requests(pull_request_df, identities=None):
+    merged_at = to_utc(pull_request_df['Merged At'])
+    merged = merged_at.notna()
+    merged_at = merged_at[merged]
+    created_at = to_utc(pull_request_df['Created At'][merged])
+    resolution_days = (merged_at - created_at).dt.total_seconds() / (60 * 60 * 24)
+
+    prepared_df = pd.DataFrame({
+        'Developer Id': developer_ids(pull_request_df['Author Login'][merged], identities),
+        'Author Login': pull_request_df['Author Login'][merged].astype('category'),
+        'Repo Name': pull_request_df['Repo Name'][merged],
+        'PR Number': pull_request_df['PR Number'][merged],
+        'Title': pull_request_df['Title'][merged],
+        'Merged At': merged_at,
+        'Resolution Time (days)': resolution_days.round(2),
+        'Resolution Days': resolution_days,
+    }, index=merged_at.index)
+    return pd.concat([prepared_df, period_keys(merged_at)], axis=1)
+
+# Aggregate prepared rows per developer for one period, in the column layout the dashboard reads.
+# A different aggregate(df, keys) can be passed in, e.g. to sum counts that were already aggregated per day.
+def aggregate_period(prepared_df, metric, period, aggregate=None):
+    spec = PERIOD_METRICS[metric]
+    grouped = (aggregate or spec['aggregate'])(prepared_df, ['Developer Id'] + PERIOD_KEYS[period])
+    if period == 'daily':
+        grouped['Day'] = grouped['Day'].dt.date
+        grouped.rename(columns={'Day': spec['day']}, inplace=True)
+    elif period == 'monthly':
+        grouped = grouped[['Developer Id'] + spec['values'] + ['Year', 'Month']]
+    return grouped
+
+# Aggregate prepared rows per developer by day, week, month and year
+def aggregate_periods(prepared_df, metric):
+    return tuple(aggregate_period(prepared_df, metric, period) for period in PERIOD_KEYS)
+
+# Join the prepared commits with their line and file counts; commits without stats are left out
+def churn_rows(prepared_commits, commit_stats_df):
+    return prepared_commits.merge(commit_stats_df.drop_duplicates('Commit Id'), on='Commit Id')
+
+# Commit Frequency per Developer from the prepared commits
+def commit_frequency(prepared_commits):
+    return aggregate_periods(prepared_commits, 'commits')
+
+# Code Churn (lines added and deleted, files changed) per Developer from the prepared commits
+def commit_churn(prepared_commits, commit_stats_df):
+    return aggregate_periods(churn_rows(prepared_commits, commit_stats_df), 'churn')
+
+# PR Merge Rate per Developer from the prepared merged pull requests
+def pr_merge_rate(prepared_merged_pull_requests):
+    return aggregate_periods(prepared_merged_pull_requests, 'pr_merge_rate')
 
-    if pull_request_df['Merged At'].dt.tz is None:
-        pull_request_df['Merged At'] = pull_request_df['Merged At'].dt.tz_localize('UTC')
+# Resolution Time per Pull Request from the prepared merged pull requests
+def pr_resolution_time(prepared_merged_pull_requests):
+    return prepared_merged_pull_requests[['Developer Id', 'Author Login', 'Repo Name', 'PR Number', 'Title', 'Resolution Time (days)']]
+
+# Function to get one page of resolution times, slowest or fastest first, with the page it is (out-of-range pages are
+# clamped) and the number of pages. Only the pull requests up to the end of the page are sorted, so the top N of a
+# long history costs one partial sort; pull requests without a resolution time are left out.
+def resolution_time_page(resolution_times_df, order='slowest', page=0, page_size=RESOLUTION_PAGE_SIZE):
+    if order not in RESOLUTION_ORDERS:
+        raise ValueError(f"Unknown order '{order}', expected one of {RESOLUTION_ORDERS}")
+
+    timed = resolution_times_df[resolution_times_df['Resolution Time (days)'].notna()]
+    page_count = max(-(-len(timed) // page_size), 1)
+    page = min(max(page, 0), page_count - 1)
+    end = (page + 1) * page_size
+    if order == 'slowest':
+        top = timed.nlargest(end, 'Resolution Time (days)', keep='first')
     else:
-        pull_request_df['Merged At'] = pull_request_df['Merged At'].dt.tz_convert('UTC')
+        top = timed.nsmallest(end, 'Resolution Time (days)', keep='first')
+    return top.iloc[page * page_size:end], page, page_count
 
-    merged_prs_df = pull_request_df.dropna(subset=['Merged At'])
+# Function to summarize resolution times as a histogram of equal-width bins and percentiles, the same lower-rank
+# percentiles the resolution time sketches give
+def resolution_time_summary(resolution_times_df, quantiles=DEFAULT_QUANTILES, bins=RESOLUTION_HISTOGRAM_BINS):
+    values = resolution_times_df['Resolution Time (days)'].dropna().to_numpy(dtype=float)
+    counts, edges = np.histogram(values, bins=bins)
+    histogram = pd.DataFrame({'From (days)': edges[:-1], 'To (days)': edges[1:], 'PR Count': counts})
+    percentiles = pd.Series({f"p{quantile * 100:g}": np.quantile(values, quantile, method='lower') if len(values) else np.nan
+                             for quantile in quantiles}, name='Resolution Time (days)')
+    return histogram, percentiles
+
+# Calculate Commit Frequency per Developer
+def calculate_commit_frequency(commits_df):
+    return commit_frequency(prepare_commits(commits_df))
 
-    daily_pr_merge_rate = merged_prs_df.groupby(['Author Login', merged_prs_df['Merged At'].dt.date]).size().reset_index(name='PR Merge Count')
-    weekly_pr_merge_rate = merged_prs_df.groupby(['Author Login', merged_prs_df['Merged At'].dt.year, merged_prs_df['Merged At'].dt.isocalendar().week]).size().reset_index(name='PR Merge Count')
-    weekly_pr_merge_rate.columns = ['Author Login', 'Year', 'Week', 'PR Merge Count']
-    monthly_pr_merge_rate = merged_prs_df.groupby(['Author Login', merged_prs_df['Merged At'].dt.to_period('M')]).size().reset_index(name='PR Merge Count')
-    monthly_pr_merge_rate['Year'] = monthly_pr_merge_rate['Merged At'].dt.year
-    monthly_pr_merge_rate['Month'] = monthly_pr_merge_rate['Merged At'].dt.month
-    monthly_pr_merge_rate.drop('Merged At', axis=1, inplace=True)
-    yearly_pr_merge_rate = merged_prs_df.groupby(['Author Login', merged_prs_df['Merged At'].dt.year]).size().reset_index(name='PR Merge Count')
-    yearly_pr_merge_rate.rename(columns={'Merged At': 'Year'}, inplace=True)
+# Calculate Code Churn (lines added and deleted, files changed) per Developer
+def calculate_commit_churn(commits_df, commit_stats_df):
+    return commit_churn(prepare_commits(commits_df), commit_stats_df)
 
-    return daily_pr_merge_rate, weekly_pr_merge_rate, monthly_pr_merge_rate, yearly_pr_merge_rate
+# Calculate PR Merge Rate per Developer
+def calculate_pr_merge_rate(pull_request_df):
+    return pr_merge_rate(prepare_merged_pull_requests(pull_request_df))
 
 # Calculate Resolution Time per Pull Request
 def calculate_pr_resolution_time(pull_request_df):
-    pull_request_df['Created At'] = pd.to_datetime(pull_request_df['Created At'], errors='coerce')
-    pull_request_df['Merged At'] = pd.to_datetime(pull_request_df['Merged At'], errors='coerce')
+    return pr_resolution_time(prepare_merged_pull_requests(pull_request_df))
 
-    if pull_request_df['Created At'].dt.tz is None:
-        pull_request_df['Created At'] = pull_request_df['Created At'].dt.tz_localize('UTC')
-    else:
-        pull_request_df['Created At'] = pull_request_df['Created At'].dt.tz_convert('UTC')
+# Aggregate a per-period metric per developer in the metrics store, optionally for one developer id, one repository and a time range
+def query_activity(store, metric, period, author=None, repo=None, start=None, end=None):
+    if period not in STORE_PERIOD_COLUMNS:
+        raise ValueError(f"Unknown period '{period}', expected one of {list(STORE_PERIOD_COLUMNS)}")
+    spec = PERIOD_METRICS[metric]
+    values = {'count': spec['values'][0]} if metric != 'churn' else {}
 
-    if pull_request_df['Merged At'].dt.tz is None:
-        pull_request_df['Merged At'] = pull_request_df['Merged At'].dt.tz_localize('UTC')
+    if period == 'weekly':
+        # SQLite has no ISO week, so weeks are rolled up from the per-day aggregates, which are already small
+        daily = store.count_activity(STORE_ACTIVITY[metric], 'daily', author, repo, start, end)
+        dates = pd.to_datetime(daily['Date'])
+        keys = ['author', dates.dt.year.rename('Year'), dates.dt.isocalendar().week.rename('Week')]
+        # An empty result has untyped columns, which would be dropped from a numeric-only sum
+        grouped = daily.groupby(keys)[list(values) or spec['values']].sum(numeric_only=False).reset_index()
     else:
-        pull_request_df['Merged At'] = pull_request_df['Merged At'].dt.tz_convert('UTC')
-
-    merged_pr_df = pull_request_df.dropna(subset=['Merged At'])
-
-    merged_pr_df.loc[:, 'Resolution Time (days)'] = (merged_pr_df['Merged At'] - merged_pr_df['Created At']).dt.total_seconds() / (60 * 60 * 24)
-    merged_pr_df.loc[:, 'Resolution Time (days)'] = merged_pr_df['Resolution Time (days)'].round(2)
-
-    return merged_pr_df[['Author Login', 'Repo Name', 'PR Number', 'Title', 'Resolution Time (days)']]
-
-# Function to get all metrics
-def get_metrics():
-    repos_df, commits_df, pull_request_df = load_data()
-    daily_commits, weekly_commits, monthly_commits, yearly_commits = calculate_commit_frequency(commits_df)
-    daily_pr_merge_rate, weekly_pr_merge_rate, monthly_pr_merge_rate, yearly_pr_merge_rate = calculate_pr_merge_rate(pull_request_df)
-    pr_resolution_times = calculate_pr_resolution_time(pull_request_df)
-
-    return {
-        "daily_commits": daily_commits,
-        "weekly_commits": weekly_commits,
-        "monthly_commits": monthly_commits,
-        "yearly_commits": yearly_commits,
-        "daily_pr_merge_rate": daily_pr_merge_rate,
-        "weekly_pr_merge_rate": weekly_pr_merge_rate,
-        "monthly_pr_merge_rate": monthly_pr_merge_rate,
-        "yearly_pr_merge_rate": yearly_pr_merge_rate,
-        "pr_resolution_times": pr_resolution_times
-    }
+        grouped = store.count_activity(STORE_ACTIVITY[metric], period, author, repo, start, end)
+        if period == 'daily':
+            grouped['Date'] = pd.to_datetime(grouped['Date']).dt.date
+
+    grouped = grouped.rename(columns={'author': 'Developer Id', 'Date': spec['day'], **values})
+    return grouped[STORE_PERIOD_COLUMNS[period](spec['day'], spec['values'])]
+
+# Query Commit Frequency per Developer from the metrics store
+def query_commit_frequency(store, period, author=None, repo=None, start=None, end=None):
+    return query_activity(store, 'commits', period, author, repo, start, end)
+
+# Query Code Churn per Developer from the metrics store
+def query_commit_churn(store, period, author=None, repo=None, start=None, end=None):
+    return query_activity(store, 'churn', period, author, repo, start, end)
+
+# Query PR Merge Rate per Developer from the metrics store
+def query_pr_merge_rate(store, period, author=None, repo=None, start=None, end=None):
+    return query_activity(store, 'pr_merge_rate', period, author, repo, start, end)
+
+# Query Resolution Time per Pull Request from the metrics store
+def query_pr_resolution_time(store, author=None, repo=None, start=None, end=None):
+    merged_pr_df = store.merged_pull_requests(author, repo, start, end)
+    merged_pr_df['Resolution Time (days)'] = (merged_pr_df.pop('seconds') / (60 * 60 * 24)).round(2)
+    merged_pr_df.columns = ['Developer Id', 'Author Login', 'Repo Name', 'PR Number', 'Title', 'Resolution Time (days)']
+    return merged_pr_df
+
+# Function to get all metrics from the metrics store, narrowed to one author, one repository or a time range.
+# Only the matching groups leave the store, so one developer's view never loads the whole history.
+# The keys and developer ids are those of get_metrics, and the author can be any name, email or login of a developer.
+def get_store_metrics(store=None, author=None, repo=None, start=None, end=None):
+    store = store or open_store()
+    if author is not None:
+        author = load_identities(store.data_dir).lookup(author) or author
+
+    queries = {'commits': query_commit_frequency, 'churn': query_commit_churn, 'pr_merge_rate': query_pr_merge_rate}
+    metrics = {}
+    for key, (metric, period) in METRIC_KEYS.items():
+        if metric == 'pr_resolution_times':
+            metrics[key] = query_pr_resolution_time(store, author, repo, start, end)
+        else:
+            metrics[key] = queries[metric](store, period, author, repo, start, end)
+    return metrics
+
+# Metrics of one dataset, computed on first use: only the tables, prepared rows and aggregations
+# a caller actually asks for are ever built. Unfiltered results are kept for the next caller.
+# Every metric is keyed by developer id, and any name, email or login of a developer selects their rows.
+class LazyMetrics(Mapping):
+    def __init__(self, data_dir=None):
+        self.data_dir = data_dir
+        self.lock = threading.RLock()
+        self.rows = {}
+        self.results = {}
+
+    # Function to load and prepare the rows of one source the first time a metric needs them
+    def prepared(self, source):
+        with self.lock:
+            if source not in self.rows:
+                if source == 'commits':
+                    self.rows[source] = prepare_commits(read_table('commits', self.data_dir, columns=COMMIT_METRIC_COLUMNS), self.identities())
+                elif source == 'churn':
+                    self.rows[source] = churn_rows(self.prepared('commits'), load_commit_stats(self.data_dir))
+                elif source == 'merged_pull_requests':
+                    self.rows[source] = prepare_merged_pull_requests(read_table('pull_requests', self.data_dir, columns=PULL_REQUEST_METRIC_COLUMNS), self.identities())
+                elif source == 'repos':
+                    self.rows[source] = read_table('repos', self.data_dir, columns=['ID', 'Name'])
+                elif source == 'identities':
+                    self.rows[source] = load_identities(self.data_dir)
+            return self.rows[source]
+
+    # Function to get the identity index of the dataset, mapping every name, email and login to a developer id
+    def identities(self):
+        return self.prepared('identities')
+
+    # Function to narrow prepared rows to one developer and one repository (by name) before aggregating
+    def filter_rows(self, source, developer_id=None, repo=None):
+        rows = self.prepared(source)
+        if developer_id is not None:
+            rows = rows[rows['Developer Id'] == developer_id]
+        if repo is not None and source == 'merged_pull_requests':
+            rows = rows[rows['Repo Name'] == repo]
+        elif repo is not None:
+            repos_df = self.prepared('repos')
+            rows = rows[rows['Repo Id'].isin(repos_df.loc[repos_df['Name'] == repo, 'ID'])]
+        return rows
+
+    # Function to compute a single metric at a single granularity, optionally for one author and one repository.
+    # The author can be given by developer id or by any of their names, emails and logins.
+    def metric(self, name, granularity=None, author=None, repo=None):
+        if name == 'pr_resolution_times':
+            source = 'merged_pull_requests'
+        elif name in PERIOD_METRICS:
+            if granularity not in PERIOD_KEYS:
+                raise ValueError(f"Unknown granularity '{granularity}', expected one of {list(PERIOD_KEYS)}")
+            source = PERIOD_METRICS[name]['rows']
+        else:
+            raise ValueError(f"Unknown metric '{name}', expected one of {list(PERIOD_METRICS) + ['pr_resolution_times']}")
+
+        filtered = author is not None or repo is not None
+        with self.lock:
+            if not filtered and (name, granularity) in self.results:
+                return self.results[(name, granularity)]
+
+        developer_id = (self.identities().lookup(author) or author) if author is not None else None
+        rows = self.filter_rows(source, developer_id, repo)
+        result = pr_resolution_time(rows) if name == 'pr_resolution_times' else aggregate_period(rows, name, granularity)
+
+        if not filtered:
+            with self.lock:
+                self.results[(name, granularity)] = result
+        return result
+
+    # The keys of the get_metrics dict, so existing callers can index a LazyMetrics the same way
+    def __getitem__(self, key):
+        if key not in METRIC_KEYS:
+            raise KeyError(key)
+        return self.metric(*METRIC_KEYS[key])
+
+    def __iter__(self):
+        return iter(METRIC_KEYS)
+
+    def __len__(self):
+        return len(METRIC_KEYS)
+
+# Function to get the lazy metrics of a dataset, shared by every caller until its files change
+def open_metrics(data_dir=None):
+    return LAZY_METRICS.get(data_dir, LazyMetrics)
+
+# Function to compute one metric at one granularity, e.g. get_metric('commits', 'weekly', author='Jane Doe') for the developer named Jane Doe
+def get_metric(name, granularity=None, author=None, repo=None, data_dir=None):
+    return open_metrics(data_dir).metric(name, granularity, author, repo)
+
+# Function to compute all metrics of a dataset from its persisted per-day aggregates, which follow every incremental sync
+def compute_metrics(data_dir=None):
+    # Imported here because the aggregates are built with the calculations of this module
+    from metrics.aggregates import aggregate_metrics
+    return aggregate_metrics(data_dir)
+
+# Function to get all metrics, computed once per version of the dataset; pass cache=None to always recompute
+def get_metrics(data_dir=None, cache=METRICS_CACHE):
+    if cache is None:
+        return dict(LazyMetrics(data_dir))
+    return dict(cache.get(data_dir, compute_metrics))
 
 if __name__ == "__main__":
     metrics = get_metrics()
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+# Relative accuracy of the sketches: a percentile read from a sketch is within 1% of the exact value
+# (the lower-rank percentile of the values the sketch was built from), whatever the number of values
+RELATIVE_ACCURACY = 0.01
+
+# Ratio between the bounds of consecutive buckets; a value x > 0 falls in bucket ceil(log(x) / log(GAMMA))
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+
+# Values of zero (pull requests merged the second they were opened) are counted in a bucket of their own
+ZERO_BUCKET = -(2 ** 31)
+
+# Percentiles reported when none are asked for
+DEFAULT_QUANTILES = (0.5, 0.9, 0.99)
+
+# Function to get the sketch bucket of every value. Buckets grow geometrically, so values from minutes to years
+# fit in under a thousand buckets and a sketch stays small however many values it counts.
+def sketch_buckets(values):
+    values = np.asarray(values, dtype=float)
+    buckets = np.full(len(values), ZERO_BUCKET, dtype='int64')
+    positive = values > 0
+    buckets[positive] = np.ceil(np.log(values[positive]) / np.log(GAMMA))
+    return buckets
+
+# Function to get the value every bucket stands for: the point within RELATIVE_ACCURACY of every value in the bucket
+def bucket_values(buckets):
+    buckets = np.asarray(buckets, dtype='int64')
+    values = 2 * np.power(GAMMA, buckets.astype(float)) / (GAMMA + 1)
+    return np.where(buckets == ZERO_BUCKET, 0.0, values)
+
+# Function to read percentiles out of sketch rows (keys, 'Bucket', count column) per group of keys.
+# Sketches merge by adding the counts of equal buckets, so rows of any days, authors or repositories can be combined.
+def sketch_quantiles(sketch_df, keys, quantiles=DEFAULT_QUANTILES, count='Rows'):
+    keys = list(keys)
+    groups = keys or [np.zeros(len(sketch_df), dtype='int8')]
+    merged = sketch_df.groupby(groups + ['Bucket'])[count].sum()
+    merged = merged[merged > 0].reset_index(level='Bucket')
+    group_levels = list(range(merged.index.nlevels))
+
+    cumulative = merged.groupby(level=group_levels)[count].cumsum()
+    totals = merged.groupby(level=group_levels)[count].transform('sum')
+    result = merged.groupby(level=group_levels)[count].sum().rename('PR Count').to_frame()
+
+    # The percentile is the value of the first bucket holding the value of its rank, the same rank np.quantile(method='lower') picks
+    for quantile in quantiles:
+        ranks = np.floor(quantile * (totals - 1))
+        reached = merged[cumulative > ranks].groupby(level=group_levels)['Bucket'].first()
+        result[f"p{quantile * 100:g}"] = bucket_values(reached.reindex(result.index))
+
+    return result.reset_index() if keys else result.reset_index(drop=True)
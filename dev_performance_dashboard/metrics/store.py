@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import sys
+from contextlib import closing
+import pandas as pd
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.storage import iter_table_batches, table_exists, resolve_data_dir, dataset_fingerprint, TABLE_COLUMNS
+from data_collection.identities import load_identities, COLUMN_KINDS
+
+# Name of the SQLite file kept next to the tables it is built from
+STORE_FILE = 'metrics.sqlite'
+
+# Number of rows copied into the store at a time
+LOAD_BATCH_ROWS = 50_000
+
+# Timestamps are stored as UTC text, which sorts chronologically and works with SQLite's date functions
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Store column of every table column copied into the store
+STORE_COLUMNS = {
+    'repos': {
+        'ID': 'id',
+        'Name': 'name',
+        'Owner Login': 'owner_login',
+        'Created at': 'created_at',
+    },
+    'commits': {
+        'Repo Id': 'repo_id',
+        'Commit Id': 'commit_id',
+        'Date': 'date',
+        'Author Name': 'author_name',
+        'Author Email': 'author_email',
+        'Message': 'message',
+        'Developer Id': 'developer_id',
+    },
+    'pull_requests': {
+        'Repo Name': 'repo_name',
+        'PR Number': 'pr_number',
+        'Title': 'title',
+        'Author Login': 'author_login',
+        'State': 'state',
+        'Created At': 'created_at',
+        'Updated At': 'updated_at',
+        'Merged At': 'merged_at',
+        'Developer Id': 'developer_id',
+    },
+    'commit_stats': {
+        'Commit Id': 'commit_id',
+        'Additions': 'additions',
+        'Deletions': 'deletions',
+        'Files Changed': 'files_changed',
+    },
+}
+
+# Author column every table's developer ids are resolved from while it is copied into the store
+DEVELOPER_AUTHORS = {
+    'commits': 'Author Name',
+    'pull_requests': 'Author Login',
+}
+
+# Tables the store is built from; developer ids depend on the identity index as well
+SOURCE_TABLES = list(STORE_COLUMNS) + ['identities']
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE repos (id INTEGER PRIMARY KEY, name TEXT, owner_login TEXT, created_at TEXT);
+CREATE TABLE commits (repo_id INTEGER, commit_id TEXT, date TEXT, author_name TEXT, author_email TEXT, message TEXT, developer_id TEXT);
+CREATE TABLE pull_requests (repo_name TEXT, pr_number INTEGER, title TEXT, author_login TEXT, state TEXT,
+                            created_at TEXT, updated_at TEXT, merged_at TEXT, developer_id TEXT);
+CREATE TABLE commit_stats (commit_id TEXT, additions INTEGER, deletions INTEGER, files_changed INTEGER);
+"""
+
+# Indexes are created after the bulk load, which is much faster than maintaining them row by row
+INDEXES = """
+CREATE INDEX commits_developer_date ON commits (developer_id, date);
+CREATE INDEX commits_repo_date ON commits (repo_id, date);
+CREATE INDEX commit_stats_commit ON commit_stats (commit_id);
+CREATE INDEX pull_requests_developer_merged ON pull_requests (developer_id, merged_at);
+CREATE INDEX pull_requests_repo_merged ON pull_requests (repo_name, merged_at);
+CREATE INDEX repos_name ON repos (name);
+"""
+
+# Rows, developer, timestamp and repository filter of every activity the store aggregates, with the values it adds up.
+# Churn is counted from the commits that have stats, each commit's stats once, as the pandas join does.
+ACTIVITY = {
+    'commits': {
+        'source': 'commits',
+        'author': 'developer_id',
+        'date': 'date',
+        'repo': 'repo_id IN (SELECT id FROM repos WHERE name = ?)',
+        'values': [('count', 'COUNT(*)')],
+    },
+    'churn': {
+        'source': ('commits JOIN (SELECT commit_id, additions, deletions, files_changed FROM commit_stats '
+                   'WHERE rowid IN (SELECT MIN(rowid) FROM commit_stats GROUP BY commit_id)) USING (commit_id)'),
+        'author': 'developer_id',
+        'date': 'date',
+        'repo': 'repo_id IN (SELECT id FROM repos WHERE name = ?)',
+        'values': [('Additions', 'SUM(additions)'), ('Deletions', 'SUM(deletions)'), ('Files Changed', 'SUM(files_changed)')],
+    },
+    'pull_requests': {
+        'source': 'pull_requests',
+        'author': 'developer_id',
+        'date': 'merged_at',
+        'repo': 'repo_name = ?',
+        'values': [('count', 'COUNT(*)')],
+    },
+}
+
+# Grouping expressions of every period the store can count by, applied to a timestamp column
+PERIOD_GROUPS = {
+    'daily': [('Date', "date({column})")],
+    'monthly': [('Year', "CAST(strftime('%Y', {column}) AS INTEGER)"), ('Month', "CAST(strftime('%m', {column}) AS INTEGER)")],
+    'yearly': [('Year', "CAST(strftime('%Y', {column}) AS INTEGER)")],
+}
+
+# Function to get the path of the store of a data directory
+def store_path(data_dir=None):
+    return os.path.join(resolve_data_dir(data_dir), STORE_FILE)
+
+# Function to convert a timestamp to the text form stored in the store
+def store_timestamp(value):
+    timestamp = pd.Timestamp(value)
+    timestamp = timestamp.tz_localize('UTC') if timestamp.tzinfo is None else timestamp.tz_convert('UTC')
+    return timestamp.strftime(TIMESTAMP_FORMAT)
+
+# Function to turn a batch of typed rows into tuples of plain Python values for sqlite3
+def store_rows(typed_df, table):
+    values = []
+    for column in STORE_COLUMNS[table]:
+        series = typed_df[column]
+        if TABLE_COLUMNS[table].get(column) == 'timestamp':
+            series = series.dt.strftime(TIMESTAMP_FORMAT)
+        values.append(series.astype(object).where(series.notna(), None).tolist())
+    return zip(*values)
+
+# Function to copy the tables of a data directory into a new store, replacing the old one atomically.
+# Every commit and pull request is stored with the developer id its author resolves to in the identity index,
+# so the store groups and filters by developer like get_metrics does.
+def build_store(data_dir=None, identities=None):
+    path = store_path(data_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    identities = identities or load_identities(data_dir)
+    fingerprint = dataset_fingerprint(data_dir, SOURCE_TABLES)
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        conn.executescript(SCHEMA)
+        for table, columns in STORE_COLUMNS.items():
+            # Commit stats are only there once they were collected
+            if not table_exists(table, data_dir):
+                continue
+            insert_sql = f"INSERT INTO {table} ({', '.join(columns.values())}) VALUES ({', '.join('?' * len(columns))})"
+            for typed_df in iter_table_batches(table, data_dir, batch_size=LOAD_BATCH_ROWS):
+                if table in DEVELOPER_AUTHORS:
+                    authors = typed_df[DEVELOPER_AUTHORS[table]]
+                    typed_df['Developer Id'] = identities.resolve(authors, COLUMN_KINDS[authors.name])
+                conn.executemany(insert_sql, store_rows(typed_df, table))
+        conn.executescript(INDEXES)
+        conn.execute("INSERT INTO meta (key, value) VALUES ('source', ?)", (fingerprint,))
+        conn.execute('ANALYZE')
+        conn.commit()
+
+    os.replace(tmp_path, path)
+    return MetricsStore(path, data_dir)
+
+# Function to open the store of a data directory, building it first if it is missing or older than the tables.
+# The identity index is brought up to date first, so a store is only rebuilt when its tables or the index changed.
+def open_store(data_dir=None):
+    identities = load_identities(data_dir)
+    path = store_path(data_dir)
+    if os.path.exists(path):
+        store = MetricsStore(path, data_dir)
+        if store.source() == dataset_fingerprint(data_dir, SOURCE_TABLES):
+            return store
+    return build_store(data_dir, identities)
+
+# Read-only handle on a store; every query opens its own connection, so one store can serve many threads.
+# The data directory it was built from holds the identity index its developer ids come from.
+class MetricsStore:
+    def __init__(self, path, data_dir=None):
+        self.path = path
+        self.data_dir = data_dir
+
+    def connect(self):
+        return sqlite3.connect(self.path)
+
+    # Function to run a query and return the result as a DataFrame
+    def query(self, sql, params=()):
+        with closing(self.connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=list(params))
+
+    # Function to read the fingerprint of the tables the store was built from
+    def source(self):
+        with closing(self.connect()) as conn:
+            try:
+                row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+            except sqlite3.DatabaseError:
+                return None
+        return row[0] if row else None
+
+    # Function to build the WHERE clause narrowing an activity to a developer id, a repository and a time range.
+    # Rows without a timestamp are never kept, and by default neither are rows without a developer,
+    # the same rows a pandas groupby would leave out.
+    def activity_filter(self, table, author=None, repo=None, start=None, end=None, require_author=True):
+        activity = ACTIVITY[table]
+        clauses = [f"{activity['date']} IS NOT NULL"]
+        if require_author:
+            clauses.append(f"{activity['author']} IS NOT NULL")
+        params = []
+        if author is not None:
+            clauses.append(f"{activity['author']} = ?")
+            params.append(author)
+        if repo is not None:
+            clauses.append(activity['repo'])
+            params.append(repo)
+        if start is not None:
+            clauses.append(f"{activity['date']} >= ?")
+            params.append(store_timestamp(start))
+        if end is not None:
+            clauses.append(f"{activity['date']} < ?")
+            params.append(store_timestamp(end))
+        return ' AND '.join(clauses), params
+
+    # Function to aggregate an activity per developer and period, grouped inside the store:
+    # a 'count' of commits or merged pull requests, or the churn columns of commits
+    def count_activity(self, table, period, author=None, repo=None, start=None, end=None):
+        if period not in PERIOD_GROUPS:
+            raise ValueError(f"Unknown period '{period}', expected one of {list(PERIOD_GROUPS)}")
+
+        activity = ACTIVITY[table]
+        groups = [(name, expression.format(column=activity['date'])) for name, expression in PERIOD_GROUPS[period]]
+        select = ', '.join(f'{expression} AS "{name}"' for name, expression in groups + activity['values'])
+        group_by = ', '.join(str(position) for position in range(1, len(groups) + 2))
+        where, params = self.activity_filter(table, author, repo, start, end)
+
+        sql = (f"SELECT {activity['author']} AS author, {select} FROM {activity['source']} "
+               f"WHERE {where} GROUP BY {group_by} ORDER BY {group_by}")
+        return self.query(sql, params)
+
+    # Function to list the merged pull requests with their resolution time in seconds, in stored order
+    def merged_pull_requests(self, author=None, repo=None, start=None, end=None):
+        # Pull requests without an author are still listed, as they are by the pandas calculation
+        where, params = self.activity_filter('pull_requests', author, repo, start, end, require_author=False)
+        sql = ("SELECT developer_id, author_login, repo_name, pr_number, title, "
+               "strftime('%s', merged_at) - strftime('%s', created_at) AS seconds "
+               f"FROM pull_requests WHERE {where} ORDER BY rowid")
+        return self.query(sql, params)
+
+    # Function to list the distinct values of a column, for filling developer and repository pickers
+    def distinct(self, table, column):
+        sql = f"SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column}"
+        return self.query(sql)[column].tolist()
+
+if __name__ == "__main__":
+    store = build_store()
+    print(f"Built metrics store '{store.path}'")
@@ -1,15 +1,10 @@
 import plotly.graph_objs as go
 import plotly.io as pio
-from metrics.calculator import get_metrics
+from metrics.calculator import open_metrics
 
 # Predefined list of time ranges
 time_range_keywords = ["daily", "weekly", "monthly", "yearly"]
 
-# Function to extract developers from the metrics data
-def get_developer_list(metrics):
-    developer_list = metrics['daily_commits']['Author Name'].unique().tolist()
-    return developer_list
-
 # Function to extract time range from the query
 def extract_time_range(query):
     for keyword in time_range_keywords:
@@ -17,20 +12,18 @@ def extract_time_range(query):
             return keyword
     return None
 
-# Function to extract developer's name from the query
-def extract_developer_name(query, developer_list):
-    for developer in developer_list:
-        if developer.lower() in query.lower():
-            return developer
-    return None
+# Function to extract the developer a query names, by any of their names, emails or logins, as a developer id.
+# The phrases of the query are looked up in the identity index rather than every developer searched for in the query.
+def extract_developer_name(query, identities):
+    return identities.find(query)
 
 # Function to process the query and generate a Plotly figure
 def process_query(query):
-    metrics = get_metrics()  # Retrieve metrics data
-    developer_list = get_developer_list(metrics)  # Update the developer list dynamically
+    metrics = open_metrics()  # Retrieve metrics data, computing only the tables this query reads
+    identities = metrics.identities()  # Identity index of the current dataset, loaded once per version
     
     time_range = extract_time_range(query)
-    selected_developer = extract_developer_name(query, developer_list)
+    selected_developer = extract_developer_name(query, identities)
     
     print(f"Extracted Time Range: {time_range}")
     print(f"Extracted Developer: {selected_developer}")
@@ -50,13 +43,12 @@ def process_query(query):
         print("Time range not recognized.")
         return None
     
-    time_range_key = time_range_mapping[time_range]
+    # Only the selected developer's commits are aggregated, at the one granularity the query asks for
+    filtered_data = metrics.metric('commits', time_range, author=selected_developer)
     
-    if selected_developer not in metrics[time_range_key]['Author Name'].unique():
+    if filtered_data.empty:
         print(f"Developer '{selected_developer}' not found.")
         return None
-
-    filtered_data = metrics[time_range_key][metrics[time_range_key]['Author Name'] == selected_developer]
     
     if time_range == 'daily':
         data = go.Scatter(
@@ -66,7 +58,7 @@ def process_query(query):
             name='Daily Commits'
         )
         layout = go.Layout(
-            title=f'Daily Commits for {selected_developer} Over Time',
+            title=f'Daily Commits for {identities.name(selected_developer)} Over Time',
             xaxis_title='Date',
             yaxis_title='Commit Count'
         )
@@ -78,7 +70,7 @@ def process_query(query):
             name='Weekly Commits'
         )
         layout = go.Layout(
-            title=f'Weekly Commits for {selected_developer} Over Time',
+            title=f'Weekly Commits for {identities.name(selected_developer)} Over Time',
             xaxis_title='Week',
             yaxis_title='Commit Count'
         )
@@ -89,7 +81,7 @@ def process_query(query):
             name='Monthly Commits'
         )
         layout = go.Layout(
-            title=f'Monthly Commits for {selected_developer}',
+            title=f'Monthly Commits for {identities.name(selected_developer)}',
             xaxis_title='Month',
             yaxis_title='Commit Count'
         )
@@ -100,7 +92,7 @@ def process_query(query):
             name='Yearly Commits'
         )
         layout = go.Layout(
-            title=f'Yearly Commits for {selected_developer}',
+            title=f'Yearly Commits for {identities.name(selected_developer)}',
             xaxis_title='Year',
             yaxis_title='Commit Count'
         )
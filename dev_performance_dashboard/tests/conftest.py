@@ -0,0 +1,10 @@
+import pytest
+
+from github_stub import GitHubStub
+
+# Stand-in GitHub server on a free local port, stopped after the test
+@pytest.fixture
+def github_stub():
+    stub = GitHubStub().start()
+    yield stub
+    stub.stop()
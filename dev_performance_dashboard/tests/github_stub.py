@@ -0,0 +1,190 @@
+import hashlib
+import json
+import re
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# Page size GitHub uses when a request does not ask for one
+DEFAULT_PER_PAGE = 30
+
+# Function to build the commits of a repository as the commits API lists them, newest first
+def make_commits(repo_no, count, authors=('Dev 0', 'Dev 1', 'Dev 2')):
+    commits = []
+    for index in range(count):
+        author = authors[index % len(authors)]
+        commits.append({
+            'sha': hashlib.sha1(f"{repo_no}-{index}".encode()).hexdigest(),
+            'commit': {
+                'committer': {'date': f"2024-{1 + index % 9:02d}-{10 + index % 18:02d}T{index % 24:02d}:00:00Z"},
+                'message': f"Commit {index} of repo{repo_no}",
+                'author': {'name': author, 'email': f"{author.lower().replace(' ', '')}@example.com"},
+            },
+        })
+    return sorted(commits, key=lambda commit: (commit['commit']['committer']['date'], commit['sha']), reverse=True)
+
+# Function to build the pull requests of a repository, every other one merged
+def make_pull_requests(count, logins=('dev0', 'dev1', 'dev2')):
+    return [{
+        'number': index + 1,
+        'title': f"PR {index + 1}",
+        'user': {'login': logins[index % len(logins)]},
+        'state': 'closed' if index % 2 else 'open',
+        'created_at': f"2024-02-{1 + index % 20:02d}T10:00:00Z",
+        'updated_at': f"2024-03-{1 + index % 20:02d}T{index % 24:02d}:00:00Z",
+        'merged_at': f"2024-03-{1 + index % 20:02d}T{index % 24:02d}:00:00Z" if index % 2 else None,
+        'issue_url': f"https://example.com/issues/{index + 1}",
+    } for index in range(count)]
+
+# Function to build the repositories of the stand-in server, each with its commits and pull requests
+def make_repos(repo_count=3, commit_count=250, pull_request_count=120):
+    return [{'id': 1000 + repo_no, 'name': f"repo{repo_no}",
+             'commits': make_commits(repo_no, commit_count + repo_no),
+             'pulls': make_pull_requests(pull_request_count + repo_no)} for repo_no in range(repo_count)]
+
+# Function to build the stats of a commit out of its SHA, so they are known without storing them
+def commit_stats(sha):
+    return {'additions': int(sha[2:4], 16), 'deletions': int(sha[4:6], 16), 'total': int(sha[2:4], 16) + int(sha[4:6], 16)}
+
+# Local stand-in for the parts of the GitHub REST API the collector uses: the authenticated user, their repositories,
+# and the commits, pull requests, languages and contributors of every repository, paged with Link headers.
+# Responses can be made to fail by path, and every request path is recorded in the order it arrived.
+class GitHubStub:
+    def __init__(self, repos=None):
+        self.repos = repos if repos is not None else make_repos()
+        self.requests = []
+        self.lock = threading.Lock()
+        # Path with query string -> status answered every time, or a list of (status, headers) answered once each
+        self.failures = {}
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self.handler_class())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    # Function to find a repository by name
+    def repo(self, name):
+        return next(repo for repo in self.repos if repo['name'] == name)
+
+    # Function to list the requests sent so far for one path prefix
+    def requests_for(self, prefix):
+        with self.lock:
+            return [path for path in self.requests if path.startswith(prefix)]
+
+    # Function to take the failure planned for a request, if any
+    def failure(self, path):
+        with self.lock:
+            self.requests.append(path)
+            planned = self.failures.get(path)
+            if isinstance(planned, list):
+                if not planned:
+                    return None
+                return planned.pop(0)
+            return (planned, {}) if planned else None
+
+    def handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            # Function to answer with a JSON body, its ETag and the rate limit headers GitHub sends
+            def send_json(self, body, status=200, headers=None):
+                content = json.dumps(body).encode()
+                etag = f'"{hashlib.md5(content).hexdigest()}"'
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                # Planned headers replace the defaults, e.g. an exhausted X-RateLimit-Remaining
+                headers = {'Content-Type': 'application/json', 'ETag': etag, 'X-RateLimit-Resource': 'core',
+                           'X-RateLimit-Remaining': '4999', 'X-RateLimit-Reset': '0', **(headers or {})}
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            # Function to answer with one page of a list, linking the next and last pages the way GitHub does
+            def send_page(self, items, path, query):
+                per_page = int(query.get('per_page', [DEFAULT_PER_PAGE])[0])
+                page = int(query.get('page', ['1'])[0])
+                last_page = max(1, -(-len(items) // per_page))
+
+                def page_url(page_no):
+                    params = {**{name: values[0] for name, values in query.items()}, 'page': page_no}
+                    return f"{stub.url}{path}?{'&'.join(f'{name}={value}' for name, value in params.items())}"
+
+                links = [f'<{page_url(page + 1)}>; rel="next"'] if page < last_page else []
+                links.append(f'<{page_url(last_page)}>; rel="last"')
+                self.send_json(items[(page - 1) * per_page:page * per_page], headers={'Link': ', '.join(links)})
+
+            def do_GET(self):
+                failure = stub.failure(self.path)
+                if failure is not None:
+                    status, headers = failure
+                    self.send_json({'message': 'Planned failure'}, status=status, headers=headers)
+                    return
+
+                url = urlparse(self.path)
+                path, query = url.path, parse_qs(url.query)
+                if path == '/user':
+                    self.send_json({'login': 'me', 'name': 'Me', 'url': f"{stub.url}/users/me"})
+                    return
+                if path == '/user/repos':
+                    self.send_page([self.repo_json(repo) for repo in stub.repos], path, query)
+                    return
+
+                match = re.fullmatch(r'/repos/me/([\w-]+)/commits/([0-9a-f]{40})', path)
+                if match:
+                    self.send_json({'sha': match.group(2), 'stats': commit_stats(match.group(2)),
+                                    'files': [{'filename': 'file'}] * (int(match.group(2)[:2], 16) % 3 + 1)})
+                    return
+
+                match = re.fullmatch(r'/repos/me/([\w-]+)/(\w+)', path)
+                if match:
+                    repo, endpoint = stub.repo(match.group(1)), match.group(2)
+                    if endpoint == 'languages':
+                        self.send_json({'Python': 10})
+                        return
+                    if endpoint == 'contributors':
+                        self.send_page([{'login': 'dev0'}, {'login': 'dev1'}], path, query)
+                        return
+                    if endpoint == 'commits':
+                        since = query.get('since', [''])[0]
+                        self.send_page([commit for commit in repo['commits'] if commit['commit']['committer']['date'] >= since], path, query)
+                        return
+                    if endpoint == 'pulls':
+                        pulls = repo['pulls']
+                        if query.get('sort', [''])[0] == 'updated':
+                            pulls = sorted(pulls, key=lambda pr: pr['updated_at'], reverse=query.get('direction', ['desc'])[0] == 'desc')
+                        self.send_page(pulls, path, query)
+                        return
+
+                self.send_json({'message': 'Not Found'}, status=404)
+
+            # GraphQL is not served, so repository metadata comes from the REST fallback
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                stub.failure(self.path)
+                self.send_json({'message': 'Not Found'}, status=404)
+
+            # Function to describe a repository as the repositories list does
+            def repo_json(self, repo):
+                api_url = f"{stub.url}/repos/me/{repo['name']}"
+                return {'id': repo['id'], 'name': repo['name'], 'full_name': f"me/{repo['name']}", 'description': None,
+                        'created_at': '2024-01-01T00:00:00Z', 'updated_at': '2024-01-02T00:00:00Z', 'owner': {'login': 'me'},
+                        'license': None, 'has_wiki': True, 'forks_count': 0, 'open_issues_count': 0, 'stargazers_count': 0,
+                        'watchers_count': 0, 'html_url': f"https://example.com/me/{repo['name']}", 'url': api_url,
+                        'commits_url': f"{api_url}/commits{{/sha}}", 'languages_url': f"{api_url}/languages",
+                        'pulls_url': f"{api_url}/pulls{{/number}}", 'contributors_url': f"{api_url}/contributors"}
+
+        return Handler
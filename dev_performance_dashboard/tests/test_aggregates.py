@@ -0,0 +1,50 @@
+import pandas as pd
+import sys
+import os
+
+# Adding the parent directory to the path to import the data_collection and metrics modules
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.github_api import fetch_data
+from metrics import aggregates
+from metrics.aggregates import build_aggregates, current_aggregates, PULL_REQUEST_KEY
+from github_stub import make_repos
+
+# Per-day cubes kept in the aggregates, each indexed by author, repository and day (and bucket for the sketch)
+CUBES = ['commits', 'churn', 'pr_merge_rate', 'pr_resolution_sketch']
+
+# Function to sync the stand-in server into a data directory, with commit stats
+def sync(stub, data_dir, incremental=False):
+    fetch_data('token', base_url=stub.url, bulk_metadata=False, data_dir=data_dir, incremental=incremental, commit_stats=True, return_frames=False)
+
+# Function to put resolution times in a fixed order, since a delta appends the ones it changed at the end
+def by_pull_request(resolution_times):
+    return resolution_times.sort_values(PULL_REQUEST_KEY).reset_index(drop=True)
+
+# Aggregates brought up to date from the change log of an incremental sync equal the ones rebuilt from the tables
+def test_delta_matches_rebuild(github_stub, tmp_path, monkeypatch):
+    github_stub.repos = make_repos(repo_count=2, commit_count=60, pull_request_count=20)
+    sync(github_stub, tmp_path)
+    current_aggregates(tmp_path, max_workers=1)
+
+    # A new commit, an open pull request that gets merged, and a new merged pull request
+    repo = github_stub.repo('repo0')
+    repo['commits'].insert(0, {'sha': 'e' * 40, 'commit': {'committer': {'date': '2024-12-01T00:00:00Z'}, 'message': 'New',
+                                                           'author': {'name': 'Dev 1', 'email': 'dev1@example.com'}}})
+    repo['pulls'][0].update({'state': 'closed', 'updated_at': '2024-12-01T00:00:00Z', 'merged_at': '2024-12-01T00:00:00Z'})
+    repo['pulls'].append({**repo['pulls'][1], 'number': 21, 'title': 'PR 21', 'created_at': '2024-11-30T08:00:00Z',
+                          'updated_at': '2024-12-02T00:00:00Z', 'merged_at': '2024-12-02T00:00:00Z'})
+    sync(github_stub, tmp_path, incremental=True)
+
+    # Rebuilding is not allowed while the delta is applied
+    def no_rebuild(*args, **kwargs):
+        raise AssertionError('aggregates were rebuilt instead of updated from the change log')
+    monkeypatch.setattr(aggregates, 'build_aggregates', no_rebuild)
+    delta = current_aggregates(tmp_path, max_workers=1)
+    monkeypatch.undo()
+
+    rebuilt = build_aggregates(tmp_path, max_workers=1)
+    assert delta['source'] == rebuilt['source']
+    assert delta['commits']['Commit Count'].sum() == 60 + 61 + 1
+    for cube in CUBES:
+        pd.testing.assert_frame_equal(delta[cube].sort_index(), rebuilt[cube].sort_index(), check_dtype=False)
+    pd.testing.assert_frame_equal(by_pull_request(delta['pr_resolution_times']), by_pull_request(rebuilt['pr_resolution_times']), check_dtype=False)
@@ -0,0 +1,94 @@
+import pandas as pd
+import pytest
+import sys
+import os
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.collector import PageCollector, collect_repo_activity, fetch_all_pages, repo_tasks
+from data_collection.scheduler import RequestScheduler
+from data_collection.transport import Transport, create_session
+from data_collection.github_api import fetch_data, SyncIncompleteError
+from data_collection.ingest import CHUNKS_DIR
+from data_collection.storage import read_table, table_path
+
+# Function to build a scheduler that sends its requests to the stand-in server without waiting long between retries
+def stub_scheduler():
+    return RequestScheduler(Transport(create_session()), backoff=0.01)
+
+# Function to describe the repositories of the stand-in server the way the repos table does
+def stub_repos_df(stub):
+    return pd.DataFrame([{'ID': repo['id'], 'Name': repo['name'],
+                          'Commits URL': f"{stub.url}/repos/me/{repo['name']}/commits{{/sha}}",
+                          'Pulls URL': f"{stub.url}/repos/me/{repo['name']}/pulls{{/number}}"} for repo in stub.repos])
+
+# Function to run a full sync against the stand-in server
+def sync(stub, data_dir, **kwargs):
+    return fetch_data('token', base_url=stub.url, bulk_metadata=False, data_dir=data_dir, **kwargs)
+
+# Every page of every endpoint is fetched once, 100 items at a time, and read back in the order GitHub lists the items
+def test_pages_come_back_in_order(github_stub):
+    tasks = []
+    for _, repo_id, name, commits_url, pulls_url in stub_repos_df(github_stub).itertuples(name=None):
+        tasks.extend(repo_tasks(repo_id, name, commits_url, pulls_url, None))
+
+    collector = PageCollector()
+    results = fetch_all_pages(stub_scheduler(), tasks, max_workers=8, sink=collector)
+
+    assert not any(result['failed'] for result in results)
+    for commits_task, pulls_task in zip(tasks[::2], tasks[1::2]):
+        repo = github_stub.repo(commits_task['repo_name'])
+        assert [commit['sha'] for commit in collector.items(commits_task)] == [commit['sha'] for commit in repo['commits']]
+        assert [pr['number'] for pr in collector.items(pulls_task)] == [pr['number'] for pr in repo['pulls']]
+
+    # repo0 has 250 commits, which is three pages of 100
+    commit_pages = "/repos/me/repo0/commits?per_page=100&page="
+    assert sorted(github_stub.requests_for(commit_pages)) == [f"{commit_pages}{page}" for page in (1, 2, 3)]
+
+# The tables are written in repository and page order, whatever order the concurrent pages arrived in
+def test_tables_are_deterministic(github_stub, tmp_path):
+    _, _, commits_df, pull_requests_df = sync(github_stub, tmp_path / 'parallel', max_workers=8)
+    _, _, serial_commits_df, serial_pull_requests_df = sync(github_stub, tmp_path / 'serial', max_workers=1)
+
+    assert commits_df['Commit Id'].tolist() == [commit['sha'] for repo in github_stub.repos for commit in repo['commits']]
+    assert pull_requests_df['PR Number'].tolist() == [pr['number'] for repo in github_stub.repos for pr in repo['pulls']]
+    pd.testing.assert_frame_equal(commits_df, serial_commits_df)
+    pd.testing.assert_frame_equal(pull_requests_df, serial_pull_requests_df)
+
+# A repository with a page that failed keeps its sync cursors, so the next run asks for its pages again
+def test_failed_page_keeps_cursors(github_stub):
+    github_stub.failures['/repos/me/repo1/commits?per_page=100&page=2'] = 422
+
+    sync_state, failed_repos = collect_repo_activity(stub_repos_df(github_stub), PageCollector(), {}, scheduler=stub_scheduler(), sync_state={})
+
+    assert failed_repos == [1001]
+    assert sorted(sync_state) == ['1000', '1002']
+
+# A sync with a failed page leaves the saved tables and checkpoints alone, and the next run fetches only what is missing
+def test_failed_page_resumes(github_stub, tmp_path):
+    sync(github_stub, tmp_path, return_frames=False)
+    commits_path = table_path('commits', tmp_path)
+    saved_commits = read_table('commits', tmp_path)
+    saved_mtime = os.path.getmtime(commits_path)
+
+    # repo1 gets a new commit, but one of its pages cannot be fetched
+    repo = github_stub.repo('repo1')
+    repo['commits'].insert(0, {'sha': 'f' * 40, 'commit': {'committer': {'date': '2024-12-01T00:00:00Z'}, 'message': 'New',
+                                                           'author': {'name': 'Dev 0', 'email': 'dev0@example.com'}}})
+    github_stub.failures['/repos/me/repo1/commits?per_page=100&page=2'] = 422
+    with pytest.raises(SyncIncompleteError, match=r'\[1001\]'):
+        sync(github_stub, tmp_path, return_frames=False)
+
+    assert os.path.getmtime(commits_path) == saved_mtime
+    pd.testing.assert_frame_equal(read_table('commits', tmp_path), saved_commits)
+    assert os.path.isdir(tmp_path / CHUNKS_DIR)
+
+    # The rerun only asks again for the endpoint that did not finish
+    github_stub.failures.clear()
+    github_stub.requests.clear()
+    _, _, commits_df, _ = sync(github_stub, tmp_path)
+
+    assert commits_df['Commit Id'].tolist() == [commit['sha'] for repo in github_stub.repos for commit in repo['commits']]
+    activity = [path.split('?')[0] for path in github_stub.requests_for('/repos/') if path.split('?')[0].endswith(('/commits', '/pulls'))]
+    assert set(activity) == {'/repos/me/repo1/commits'}
+    assert not os.path.exists(tmp_path / CHUNKS_DIR)
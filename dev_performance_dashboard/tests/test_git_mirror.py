@@ -0,0 +1,86 @@
+import pandas as pd
+import pytest
+import subprocess
+import sys
+import os
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection import git_mirror
+from data_collection.git_mirror import collect_mirror_commits, iter_log_rows, mirror_path, update_mirror
+from data_collection.ingest import ChunkWriter
+from data_collection.storage import read_table
+
+# Commits of the test repository, oldest first: author name, email, committer date and message.
+# Names and messages use multi-byte characters, so reading the log a few bytes at a time splits them.
+COMMITS = [
+    ('José Müller', 'jose@example.com', '2024-03-01T12:00:00+02:00', 'Añadir el módulo'),
+    ('张伟', 'zhang@example.com', '2024-03-02T09:30:00+00:00', '修复: 编码错误\n\nSecond paragraph ✓'),
+    ('Ренат', 'renat@example.com', '2024-03-03T23:15:00-05:00', 'Исправить 🚀 emoji'),
+    ('Dev 0', 'dev0@example.com', '2024-03-05T08:00:00+00:00', 'Plain ASCII'),
+]
+
+# Committer dates as the log reports them, in UTC
+COMMIT_DATES = ['2024-03-01T10:00:00Z', '2024-03-02T09:30:00Z', '2024-03-04T04:15:00Z', '2024-03-05T08:00:00Z']
+
+# Function to run git in a directory, returning its output
+def git(cwd, *args, env=None):
+    return subprocess.run(['git', '-c', 'commit.gpgsign=false'] + list(args), cwd=cwd, env={**os.environ, **(env or {})},
+                          check=True, capture_output=True, text=True, encoding='utf-8').stdout
+
+# Function to create a repository with the test commits and return its bare mirror
+def make_mirror(tmp_path):
+    repo = tmp_path / 'repo'
+    repo.mkdir()
+    git(repo, 'init', '--quiet')
+    for name, email, date, message in COMMITS:
+        git(repo, 'commit', '--allow-empty', '--quiet', '-m', message, env={
+            'GIT_AUTHOR_NAME': name, 'GIT_AUTHOR_EMAIL': email, 'GIT_AUTHOR_DATE': date,
+            'GIT_COMMITTER_NAME': name, 'GIT_COMMITTER_EMAIL': email, 'GIT_COMMITTER_DATE': date,
+        })
+
+    path = mirror_path(tmp_path / 'mirrors', 1000)
+    assert update_mirror(str(repo), path)
+    return path
+
+# Function to list the rows the log of the test repository should give, newest first
+def expected_rows(path):
+    shas = git(path, 'rev-list', 'HEAD').split()
+    return [[1000, sha, date, message, name, email]
+            for sha, date, (name, email, _, message) in zip(shas, reversed(COMMIT_DATES), reversed(COMMITS))]
+
+# Multi-byte characters and records split across reads come out whole, whatever the read size
+@pytest.mark.parametrize('read_size', [1, 3, 7, 1 << 20])
+def test_non_ascii_log(tmp_path, monkeypatch, read_size):
+    path = make_mirror(tmp_path)
+    monkeypatch.setattr(git_mirror, 'LOG_READ_SIZE', read_size)
+
+    rows = [row for batch in iter_log_rows(1000, path) for row in batch]
+
+    assert rows == expected_rows(path)
+
+# Only commits from the since date onwards are read, handed out as soon as a read completes batch_size rows
+def test_since_and_batches(tmp_path, monkeypatch):
+    path = make_mirror(tmp_path)
+    monkeypatch.setattr(git_mirror, 'LOG_READ_SIZE', 1)
+
+    batches = list(iter_log_rows(1000, path, since='2024-03-02T00:00:00Z', batch_size=2))
+
+    assert [len(batch) for batch in batches] == [2, 1]
+    assert [row for batch in batches for row in batch] == expected_rows(path)[:3]
+
+# Commits are read from the mirrors into the commits table, and a repository that cannot be cloned is reported as failed
+def test_collect_mirror_commits(tmp_path):
+    path = make_mirror(tmp_path)
+    repos_df = pd.DataFrame({'ID': [1000, 1001], 'Repository URL': [str(tmp_path / 'repo'), str(tmp_path / 'missing')]})
+    chunk_writer = ChunkWriter(str(tmp_path / 'chunks'), {})
+
+    sync_state, failed_repos = collect_mirror_commits(repos_df, chunk_writer, str(tmp_path / 'mirrors'), max_workers=2, sync_state={})
+    chunk_writer.compact('commits', [1000, 1001], tmp_path)
+
+    assert failed_repos == [1001]
+    assert sync_state['1000']['last_commit_date'] == COMMIT_DATES[-1]
+    assert '1001' not in sync_state
+    commits_df = read_table('commits', tmp_path)
+    commits_df['Date'] = commits_df['Date'].dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    assert commits_df.values.tolist() == expected_rows(path)
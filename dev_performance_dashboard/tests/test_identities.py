@@ -0,0 +1,76 @@
+import pandas as pd
+import sys
+import os
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.storage import write_table
+from data_collection.identities import build_identities, load_identities
+
+# Function to write pull requests the way the collector saves them from the list endpoint, which has no author name or email
+def write_pull_requests(data_dir, logins):
+    write_table(pd.DataFrame({
+        'Repo Name': 'repo0',
+        'PR Number': range(1, len(logins) + 1),
+        'Title': 'PR',
+        'Author Login': logins,
+        'State': 'closed',
+        'Created At': '2024-02-01T10:00:00Z',
+        'Updated At': '2024-03-01T10:00:00Z',
+        'Merged At': '2024-03-01T10:00:00Z',
+        'Issue Id': '1',
+        'Author Name': 'N/A',
+        'Author Email': 'N/A',
+    }), 'pull_requests', data_dir)
+
+# Function to write commits by (name, email) authors
+def write_commits(data_dir, authors):
+    write_table(pd.DataFrame({
+        'Repo Id': 1000,
+        'Commit Id': [f"{index:040x}" for index in range(len(authors))],
+        'Date': '2024-01-10T10:00:00Z',
+        'Message': 'msg',
+        'Author Name': [name for name, _ in authors],
+        'Author Email': [email for _, email in authors],
+    }), 'commits', data_dir)
+
+# Placeholder names and emails on pull requests must not join their authors into one developer
+def test_placeholders_link_nobody(tmp_path):
+    write_pull_requests(tmp_path, ['dev0', 'dev1', 'dev2', 'dev0', 'dev1'])
+    build_identities(tmp_path)
+    identities = load_identities(tmp_path)
+
+    assert [identities.lookup(login) for login in ['dev0', 'dev1', 'dev2']] == ['dev0', 'dev1', 'dev2']
+    assert identities.lookup('N/A') is None
+    assert identities.lookup('n/a') is None
+
+# A name shared by authors with different emails does not make them one developer, and neither does its case
+def test_names_link_nobody(tmp_path):
+    write_pull_requests(tmp_path, ['dev0'])
+    write_commits(tmp_path, [('Sathish k', 'sathish.k@example.com'), ('Sathish K', 'sathish.kumar@example.com'),
+                             ('Sathish K', 'sathish.kumar@example.com'), ('dev1', 'dev1@example.com')])
+    identities = load_identities(tmp_path)
+
+    assert identities.lookup('Sathish k') == 'sathish.k@example.com'
+    assert identities.lookup('Sathish K') == 'sathish.kumar@example.com'
+    assert identities.lookup('dev1@example.com') != identities.lookup('dev0')
+
+# A commit name that is a login of the dataset, in any case, links the commit's email to that login
+def test_name_matching_login_links_commits(tmp_path):
+    write_pull_requests(tmp_path, ['VikashPR', 'kedar0705'])
+    write_commits(tmp_path, [('vikashpr', 'vikash@example.com'), ('Vikash', 'vikash@example.com'),
+                             ('kedar0705', 'kedar@example.com'), ('kedar', 'kedar@example.com'), ('N/A', 'na@example.com')])
+    identities = load_identities(tmp_path)
+
+    assert [identities.lookup(author) for author in ['vikash@example.com', 'Vikash', 'vikashpr']] == ['VikashPR'] * 3
+    assert [identities.lookup(author) for author in ['kedar@example.com', 'kedar']] == ['kedar0705'] * 2
+    assert identities.lookup('na@example.com') == 'na@example.com'
+
+# A noreply email still links commits to the login it was issued for
+def test_noreply_email_links_login(tmp_path):
+    write_pull_requests(tmp_path, ['dev1'])
+    write_commits(tmp_path, [('Dev One', '12+dev1@users.noreply.github.com')])
+    identities = load_identities(tmp_path)
+
+    assert identities.lookup('Dev One') == 'dev1'
+    assert identities.name('dev1') == 'Dev One'
@@ -0,0 +1,78 @@
+import pytest
+import requests
+import socket
+import time
+import sys
+import os
+
+# Adding the parent directory to the path to import the data_collection module
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from data_collection.scheduler import RequestScheduler
+from data_collection.transport import Transport, create_session
+
+# Function to build a scheduler that does not wait long between retries
+def quick_scheduler(max_retries=3, timeout=(1, 1)):
+    return RequestScheduler(Transport(create_session(timeout=timeout)), max_retries=max_retries, backoff=0.01)
+
+# A transient server error is retried and the retry counted
+def test_server_error_is_retried(github_stub):
+    github_stub.failures['/user'] = [(502, {})]
+    scheduler = quick_scheduler()
+
+    response = scheduler.get(f"{github_stub.url}/user")
+
+    assert response.status_code == 200
+    assert response.json()['login'] == 'me'
+    assert github_stub.requests_for('/user') == ['/user', '/user']
+    assert scheduler.quota_report()['retries'] == 1
+
+# A server error that outlasts the retries is raised instead of passed on as an empty page
+def test_persistent_server_error_raises(github_stub):
+    github_stub.failures['/user'] = 503
+    scheduler = quick_scheduler(max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        scheduler.get(f"{github_stub.url}/user")
+
+    assert len(github_stub.requests_for('/user')) == 3
+
+# Secondary rate limits are waited out for as long as Retry-After says
+@pytest.mark.parametrize('status', [403, 429])
+def test_secondary_rate_limit_is_retried(github_stub, status):
+    github_stub.failures['/user'] = [(status, {'Retry-After': '0'})]
+    scheduler = quick_scheduler()
+
+    assert scheduler.get(f"{github_stub.url}/user").status_code == 200
+    assert scheduler.quota_report()['retries'] == 1
+
+# A spent primary rate limit holds the requests back until the quota resets
+def test_primary_rate_limit_waits_for_reset(github_stub):
+    reset = int(time.time()) + 1
+    github_stub.failures['/user'] = [(403, {'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(reset)})]
+    scheduler = quick_scheduler()
+
+    response = scheduler.get(f"{github_stub.url}/user")
+
+    assert response.status_code == 200
+    assert time.time() >= reset
+    assert scheduler.quota_report()['remaining'] == 4999
+
+# Errors that are not transient come back to the caller without a retry
+def test_client_error_is_not_retried(github_stub):
+    github_stub.failures['/user'] = 422
+    scheduler = quick_scheduler()
+
+    assert scheduler.get(f"{github_stub.url}/user").status_code == 422
+    assert github_stub.requests_for('/user') == ['/user']
+
+# A server that accepts the connection and never answers times out, is retried, and raises once out of retries
+def test_stalled_request_times_out():
+    with socket.socket() as server:
+        server.bind(('127.0.0.1', 0))
+        server.listen(8)
+        scheduler = quick_scheduler(max_retries=1, timeout=(1, 0.2))
+
+        with pytest.raises(requests.Timeout):
+            scheduler.get(f"http://127.0.0.1:{server.getsockname()[1]}/user")
+
+    assert scheduler.quota_report()['retries'] == 1
@@ -1,122 +1,275 @@
+import hashlib
+import json
+import plotly
 import plotly.graph_objects as go
+import plotly.offline
 import pandas as pd
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 # Adding the parent directory to the path to import the metrics module
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from metrics.calculator import get_metrics
+from data_collection.identities import load_identities
+from visualization.downsampling import scatter_trace, series_points, WEBGL_THRESHOLD
 
-# Function to generate commit charts using Plotly
-def generate_commit_charts(metrics):
-    # Daily Commits
-    daily_commits = metrics['daily_commits']
+# Environment variables setting the directory charts are exported to, the formats they are exported in
+# (comma-separated) and how many processes render them
+CHART_DIR_ENV = 'DEV_DASHBOARD_CHART_DIR'
+CHART_FORMATS_ENV = 'DEV_DASHBOARD_CHART_FORMATS'
+CHART_WORKERS_ENV = 'DEV_DASHBOARD_CHART_WORKERS'
+
+# Formats charts can be exported in: interactive HTML pages, or static PNG images (rendered with kaleido)
+CHART_FORMATS = ['html', 'png']
+
+# By default charts are exported as HTML into the working directory, where they were always written, and every core renders them
+CHART_DIR = os.environ.get(CHART_DIR_ENV, '.')
+EXPORT_FORMATS = [chart_format.strip() for chart_format in os.environ.get(CHART_FORMATS_ENV, 'html').split(',') if chart_format.strip()]
+MAX_WORKERS = int(os.environ.get(CHART_WORKERS_ENV, os.cpu_count() or 1))
+
+# Size of exported PNG images, the size of the images committed next to this module
+PNG_WIDTH, PNG_HEIGHT = 1000, 500
+
+# Name of the plotly.js bundle written once into the chart directory and loaded by every HTML chart in it
+PLOTLY_JS_FILE = 'plotly.min.js'
+
+# Name of the file recording the data every exported chart was rendered from, next to the charts
+CHART_MANIFEST_FILE = 'charts_manifest.json'
+
+# Version of the chart layouts; charts exported by another version are rendered again
+CHARTS_FORMAT = 2
+
+# Function to split a metric into the rows of every developer in one pass, in the order developers first appear
+def developer_groups(metric_df):
+    return metric_df.groupby('Developer Id', sort=False, observed=True)
+
+# Function to get the name a developer is shown under in a legend, their id if the chart was given no name for them
+def display_name(names, developer):
+    return (names or {}).get(developer, developer)
+
+# Function to draw the daily commits of every developer
+def daily_commits_chart(daily_commits, names=None):
+    # Every developer's series is downsampled to a share of the chart's points, and all are drawn with WebGL once there are many
+    developers = developer_groups(daily_commits)
+    webgl = len(daily_commits) > WEBGL_THRESHOLD
     fig = go.Figure()
-    for developer in daily_commits['Author Name'].unique():
-        developer_data = daily_commits[daily_commits['Author Name'] == developer]
-        fig.add_trace(go.Scatter(x=developer_data['Date'], y=developer_data['Commit Count'],
-                                 mode='lines+markers', name=developer))
+    fig.add_traces([scatter_trace(developer_data['Date'], developer_data['Commit Count'], max_points=series_points(developers.ngroups),
+                                  webgl=webgl, mode='lines+markers', name=display_name(names, developer))
+                    for developer, developer_data in developers])
     fig.update_layout(title='Daily Commits per Developer',
                       xaxis_title='Date',
                       yaxis_title='Commit Count',
                       xaxis_tickangle=-45)
-    fig.write_html('daily_commits_chart.html')  # Save as HTML for interactivity
+    return fig
 
-    # Weekly Commits
-    weekly_commits = metrics['weekly_commits']
+# Function to draw the weekly commits of every developer
+def weekly_commits_chart(weekly_commits, names=None):
     fig = go.Figure()
-    for developer in weekly_commits['Author Name'].unique():
-        developer_data = weekly_commits[weekly_commits['Author Name'] == developer]
-        fig.add_trace(go.Scatter(x=developer_data['Week'].astype(str) + '-' + developer_data['Year'].astype(str),
-                                 y=developer_data['Commit Count'],
-                                 mode='lines+markers', name=developer))
+    fig.add_traces([go.Scatter(x=developer_data['Week'].astype(str) + '-' + developer_data['Year'].astype(str),
+                               y=developer_data['Commit Count'],
+                               mode='lines+markers', name=display_name(names, developer))
+                    for developer, developer_data in developer_groups(weekly_commits)])
     fig.update_layout(title='Weekly Commits per Developer',
                       xaxis_title='Week-Year',
                       yaxis_title='Commit Count',
                       xaxis_tickangle=-45)
-    fig.write_html('weekly_commits_chart.html')
+    return fig
 
-    # Monthly Commits
-    monthly_commits = metrics['monthly_commits']
+# Function to draw the monthly commits of every developer
+def monthly_commits_chart(monthly_commits, names=None):
     fig = go.Figure()
-    for developer in monthly_commits['Author Name'].unique():
-        developer_data = monthly_commits[monthly_commits['Author Name'] == developer]
-        fig.add_trace(go.Bar(x=developer_data['Month'].astype(str) + '-' + developer_data['Year'].astype(str),
-                             y=developer_data['Commit Count'],
-                             name=developer))
+    fig.add_traces([go.Bar(x=developer_data['Month'].astype(str) + '-' + developer_data['Year'].astype(str),
+                           y=developer_data['Commit Count'],
+                           name=display_name(names, developer))
+                    for developer, developer_data in developer_groups(monthly_commits)])
     fig.update_layout(title='Monthly Commits per Developer',
                       xaxis_title='Month-Year',
                       yaxis_title='Commit Count',
                       xaxis_tickangle=-45)
-    fig.write_html('monthly_commits_chart.html')
+    return fig
 
-    # Yearly Commits
-    yearly_commits = metrics['yearly_commits']
+# Function to draw the yearly commits of every developer
+def yearly_commits_chart(yearly_commits, names=None):
     fig = go.Figure()
-    for developer in yearly_commits['Author Name'].unique():
-        developer_data = yearly_commits[yearly_commits['Author Name'] == developer]
-        fig.add_trace(go.Bar(x=developer_data['Year'],
-                             y=developer_data['Commit Count'],
-                             name=developer))
+    fig.add_traces([go.Bar(x=developer_data['Year'],
+                           y=developer_data['Commit Count'],
+                           name=display_name(names, developer))
+                    for developer, developer_data in developer_groups(yearly_commits)])
     fig.update_layout(title='Yearly Commits per Developer',
                       xaxis_title='Year',
                       yaxis_title='Commit Count')
-    fig.write_html('yearly_commits_chart.html')
+    return fig
 
-def generate_pr_charts(metrics):
-    # Daily PR Merge Rate
-    daily_pr_merge_rate = metrics['daily_pr_merge_rate']
+# Function to draw the daily PR merge rate of every developer
+def daily_pr_merge_rate_chart(daily_pr_merge_rate, names=None):
+    developers = developer_groups(daily_pr_merge_rate)
+    webgl = len(daily_pr_merge_rate) > WEBGL_THRESHOLD
     fig = go.Figure()
-    for developer in daily_pr_merge_rate['Author Login'].unique():
-        developer_data = daily_pr_merge_rate[daily_pr_merge_rate['Author Login'] == developer]
-        fig.add_trace(go.Scatter(x=developer_data['Merged At'],
-                                 y=developer_data['PR Merge Count'],
-                                 mode='lines+markers', name=developer))
+    fig.add_traces([scatter_trace(developer_data['Merged At'],
+                                  developer_data['PR Merge Count'],
+                                  max_points=series_points(developers.ngroups),
+                                  webgl=webgl, mode='lines+markers', name=display_name(names, developer))
+                    for developer, developer_data in developers])
     fig.update_layout(title='Daily PR Merge Rates per Developer',
                       xaxis_title='Date',
                       yaxis_title='PR Merge Count',
                       xaxis_tickangle=-45)
-    fig.write_html('daily_pr_merge_rate_chart.html')
+    return fig
 
-    # Monthly PR Merge Rate
-    monthly_pr_merge_rate = metrics['monthly_pr_merge_rate']
+# Function to draw the monthly PR merge rate of every developer
+def monthly_pr_merge_rate_chart(monthly_pr_merge_rate, names=None):
     fig = go.Figure()
-    for developer in monthly_pr_merge_rate['Author Login'].unique():
-        developer_data = monthly_pr_merge_rate[monthly_pr_merge_rate['Author Login'] == developer]
-        fig.add_trace(go.Bar(x=developer_data['Month'].astype(str) + '-' + developer_data['Year'].astype(str),
-                             y=developer_data['PR Merge Count'],
-                             name=developer))
+    fig.add_traces([go.Bar(x=developer_data['Month'].astype(str) + '-' + developer_data['Year'].astype(str),
+                           y=developer_data['PR Merge Count'],
+                           name=display_name(names, developer))
+                    for developer, developer_data in developer_groups(monthly_pr_merge_rate)])
     fig.update_layout(title='Monthly PR Merge Rates per Developer',
                       xaxis_title='Month-Year',
                       yaxis_title='PR Merge Count',
                       xaxis_tickangle=-45)
-    fig.write_html('monthly_pr_merge_rate_chart.html')
+    return fig
 
-    # Yearly PR Merge Rate
-    yearly_pr_merge_rate = metrics['yearly_pr_merge_rate']
+# Function to draw the yearly PR merge rate of every developer
+def yearly_pr_merge_rate_chart(yearly_pr_merge_rate, names=None):
     fig = go.Figure()
-    for developer in yearly_pr_merge_rate['Author Login'].unique():
-        developer_data = yearly_pr_merge_rate[yearly_pr_merge_rate['Author Login'] == developer]
-        fig.add_trace(go.Bar(x=developer_data['Year'],
-                             y=developer_data['PR Merge Count'],
-                             name=developer))
+    fig.add_traces([go.Bar(x=developer_data['Year'],
+                           y=developer_data['PR Merge Count'],
+                           name=display_name(names, developer))
+                    for developer, developer_data in developer_groups(yearly_pr_merge_rate)])
     fig.update_layout(title='Yearly PR Merge Rates per Developer',
                       xaxis_title='Year',
                       yaxis_title='PR Merge Count')
-    fig.write_html('yearly_pr_merge_rate_chart.html')
+    return fig
 
-    # PR Resolution Time
-    pr_resolution_times = metrics['pr_resolution_times']
+# Function to draw the PR resolution times of every developer
+def pr_resolution_times_chart(pr_resolution_times, names=None):
     fig = go.Figure()
-    for developer in pr_resolution_times['Author Login'].unique():
-        developer_data = pr_resolution_times[pr_resolution_times['Author Login'] == developer]
-        fig.add_trace(go.Box(y=developer_data['Resolution Time (days)'],
-                             name=developer))
+    fig.add_traces([go.Box(y=developer_data['Resolution Time (days)'],
+                           name=display_name(names, developer))
+                    for developer, developer_data in developer_groups(pr_resolution_times)])
     fig.update_layout(title='PR Resolution Time per Developer',
                       yaxis_title='Resolution Time (days)')
-    fig.write_html('pr_resolution_times_chart.html')
+    return fig
+
+# Charts of the commit and pull request metrics, by the file name they are exported under, with the metric each is drawn from
+COMMIT_CHARTS = {
+    'daily_commits_chart': ('daily_commits', daily_commits_chart),
+    'weekly_commits_chart': ('weekly_commits', weekly_commits_chart),
+    'monthly_commits_chart': ('monthly_commits', monthly_commits_chart),
+    'yearly_commits_chart': ('yearly_commits', yearly_commits_chart),
+}
+PR_CHARTS = {
+    'daily_pr_merge_rate_chart': ('daily_pr_merge_rate', daily_pr_merge_rate_chart),
+    'monthly_pr_merge_rate_chart': ('monthly_pr_merge_rate', monthly_pr_merge_rate_chart),
+    'yearly_pr_merge_rate_chart': ('yearly_pr_merge_rate', yearly_pr_merge_rate_chart),
+    'pr_resolution_times_chart': ('pr_resolution_times', pr_resolution_times_chart),
+}
+CHARTS = {**COMMIT_CHARTS, **PR_CHARTS}
+
+# Function to get the display names of the developers in a metric, all a chart needs of the identity index
+def chart_names(metric_df, identities):
+    return {developer: identities.name(developer) for developer in metric_df['Developer Id'].dropna().unique()}
+
+# Function to hash the data a chart is drawn from and the names it shows, together with the chart layouts and plotly version it is drawn with
+def chart_hash(metric_df, names=None):
+    digest = hashlib.sha256(json.dumps([CHARTS_FORMAT, plotly.__version__, list(map(str, metric_df.columns)), names or {}],
+                                       sort_keys=True, default=str).encode())
+    digest.update(pd.util.hash_pandas_object(metric_df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+# Function to draw one chart and write it in one format, through a temporary file so a half-written chart is never left behind.
+# HTML charts load the shared plotly.js bundle of their directory instead of embedding their own copy.
+def render_chart(name, metric_df, output_dir, chart_format, names=None):
+    fig = CHARTS[name][1](metric_df, names)
+    path = os.path.join(output_dir, f"{name}.{chart_format}")
+    if chart_format == 'html':
+        fig.write_html(f"{path}.tmp", include_plotlyjs='directory')  # Save as HTML for interactivity
+    else:
+        fig.write_image(f"{path}.tmp", format=chart_format, width=PNG_WIDTH, height=PNG_HEIGHT)
+    os.replace(f"{path}.tmp", path)
+    return path
+
+# Function to read the manifest of a chart directory, empty if the charts in it were never exported
+def read_manifest(output_dir):
+    path = os.path.join(output_dir, CHART_MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {'plotly': None, 'charts': {}}
+    with open(path) as f:
+        return json.load(f)
+
+# Function to save the manifest of a chart directory
+def write_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, CHART_MANIFEST_FILE)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+# Function to export charts of the metrics into a directory, returning the paths of the files written.
+# A chart whose data, names, layout and plotly version are unchanged since the last export into the directory is not drawn again.
+# Charts are drawn in a pool of max_workers processes when more than one is out of date, since rendering PNGs in
+# particular takes far longer than handing a chart's rows to a worker.
+# Legends show the display names of the identity index of data_dir, the data directory the metrics were computed from.
+def export_charts(metrics, output_dir=CHART_DIR, formats=EXPORT_FORMATS, charts=CHARTS, max_workers=MAX_WORKERS, data_dir=None):
+    for chart_format in formats:
+        if chart_format not in CHART_FORMATS:
+            raise ValueError(f"Unknown chart format '{chart_format}', expected one of {CHART_FORMATS}")
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = read_manifest(output_dir)
+
+    # The plotly.js bundle is written once per directory and plotly version, before any worker looks for it
+    bundle_path = os.path.join(output_dir, PLOTLY_JS_FILE)
+    if 'html' in formats and (manifest['plotly'] != plotly.__version__ or not os.path.exists(bundle_path)):
+        with open(f"{bundle_path}.tmp", 'w', encoding='utf-8') as f:
+            f.write(plotly.offline.get_plotlyjs())
+        os.replace(f"{bundle_path}.tmp", bundle_path)
+        manifest['plotly'] = plotly.__version__
+
+    # Workers only get the names of the developers their chart shows, not the whole identity index
+    identities = load_identities(data_dir)
+    names = {name: chart_names(metrics[metric], identities) for name, (metric, _) in charts.items()}
+    hashes = {name: chart_hash(metrics[metric], names[name]) for name, (metric, _) in charts.items()}
+    pending = [(name, chart_format) for name in charts for chart_format in formats
+               if manifest['charts'].get(f"{name}.{chart_format}") != hashes[name]
+               or not os.path.exists(os.path.join(output_dir, f"{name}.{chart_format}"))]
+
+    # Every chart succeeds or fails on its own, so the charts written before or next to a failing one are kept
+    paths = {}
+    errors = []
+    if max_workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(pending))) as executor:
+            futures = {executor.submit(render_chart, name, metrics[charts[name][0]], output_dir, chart_format, names[name]): (name, chart_format)
+                       for name, chart_format in pending}
+            for future in as_completed(futures):
+                try:
+                    paths[futures[future]] = future.result()
+                except Exception as error:
+                    errors.append(error)
+    else:
+        for name, chart_format in pending:
+            try:
+                paths[(name, chart_format)] = render_chart(name, metrics[charts[name][0]], output_dir, chart_format, names[name])
+            except Exception as error:
+                errors.append(error)
+
+    # Only charts that were written are recorded, so the ones that failed are drawn again by the next export
+    for name, chart_format in paths:
+        manifest['charts'][f"{name}.{chart_format}"] = hashes[name]
+    write_manifest(output_dir, manifest)
+    if errors:
+        raise errors[0]
+    return [paths[chart] for chart in pending]
+
+# Function to generate commit charts using Plotly
+def generate_commit_charts(metrics, output_dir=CHART_DIR, formats=EXPORT_FORMATS, data_dir=None):
+    return export_charts(metrics, output_dir, formats, charts=COMMIT_CHARTS, data_dir=data_dir)
+
+# Function to generate PR charts using Plotly
+def generate_pr_charts(metrics, output_dir=CHART_DIR, formats=EXPORT_FORMATS, data_dir=None):
+    return export_charts(metrics, output_dir, formats, charts=PR_CHARTS, data_dir=data_dir)
 
 if __name__ == "__main__":
     metrics = get_metrics()
-    generate_commit_charts(metrics)
-    generate_pr_charts(metrics)
+    paths = export_charts(metrics)
+    print(f"Exported {len(paths)} of {len(CHARTS) * len(EXPORT_FORMATS)} charts to '{os.path.abspath(CHART_DIR)}'")
@@ -1,103 +1,294 @@
-from dash import dcc, html, Input, Output
+from dash import dcc, html, Input, Output, State
+from dash.exceptions import PreventUpdate
 import dash
+import json
+import os
+import threading
+from collections import OrderedDict
 import plotly.graph_objs as go
-from metrics.calculator import get_metrics
+from metrics.calculator import get_metrics, resolution_time_page, resolution_time_summary, RESOLUTION_PAGE_SIZE
+from data_collection.identities import load_identities
+from data_collection.storage import dataset_fingerprint
+from visualization.downsampling import scatter_trace, relayout_range
 
-# Fetch metrics using get_metrics function from calculator.py
-metrics = get_metrics()
+# Environment variable setting how many developers' figures are kept serialized
+FIGURE_CACHE_SIZE_ENV = 'DEV_DASHBOARD_FIGURE_CACHE_SIZE'
+
+# By default the figures of the last 256 developers viewed are kept
+FIGURE_CACHE_SIZE = int(os.environ.get(FIGURE_CACHE_SIZE_ENV, 256))
+
+# Page sizes the PR resolution time view offers
+RESOLUTION_PAGE_SIZES = [10, 20, 50, 100]
+
+# Environment variable setting how often, in seconds, the dashboard checks the dataset for changes
+REFRESH_SECONDS_ENV = 'DEV_DASHBOARD_REFRESH_SECONDS'
+
+# By default a sync shows up in the dashboard within ten seconds
+REFRESH_SECONDS = float(os.environ.get(REFRESH_SECONDS_ENV, 10))
+
+# Cache of the serialized figures of a developer per version of the dataset, dropping the least recently viewed first
+class FigureCache:
+    def __init__(self, max_entries=FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    # Function to get the figures of a key, building them with build() only if they are not cached
+    def get(self, key, build):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+
+        figures = build()
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = figures
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return figures
+
+# Function to split every metric table into the rows of each developer, so selecting a developer is a dictionary lookup
+# instead of a scan of every table. Developers without rows in a table get the table's empty frame.
+def partition_metrics(metrics):
+    partitions = {}
+    for key, df in metrics.items():
+        partitions[key] = {developer_id: rows for developer_id, rows in df.groupby('Developer Id', observed=True, sort=False)}
+        partitions[key][None] = df.iloc[:0]
+    return partitions
+
+# One version of the metrics with everything the callbacks read from them: the fingerprint of the dataset they were
+# computed from, the tables split by developer and the developers to pick from. A snapshot is never modified once built;
+# a newer version of the dataset gets a new snapshot, so a callback holding one always sees a consistent state.
+class MetricsSnapshot:
+    def __init__(self, data_dir=None):
+        # The fingerprint is taken before computing, so a dataset written meanwhile is picked up by the next refresh
+        self.fingerprint = dataset_fingerprint(data_dir)
+        metrics = get_metrics(data_dir)
+
+        # Every metric table is split by developer once, when the metrics load
+        self.partitions = partition_metrics(metrics)
+
+        # Every metric table is keyed by developer id; the identity index gives each developer a display name
+        self.identities = load_identities(data_dir)
+        self.developer_ids = sorted(set(metrics['daily_commits']['Developer Id']) | set(metrics['daily_pr_merge_rate']['Developer Id']),
+                                    key=lambda developer_id: (self.identities.name(developer_id).lower(), developer_id))
+
+    # Function to get the rows of one developer in one metric table
+    def rows(self, key, developer_id):
+        return self.partitions[key].get(developer_id, self.partitions[key][None])
+
+    # Function to get the options of the developer dropdown
+    def developer_options(self):
+        return [{'label': self.identities.name(developer_id), 'value': developer_id} for developer_id in self.developer_ids]
+
+# Keeper of the current metrics snapshot. A background thread checks the dataset fingerprint every interval seconds and,
+# when the files changed, computes a new snapshot and swaps it in with a single assignment. Callbacks never wait on a
+# reload: they keep reading the previous snapshot until the new one is complete.
+class MetricsRefresher:
+    def __init__(self, data_dir=None, interval=REFRESH_SECONDS):
+        self.data_dir = data_dir
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.snapshot = None
+        self.reloads = 0
+        self.failures = 0
+
+    # Function to get the current snapshot, loading the first one on first use
+    def current(self):
+        snapshot = self.snapshot
+        if snapshot is None:
+            with self.lock:
+                if self.snapshot is None:
+                    self.snapshot = MetricsSnapshot(self.data_dir)
+                snapshot = self.snapshot
+        return snapshot
+
+    # Function to load a new snapshot if the dataset changed since the current one was built; returns whether it did
+    def refresh(self):
+        with self.lock:
+            if self.snapshot is not None and self.snapshot.fingerprint == dataset_fingerprint(self.data_dir):
+                return False
+            snapshot = MetricsSnapshot(self.data_dir)
+            self.snapshot = snapshot
+            self.reloads += 1
+        return True
+
+    # Function run by the background thread. A failed reload, e.g. of tables caught halfway through a sync,
+    # leaves the previous snapshot in place and is retried at the next interval.
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.failures += 1
+                print(f"Reloading the dashboard metrics failed, still serving the previous version: {e}")
+
+    # Function to start checking the dataset in a daemon thread, once
+    def start(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='metrics-refresher', daemon=True)
+                self.thread.start()
+
+    # Function to stop the background thread
+    def stop(self):
+        self.stopped.set()
+
+# Current metrics of the dataset, reloaded in the background whenever it changes
+refresher = MetricsRefresher()
+
+# Serialized figures of the developers viewed so far
+figure_cache = FigureCache()
 
 # Initialize the Dash app
 app = dash.Dash(__name__)
 
-# Layout of the dashboard
-app.layout = html.Div(children=[
-    html.H1(children='Development Performance Dashboard'),
-
-    # Dropdown for selecting developer
-    html.Div(children=[
-        html.Label('Select Developer:'),
-        dcc.Dropdown(
-            id='developer-dropdown',
-            options=[{'label': dev, 'value': dev} for dev in metrics['daily_commits']['Author Name'].unique()],
-            value=metrics['daily_commits']['Author Name'].unique()[0]  # Default value
-        )
-    ]),
-
-    # Daily Commits Graph
-    html.Div(children=[
-        html.H2('Daily Commits'),
-        dcc.Graph(id='daily-commits-graph')
-    ]),
-
-    # Weekly Commits Graph
-    html.Div(children=[
-        html.H2('Weekly Commits'),
-        dcc.Graph(id='weekly-commits-graph')
-    ]),
-
-    # Monthly Commits Graph
-    html.Div(children=[
-        html.H2('Monthly Commits'),
-        dcc.Graph(id='monthly-commits-graph')
-    ]),
-
-    # Yearly Commits Graph
-    html.Div(children=[
-        html.H2('Yearly Commits'),
-        dcc.Graph(id='yearly-commits-graph')
-    ]),
-
-    # PR Merge Rates Graph
-    html.Div(children=[
-        html.H2('PR Merge Rates'),
-        dcc.Graph(id='pr-merge-rate-graph')
-    ]),
-
-    # PR Resolution Times Graph
-    html.Div(children=[
-        html.H2('PR Resolution Times'),
-        dcc.Graph(id='pr-resolution-times-graph')
+# Layout of the dashboard for one snapshot of the metrics, or without any data
+def page_layout(snapshot=None):
+    return html.Div(children=[
+        html.H1(children='Development Performance Dashboard'),
+
+        # Fingerprint of the dataset the page shows, and the timer checking whether a newer one was loaded
+        dcc.Store(id='dataset-fingerprint', data=snapshot.fingerprint if snapshot else None),
+        dcc.Interval(id='refresh-interval', interval=int(REFRESH_SECONDS * 1000)),
+
+        # Dropdown for selecting developer
+        html.Div(children=[
+            html.Label('Select Developer:'),
+            dcc.Dropdown(
+                id='developer-dropdown',
+                options=snapshot.developer_options() if snapshot else [],
+                value=snapshot.developer_ids[0] if snapshot and snapshot.developer_ids else None  # Default value
+            )
+        ]),
+
+        # Daily Commits Graph
+        html.Div(children=[
+            html.H2('Daily Commits'),
+            dcc.Graph(id='daily-commits-graph')
+        ]),
+
+        # Weekly Commits Graph
+        html.Div(children=[
+            html.H2('Weekly Commits'),
+            dcc.Graph(id='weekly-commits-graph')
+        ]),
+
+        # Monthly Commits Graph
+        html.Div(children=[
+            html.H2('Monthly Commits'),
+            dcc.Graph(id='monthly-commits-graph')
+        ]),
+
+        # Yearly Commits Graph
+        html.Div(children=[
+            html.H2('Yearly Commits'),
+            dcc.Graph(id='yearly-commits-graph')
+        ]),
+
+        # PR Merge Rates Graph
+        html.Div(children=[
+            html.H2('PR Merge Rates'),
+            dcc.Graph(id='pr-merge-rate-graph')
+        ]),
+
+        # PR Resolution Times Graph, one page of pull requests or their distribution at a time
+        html.Div(children=[
+            html.H2('PR Resolution Times'),
+            dcc.RadioItems(
+                id='resolution-mode',
+                options=[
+                    {'label': 'Slowest first', 'value': 'slowest'},
+                    {'label': 'Fastest first', 'value': 'fastest'},
+                    {'label': 'Distribution', 'value': 'distribution'}
+                ],
+                value='slowest',
+                inline=True
+            ),
+            dcc.Dropdown(
+                id='resolution-page-size',
+                options=[{'label': f'{size} per page', 'value': size} for size in RESOLUTION_PAGE_SIZES],
+                value=RESOLUTION_PAGE_SIZE,
+                clearable=False
+            ),
+            html.Button('Previous', id='resolution-previous'),
+            html.Span(id='resolution-page-label'),
+            html.Button('Next', id='resolution-next'),
+            dcc.Store(id='resolution-page', data=0),
+            dcc.Graph(id='pr-resolution-times-graph')
+        ])
     ])
-])
 
-# Callback to update graphs based on selected developer
+# Layout served on every page load, from the current snapshot
+def serve_layout():
+    return page_layout(refresher.current())
+
+# Callbacks are checked against the layout without data, so importing the dashboard computes no metrics
+app.validation_layout = page_layout()
+app.layout = serve_layout
+
+# Callback to refresh the developer dropdown once a newer version of the dataset was loaded,
+# keeping the selected developer if they are still in it
+@app.callback(
+    [
+        Output('developer-dropdown', 'options'),
+        Output('developer-dropdown', 'value'),
+        Output('dataset-fingerprint', 'data')
+    ],
+    [Input('refresh-interval', 'n_intervals')],
+    [State('dataset-fingerprint', 'data'), State('developer-dropdown', 'value')]
+)
+def refresh_developers(n_intervals, page_fingerprint, selected_developer):
+    snapshot = refresher.current()
+    if snapshot.fingerprint == page_fingerprint:
+        raise PreventUpdate
+
+    if selected_developer not in snapshot.developer_ids:
+        selected_developer = snapshot.developer_ids[0] if snapshot.developer_ids else None
+    return snapshot.developer_options(), selected_developer, snapshot.fingerprint
+
+# Callback to update graphs based on selected developer, and again once the page moves to a newer version of the dataset
 @app.callback(
     [
         Output('daily-commits-graph', 'figure'),
         Output('weekly-commits-graph', 'figure'),
         Output('monthly-commits-graph', 'figure'),
         Output('yearly-commits-graph', 'figure'),
-        Output('pr-merge-rate-graph', 'figure'),
-        Output('pr-resolution-times-graph', 'figure')
+        Output('pr-merge-rate-graph', 'figure')
     ],
-    [Input('developer-dropdown', 'value')]
+    [Input('developer-dropdown', 'value'), Input('dataset-fingerprint', 'data')]
 )
-def update_graphs(selected_developer):
-    # Filter data based on selected developer
-    daily_commits = metrics['daily_commits'][metrics['daily_commits']['Author Name'] == selected_developer]
-    weekly_commits = metrics['weekly_commits'][metrics['weekly_commits']['Author Name'] == selected_developer]
-    monthly_commits = metrics['monthly_commits'][metrics['monthly_commits']['Author Name'] == selected_developer]
-    yearly_commits = metrics['yearly_commits'][metrics['yearly_commits']['Author Name'] == selected_developer]
+def update_graphs(selected_developer, page_fingerprint=None):
+    # The snapshot is read once, so every figure of the response comes from the same version of the metrics
+    snapshot = refresher.current()
+
+    # Figures are built once per developer and version of the dataset, and served from their JSON afterwards
+    figures = figure_cache.get((selected_developer, snapshot.fingerprint),
+                               lambda: [figure.to_json() for figure in build_figures(snapshot, selected_developer)])
+    return tuple(json.loads(figure) for figure in figures)
+
+# Function to build the figures of one developer from one snapshot of the metrics
+def build_figures(snapshot, selected_developer):
+    # Look up the rows of the selected developer, whose commits and pull requests share one developer id
+    daily_commits = snapshot.rows('daily_commits', selected_developer)
+    weekly_commits = snapshot.rows('weekly_commits', selected_developer)
+    monthly_commits = snapshot.rows('monthly_commits', selected_developer)
+    yearly_commits = snapshot.rows('yearly_commits', selected_developer)
     
     pr_merge_rate = {
-        'daily': metrics['daily_pr_merge_rate'][metrics['daily_pr_merge_rate']['Author Login'] == selected_developer],
-        'monthly': metrics['monthly_pr_merge_rate'][metrics['monthly_pr_merge_rate']['Author Login'] == selected_developer]
+        'daily': snapshot.rows('daily_pr_merge_rate', selected_developer),
+        'monthly': snapshot.rows('monthly_pr_merge_rate', selected_developer)
     }
-    
-    pr_resolution_times = metrics['pr_resolution_times'][metrics['pr_resolution_times']['Author Login'] == selected_developer]
 
     # Create figures
-    daily_commits_fig = go.Figure()
-    daily_commits_fig.add_trace(go.Scatter(
-        x=daily_commits['Date'],
-        y=daily_commits['Commit Count'],
-        mode='lines+markers',
-        name='Daily Commits'
-    ))
-    daily_commits_fig.update_layout(title='Daily Commits Over Time',
-                                    xaxis={'title': 'Date'},
-                                    yaxis={'title': 'Commit Count'},
-                                    hovermode='closest')
+    daily_commits_fig = daily_commits_figure(daily_commits, selected_developer)
 
     weekly_commits_fig = go.Figure()
     weekly_commits_fig.add_trace(go.Scatter(
@@ -135,10 +326,104 @@ def update_graphs(selected_developer):
                                      yaxis={'title': 'Commit Count'},
                                      hovermode='closest')
 
+    pr_merge_rate_fig = pr_merge_rate_figure(pr_merge_rate, selected_developer)
+
+    return (
+        daily_commits_fig,
+        weekly_commits_fig,
+        monthly_commits_fig,
+        yearly_commits_fig,
+        pr_merge_rate_fig
+    )
+
+# Callback to show one page of the selected developer's pull requests by resolution time, or the distribution
+# of their resolution times. Only the page shown is sorted out of the history and sent to the browser.
+@app.callback(
+    [
+        Output('pr-resolution-times-graph', 'figure'),
+        Output('resolution-page', 'data'),
+        Output('resolution-page-label', 'children')
+    ],
+    [
+        Input('developer-dropdown', 'value'),
+        Input('resolution-mode', 'value'),
+        Input('resolution-page-size', 'value'),
+        Input('resolution-previous', 'n_clicks'),
+        Input('resolution-next', 'n_clicks'),
+        Input('dataset-fingerprint', 'data')
+    ],
+    [State('resolution-page', 'data')]
+)
+def update_resolution_times(selected_developer, mode, page_size, previous_clicks, next_clicks, page_fingerprint, page):
+    pr_resolution_times = refresher.current().rows('pr_resolution_times', selected_developer)
+    if mode == 'distribution':
+        return resolution_summary_figure(*resolution_time_summary(pr_resolution_times)), 0, ''
+
+    # Paging moves on from the page shown; choosing another developer, order or page size starts over
+    page = {'resolution-previous': page - 1, 'resolution-next': page + 1}.get(dash.ctx.triggered_id, 0)
+    page_df, page, page_count = resolution_time_page(pr_resolution_times, mode, page, page_size)
+    return resolution_page_figure(page_df, mode), page, f'Page {page + 1} of {page_count}'
+
+# Function to build the figure of one page of pull requests, listed from the top in the order of the page
+def resolution_page_figure(page_df, mode):
+    pr_resolution_times_fig = go.Figure()
+    pr_resolution_times_fig.add_trace(go.Bar(
+        # Titles are not unique, so every bar is labeled with its pull request as well
+        y=page_df['Title'].astype(str) + ' (' + page_df['Repo Name'].astype(str) + '#' + page_df['PR Number'].astype(str) + ')',
+        x=page_df['Resolution Time (days)'],
+        orientation='h',
+        name='PR Resolution Times',
+        marker={'color': 'blue'}
+    ))
+    pr_resolution_times_fig.update_layout(title=f"{'Slowest' if mode == 'slowest' else 'Fastest'} PR Resolution Times",
+                                          xaxis={'title': 'Resolution Time (days)'},
+                                          yaxis={'title': 'PR Title', 'autorange': 'reversed'},
+                                          hovermode='closest')
+    return pr_resolution_times_fig
+
+# Function to build the figure of the distribution of resolution times: a histogram with the percentiles marked on it
+def resolution_summary_figure(histogram, percentiles):
+    pr_resolution_times_fig = go.Figure()
+    pr_resolution_times_fig.add_trace(go.Bar(
+        x=(histogram['From (days)'] + histogram['To (days)']) / 2,
+        y=histogram['PR Count'],
+        width=histogram['To (days)'] - histogram['From (days)'],
+        name='Merged PRs',
+        marker={'color': 'blue'}
+    ))
+    for name, value in percentiles.dropna().items():
+        pr_resolution_times_fig.add_vline(x=value, line_dash='dash', line_color='red', annotation_text=f'{name} {value:.2f}')
+    pr_resolution_times_fig.update_layout(title='PR Resolution Time Distribution',
+                                          xaxis={'title': 'Resolution Time (days)'},
+                                          yaxis={'title': 'PR Count'},
+                                          hovermode='closest')
+    return pr_resolution_times_fig
+
+# Function to build the daily commits figure, with the series downsampled to the visible range of dates.
+# The zoom of the figure is kept across redraws for the same developer.
+def daily_commits_figure(daily_commits, selected_developer, x_range=None):
+    daily_commits_fig = go.Figure()
+    daily_commits_fig.add_trace(scatter_trace(
+        daily_commits['Date'],
+        daily_commits['Commit Count'],
+        x_range=x_range,
+        mode='lines+markers',
+        name='Daily Commits'
+    ))
+    daily_commits_fig.update_layout(title='Daily Commits Over Time',
+                                    xaxis={'title': 'Date'},
+                                    yaxis={'title': 'Commit Count'},
+                                    hovermode='closest',
+                                    uirevision=selected_developer)
+    return daily_commits_fig
+
+# Function to build the PR merge rates figure, with the daily series downsampled to the visible range of dates
+def pr_merge_rate_figure(pr_merge_rate, selected_developer, x_range=None):
     pr_merge_rate_fig = go.Figure()
-    pr_merge_rate_fig.add_trace(go.Scatter(
-        x=pr_merge_rate['daily']['Merged At'],
-        y=pr_merge_rate['daily']['PR Merge Count'],
+    pr_merge_rate_fig.add_trace(scatter_trace(
+        pr_merge_rate['daily']['Merged At'],
+        pr_merge_rate['daily']['PR Merge Count'],
+        x_range=x_range,
         mode='lines+markers',
         name='Daily PR Merge Rate',
         marker={'color': 'red'}
@@ -152,31 +437,45 @@ def update_graphs(selected_developer):
     pr_merge_rate_fig.update_layout(title='PR Merge Rates',
                                     xaxis={'title': 'Date'},
                                     yaxis={'title': 'PR Merge Count'},
-                                    hovermode='closest')
+                                    hovermode='closest',
+                                    uirevision=selected_developer)
+    return pr_merge_rate_fig
 
-    pr_resolution_times_fig = go.Figure()
-    pr_resolution_times_fig.add_trace(go.Bar(
-        y=pr_resolution_times['Title'],
-        x=pr_resolution_times['Resolution Time (days)'],
-        orientation='h',
-        name='PR Resolution Times',
-        marker={'color': 'blue'}
-    ))
-    pr_resolution_times_fig.update_layout(title='PR Resolution Times',
-                                          xaxis={'title': 'Resolution Time (days)'},
-                                          yaxis={'title': 'PR Title'},
-                                          hovermode='closest')
+# Callback to redraw the daily commits at the detail of the range zoomed into, or of the whole history once the zoom is reset
+@app.callback(
+    Output('daily-commits-graph', 'figure', allow_duplicate=True),
+    [Input('daily-commits-graph', 'relayoutData')],
+    [State('developer-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def zoom_daily_commits(relayout_data, selected_developer):
+    x_range = relayout_range(relayout_data)
+    if x_range is False:
+        raise PreventUpdate
+    return daily_commits_figure(refresher.current().rows('daily_commits', selected_developer), selected_developer, x_range)
 
-    return (
-        daily_commits_fig,
-        weekly_commits_fig,
-        monthly_commits_fig,
-        yearly_commits_fig,
-        pr_merge_rate_fig,
-        pr_resolution_times_fig
-    )
+# Callback to redraw the daily PR merges at the detail of the range zoomed into, or of the whole history once the zoom is reset
+@app.callback(
+    Output('pr-merge-rate-graph', 'figure', allow_duplicate=True),
+    [Input('pr-merge-rate-graph', 'relayoutData')],
+    [State('developer-dropdown', 'value')],
+    prevent_initial_call=True
+)
+def zoom_pr_merge_rate(relayout_data, selected_developer):
+    x_range = relayout_range(relayout_data)
+    if x_range is False:
+        raise PreventUpdate
+    snapshot = refresher.current()
+    pr_merge_rate = {
+        'daily': snapshot.rows('daily_pr_merge_rate', selected_developer),
+        'monthly': snapshot.rows('monthly_pr_merge_rate', selected_developer)
+    }
+    return pr_merge_rate_figure(pr_merge_rate, selected_developer, x_range)
 
 def run_dash_app():
+    # Keep the metrics up to date with the dataset while the server runs
+    refresher.start()
+
     # Start the Dash app server
     app.run_server(port=8051, debug=True, use_reloader=False)
 
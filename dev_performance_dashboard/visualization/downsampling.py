@@ -0,0 +1,93 @@
+import os
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+
+# Environment variables setting how many points a time series is drawn with at most, and from how many points on it is drawn with WebGL
+MAX_POINTS_ENV = 'DEV_DASHBOARD_MAX_POINTS'
+WEBGL_THRESHOLD_ENV = 'DEV_DASHBOARD_WEBGL_THRESHOLD'
+
+# By default a series keeps about two points per pixel of a full-width chart, and more than a thousand points are drawn with WebGL
+MAX_POINTS = int(os.environ.get(MAX_POINTS_ENV, 2000))
+WEBGL_THRESHOLD = int(os.environ.get(WEBGL_THRESHOLD_ENV, 1000))
+
+# Fewest points a series is downsampled to when a chart splits its points between many series
+MIN_SERIES_POINTS = 100
+
+# Downsampling methods: largest-triangle-three-buckets keeps the shape of the line, min/max keeps every peak and trough
+DOWNSAMPLING_METHODS = ['lttb', 'minmax']
+
+# Function to pick the indices of at most max_points points of a series with largest-triangle-three-buckets:
+# the first and last points, and in every bucket between them the point forming the largest triangle
+# with the point picked before it and the average of the next bucket
+def lttb_indices(x, y, max_points):
+    if max_points >= len(x) or max_points < 3:
+        return np.arange(len(x))
+
+    edges = (np.arange(max_points - 1) * (len(x) - 2) / (max_points - 2)).astype('int64') + 1
+    edges[-1] = len(x) - 1
+    indices = np.empty(max_points, dtype='int64')
+    indices[0], indices[-1] = 0, len(x) - 1
+    # Averages of every bucket (and of the last point, the bucket after the last one) are taken in one pass up front
+    sizes = np.diff(np.r_[edges, len(x)])
+    averages_x, averages_y = np.add.reduceat(x, edges) / sizes, np.add.reduceat(y, edges) / sizes
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        average_x, average_y = averages_x[bucket + 1], averages_y[bucket + 1]
+        picked = indices[bucket]
+        areas = np.abs((x[picked] - average_x) * (y[start:end] - y[picked]) - (x[picked] - x[start:end]) * (average_y - y[picked]))
+        indices[bucket + 1] = start + np.argmax(areas)
+    return indices
+
+# Function to pick the indices of at most max_points points of a series by keeping the lowest and highest point of every bucket
+def minmax_indices(x, y, max_points):
+    if max_points >= len(x) or max_points < 2:
+        return np.arange(len(x))
+
+    buckets = np.arange(len(x)) * (max_points // 2) // len(x)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    order = np.lexsort((y, buckets))
+    ends = np.r_[starts[1:], len(x)]
+    return np.unique(np.concatenate([order[starts], order[ends - 1]]))
+
+# Function to narrow a time series to a visible range of dates and downsample it to at most max_points points.
+# One point on either side of the range is kept, so the line runs on to the edges of the chart.
+def visible_points(x, y, x_range=None, max_points=MAX_POINTS, method='lttb'):
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of {DOWNSAMPLING_METHODS}")
+
+    x, y = pd.Series(x).reset_index(drop=True), pd.Series(y).reset_index(drop=True)
+    times = pd.to_datetime(x).to_numpy(dtype='datetime64[ns]').astype('int64').astype(float)
+    if x_range is not None:
+        first = max(np.searchsorted(times, pd.Timestamp(x_range[0]).value, side='left') - 1, 0)
+        last = np.searchsorted(times, pd.Timestamp(x_range[1]).value, side='right') + 1
+        x, y, times = x.iloc[first:last], y.iloc[first:last], times[first:last]
+
+    picks = (lttb_indices if method == 'lttb' else minmax_indices)(times, y.to_numpy(dtype=float), max_points)
+    return x.iloc[picks], y.iloc[picks]
+
+# Function to build the trace of a time series, downsampled to the visible range and drawn with WebGL when it has many points.
+# webgl=True or False forces the renderer, e.g. for every series of a chart whose series add up to many points.
+def scatter_trace(x, y, x_range=None, max_points=MAX_POINTS, method='lttb', webgl=None, **trace_args):
+    x, y = visible_points(x, y, x_range, max_points, method)
+    trace = go.Scattergl if (webgl if webgl is not None else len(x) > WEBGL_THRESHOLD) else go.Scatter
+    return trace(x=x, y=y, **trace_args)
+
+# Function to get the points every series of a chart with several series is downsampled to, so the chart stays within max_points
+def series_points(series_count, max_points=MAX_POINTS):
+    return max(MIN_SERIES_POINTS, max_points // max(series_count, 1))
+
+# Function to read the visible range of dates out of the relayoutData of a graph: (start, end) after a zoom or pan,
+# None after the axis was reset to show everything, and False if the event did not touch a date x axis
+def relayout_range(relayout_data):
+    relayout_data = relayout_data or {}
+    if relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        x_range = relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    elif 'xaxis.range' in relayout_data:
+        x_range = tuple(relayout_data['xaxis.range'])
+    else:
+        return False
+    # Date axes report their range as date strings; the positions of a category axis are no dates to narrow to
+    return x_range if all(isinstance(value, str) for value in x_range) else False